@@ -0,0 +1,380 @@
+import io
+import math
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import GifImagePlugin, Image, ImageDraw
+
+from blocks import card_has_text
+from text_layout import strong_direction
+from tiled_render import BandSource, PngBandWriter, TextOp, layout_tiled
+
+ANIMATION_EFFECTS = ("typewriter", "fade_in", "line_reveal")
+ANIMATION_FORMATS = {".gif": "GIF", ".png": "APNG", ".apng": "APNG", ".webp": "WEBP"}
+
+DEFAULT_FPS = 20
+DEFAULT_ANIMATION_SECONDS = 3.0
+# How long the finished card stays on screen before the animation loops
+DEFAULT_HOLD_SECONDS = 2.0
+# Opacity steps of a fade; frames that would repeat a step are merged into one longer frame
+FADE_LEVELS = 64
+
+
+class Frame(NamedTuple):
+    """The region of the canvas that changed, its new pixels, and how long the frame is shown."""
+    box: Tuple[int, int, int, int]
+    image: Image.Image
+    duration: int  # milliseconds
+
+
+class LineLayer(NamedTuple):
+    """One laid-out line: the canvas under its box before and after the line is drawn."""
+    box: Tuple[int, int, int, int]
+    before: Image.Image
+    after: Image.Image
+    # Character boundaries, as x offsets into the box from 0 to its width
+    cuts: Tuple[int, ...]
+    rtl: bool
+
+    @property
+    def steps(self) -> int:
+        return len(self.cuts) - 1
+
+    def span(self, shown_from: int, shown_to: int) -> Tuple[int, int]:
+        """x range that appears when the visible characters go from shown_from to shown_to."""
+        if self.rtl:
+            return self.cuts[self.steps - shown_to], self.cuts[self.steps - shown_from]
+        return self.cuts[shown_from], self.cuts[shown_to]
+
+
+def _main_ops(ops: List[TextOp]) -> List[TextOp]:
+    # The text itself is drawn with a stroke; shadows are not
+    return [op for op in ops if op.options.get("stroke_width")] or ops
+
+
+def group_lines(ops: List[TextOp]) -> List[List[TextOp]]:
+    """Groups recorded draw operations by text line (runs and shadow included), top to bottom."""
+    positions = sorted({op.xy[1] for op in _main_ops(ops)})
+    groups = {y: [] for y in positions}
+    for op in ops:
+        groups[min(positions, key=lambda y: abs(y - op.xy[1]))].append(op)
+    return [groups[y] for y in positions]
+
+
+def _op_box(op: TextOp) -> Tuple[int, int, int, int]:
+    font = op.options["font"]
+    left, top, right, bottom = font.getbbox(op.text, anchor=op.options.get("anchor") or "la",
+                                            stroke_width=op.options.get("stroke_width", 0))
+    x, y = op.xy
+    return math.floor(x + left), math.floor(y + top), math.ceil(x + right), math.ceil(y + bottom)
+
+
+def _line_cuts(ops: List[TextOp], box: Tuple[int, int, int, int], engine: str) -> Tuple[int, ...]:
+    width = box[2] - box[0]
+    positions = set()
+    for op in _main_ops(ops):
+        font = op.options["font"]
+        anchor = op.options.get("anchor") or "la"
+        total = font.getlength(op.text)
+        left = op.xy[0] - {"m": total / 2, "r": total}.get(anchor[0], 0)
+        lengths = [font.getlength(op.text[:end]) for end in range(1, len(op.text))]
+        if engine == "raqm" and strong_direction(op.text) == "rtl":
+            # RAQM takes logical text, so prefixes of an RTL run grow from its right edge
+            lengths = [total - length for length in lengths]
+        positions.update(round(left + length) - box[0] for length in lengths)
+    return (0, *sorted(p for p in positions if 0 < p < width), width)
+
+
+def plain_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """params with the text effects of the card and its blocks removed, for drawing outlined text."""
+    blocks = tuple(block._replace(text_effects=None) for block in params.get("blocks") or ())
+    return dict(params, text_effects=None, blocks=blocks)
+
+
+class TextAnimation:
+    """Reveals a card's text over time without re-rendering the card per frame.
+
+    The text is laid out once (the same recorded operations tiled rendering
+    uses) and each line is drawn once, in order, onto a copy of the background;
+    the area under the line before and after drawing is kept. Frames are then
+    produced by pasting or blending those crops into one reused canvas, so each
+    frame only touches the region that changed. The last frame is the card as
+    create_image draws it, except that text effects are left out: revealing
+    works on the recorded glyphs, and effects draw the text as one layer.
+    """
+
+    def __init__(self, renderer, params: Dict[str, Any], effect: str = "typewriter", fps: int = DEFAULT_FPS,
+                 seconds: float = DEFAULT_ANIMATION_SECONDS, hold: float = DEFAULT_HOLD_SECONDS):
+        if effect not in ANIMATION_EFFECTS:
+            raise ValueError(f"Unknown animation effect: {effect}")
+        self.effect = effect
+        source = BandSource(params)
+        self.size = source.dims
+        self.mode = source.mode
+        self.background = source.band(0, self.size[1])
+        self.layers = self._build_layers(layout_tiled(renderer, plain_params(params)), renderer.layout_engine)
+
+        if effect == "typewriter":
+            self.units = sum(layer.steps for layer in self.layers)
+        elif effect == "line_reveal":
+            self.units = len(self.layers) * FADE_LEVELS
+        else:
+            self.units = FADE_LEVELS if self.layers else 0
+        self.schedule = self._schedule(fps, seconds, hold)
+
+    def _build_layers(self, ops: List[TextOp], engine: str) -> List[LineLayer]:
+        width, height = self.size
+        canvas = self.background.copy()
+        draw = ImageDraw.Draw(canvas)
+        layers = []
+        for line_ops in group_lines(ops):
+            boxes = [_op_box(op) for op in line_ops]
+            box = (max(0, min(b[0] for b in boxes) - 1), max(0, min(b[1] for b in boxes) - 1),
+                   min(width, max(b[2] for b in boxes) + 1), min(height, max(b[3] for b in boxes) + 1))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue
+            before = canvas.crop(box)
+            for op in line_ops:
+                draw.text(op.xy, op.text, **op.options)
+            layers.append(LineLayer(box, before, canvas.crop(box), _line_cuts(line_ops, box, engine),
+                                    strong_direction("".join(op.text for op in line_ops)) == "rtl"))
+
+        # Line by line, a shadow can land on the previous line's text instead of under it;
+        # the finished card is drawn in the original order so the last frame matches a still
+        self.final = self.background.copy()
+        final_draw = ImageDraw.Draw(self.final)
+        for op in ops:
+            final_draw.text(op.xy, op.text, **op.options)
+        self.text_box = None
+        if layers:
+            self.text_box = (min(l.box[0] for l in layers), min(l.box[1] for l in layers),
+                             max(l.box[2] for l in layers), max(l.box[3] for l in layers))
+        return layers
+
+    def _schedule(self, fps: int, seconds: float, hold: float) -> List[Tuple[int, int]]:
+        """(progress in units, duration in ms) per frame; steps that round to the same progress are merged."""
+        frame_count = max(2, round(fps * seconds))
+        frame_ms = 1000 / fps
+        schedule = []
+        for index in range(frame_count):
+            units = round(index * self.units / (frame_count - 1))
+            if schedule and schedule[-1][0] == units:
+                schedule[-1][1] += frame_ms
+            else:
+                schedule.append([units, frame_ms])
+        schedule[-1][1] += hold * 1000
+        return [(units, round(duration)) for units, duration in schedule]
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.schedule)
+
+    def _apply(self, canvas: Image.Image, shown: int, target: int) -> Optional[Tuple[int, int, int, int]]:
+        """Advances canvas from shown to target units; returns the box that changed."""
+        changed = []
+        if self.effect == "typewriter":
+            offset = 0
+            for layer in self.layers:
+                start = min(max(shown - offset, 0), layer.steps)
+                end = min(max(target - offset, 0), layer.steps)
+                offset += layer.steps
+                if end <= start:
+                    continue
+                x0, x1 = layer.span(start, end)
+                if x1 > x0:
+                    canvas.paste(layer.after.crop((x0, 0, x1, layer.after.size[1])), (layer.box[0] + x0, layer.box[1]))
+                    changed.append((layer.box[0] + x0, layer.box[1], layer.box[0] + x1, layer.box[3]))
+        elif self.effect == "line_reveal":
+            for index, layer in enumerate(self.layers):
+                start = min(max(shown - index * FADE_LEVELS, 0), FADE_LEVELS)
+                end = min(max(target - index * FADE_LEVELS, 0), FADE_LEVELS)
+                if end <= start:
+                    continue
+                image = layer.after if end == FADE_LEVELS else Image.blend(layer.before, layer.after, end / FADE_LEVELS)
+                canvas.paste(image, layer.box[:2])
+                changed.append(layer.box)
+        elif target > shown:
+            box = self.text_box
+            after = self.final.crop(box)
+            image = after if target == FADE_LEVELS else Image.blend(self.background.crop(box), after, target / FADE_LEVELS)
+            canvas.paste(image, box[:2])
+            changed.append(box)
+
+        if target == self.units and changed:
+            canvas.paste(self.final.crop(self.text_box), self.text_box[:2])
+            changed.append(self.text_box)
+
+        if not changed:
+            return None
+        return (min(b[0] for b in changed), min(b[1] for b in changed),
+                max(b[2] for b in changed), max(b[3] for b in changed))
+
+    def frames(self) -> Iterator[Frame]:
+        """Yields the first frame whole, then only the changed region of each following frame."""
+        canvas = self.background.copy()
+        shown = 0
+        for index, (units, duration) in enumerate(self.schedule):
+            box = self._apply(canvas, shown, units)
+            if index == 0:
+                box = (0, 0) + self.size
+            shown = units
+            box = box or (0, 0, 1, 1)
+            yield Frame(box, canvas.crop(box), duration)
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    # GIF transparency is one palette entry, so transparent cards are put on white like JPEG
+    if image.mode == "RGBA":
+        return Image.alpha_composite(Image.new("RGBA", image.size, "white"), image).convert("RGB")
+    return image.convert("RGB")
+
+
+class GifWriter:
+    """Writes frames as they come; each frame after the first covers only its changed region."""
+
+    def __init__(self, fp, animation: TextAnimation, loop: int = 0):
+        self.fp = fp
+        # One palette for the whole animation, from the finished card and the halfway point of its fades
+        source = animation.final
+        if animation.text_box is not None:
+            box = animation.text_box
+            halfway = Image.blend(animation.background.crop(box), animation.final.crop(box), 0.5)
+            source = Image.new(animation.mode, (animation.size[0], animation.size[1] + halfway.size[1]))
+            source.paste(animation.final, (0, 0))
+            source.paste(halfway, (0, animation.size[1]))
+        self.palette = _flatten(source).quantize(256, dither=Image.Dither.NONE)
+        header_image = self.palette.crop((0, 0) + animation.size)
+        header, _ = GifImagePlugin.getheader(header_image, info={"loop": loop, "optimize": False})
+        fp.write(b"".join(header))
+
+    def write(self, frame: Frame):
+        image = _flatten(frame.image).quantize(palette=self.palette, dither=Image.Dither.NONE)
+        # Disposal 1: later frames draw over this one, so unchanged pixels need not be repeated
+        self.fp.write(b"".join(GifImagePlugin.getdata(image, frame.box[:2], duration=frame.duration, disposal=1)))
+
+    def close(self):
+        self.fp.write(b";")
+
+
+class ApngWriter:
+    """Writes an animated PNG frame by frame; frames after the first are placed at their region's offset."""
+
+    def __init__(self, fp, animation: TextAnimation, loop: int = 0):
+        self.fp = fp
+        self.sequence = 0
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 6 if animation.mode == "RGBA" else 2
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", *animation.size, 8, color_type, 0, 0, 0))
+        self._chunk(b"acTL", struct.pack(">II", animation.frame_count, loop))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.fp.write(struct.pack(">I", len(data)) + kind + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def write(self, frame: Frame):
+        width, height = frame.image.size
+        # Blend op 0 (source): the region already holds the composited pixels
+        self._chunk(b"fcTL", struct.pack(">IIIIIHHBB", self.sequence, width, height, *frame.box[:2],
+                                         frame.duration, 1000, 0, 0))
+        self.sequence += 1
+        raw, deflated = PngBandWriter.encode(frame.image)
+        data = b"\x78\x9c" + deflated + b"\x03\x00" + struct.pack(">I", zlib.adler32(raw))
+        if self.sequence == 1:
+            self._chunk(b"IDAT", data)
+        else:
+            self._chunk(b"fdAT", struct.pack(">I", self.sequence) + data)
+            self.sequence += 1
+
+    def close(self):
+        self._chunk(b"IEND", b"")
+
+
+class WebpWriter:
+    """Writes an animated WebP frame by frame; frames after the first hold only their changed region.
+
+    Each region is encoded on its own with Pillow's WebP encoder and wrapped
+    in an ANMF chunk, so frames are never collected in memory. WebP frame
+    offsets must be even, so regions are widened by a pixel where needed,
+    from a canvas that follows the frames.
+    """
+
+    def __init__(self, fp, animation: TextAnimation, loop: int = 0, quality: int = 90):
+        self.fp = fp
+        self.quality = quality
+        self.canvas = animation.background.copy()
+        self.start = fp.tell()
+        fp.write(b"RIFF\0\0\0\0WEBP")  # the size is filled in by close
+        flags = 0x02 | (0x10 if animation.mode == "RGBA" else 0)  # animation, alpha
+        width, height = animation.size
+        self._chunk(b"VP8X", struct.pack("<I", flags) + (width - 1).to_bytes(3, "little") + (height - 1).to_bytes(3, "little"))
+        # Background color (unused by the frames, which cover the canvas first) and loop count
+        self._chunk(b"ANIM", struct.pack("<IH", 0, loop))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.fp.write(kind + struct.pack("<I", len(data)) + data + b"\0" * (len(data) % 2))
+
+    def write(self, frame: Frame):
+        self.canvas.paste(frame.image, frame.box[:2])
+        left, top, right, bottom = frame.box
+        left, top = left - left % 2, top - top % 2
+        encoded = io.BytesIO()
+        self.canvas.crop((left, top, right, bottom)).save(encoded, format="WEBP", quality=self.quality)
+        # Keep the image data (ALPH, VP8 or VP8L); the still's own VP8X header does not belong in a frame
+        data, position, bitstream = encoded.getvalue(), 12, []
+        while position + 8 <= len(data):
+            kind, size = data[position:position + 4], struct.unpack_from("<I", data, position + 4)[0]
+            if kind in (b"ALPH", b"VP8 ", b"VP8L"):
+                bitstream.append(data[position:position + 8 + size + size % 2])
+            position += 8 + size + size % 2
+        header = b"".join(value.to_bytes(3, "little") for value in
+                          (left // 2, top // 2, right - left - 1, bottom - top - 1, frame.duration))
+        # Flags 0x02: replace the region instead of blending onto it, like APNG's source op
+        self._chunk(b"ANMF", header + b"\x02" + b"".join(bitstream))
+
+    def close(self):
+        end = self.fp.tell()
+        self.fp.seek(self.start + 4)
+        self.fp.write(struct.pack("<I", end - self.start - 8))
+        self.fp.seek(end)
+
+
+def export_animation(renderer, params: Dict[str, Any], path: str, effect: str = "typewriter", fps: int = DEFAULT_FPS,
+                     seconds: float = DEFAULT_ANIMATION_SECONDS, hold: float = DEFAULT_HOLD_SECONDS,
+                     loop: int = 0, quality: int = 90) -> Dict[str, Any]:
+    """Writes an animated GIF, APNG or WebP of the card's text appearing with the given effect."""
+    start = time.perf_counter()
+    image_format = ANIMATION_FORMATS.get(Path(path).suffix.lower())
+    if image_format is None:
+        raise ValueError(f"Animations can be saved as {', '.join(ANIMATION_FORMATS)}, not {Path(path).suffix}")
+    if not card_has_text(params):
+        raise ValueError("Nothing to render (empty text)")
+
+    animation = TextAnimation(renderer, params, effect, fps, seconds, hold)
+    layout_seconds = time.perf_counter() - start
+
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as fp:
+        if image_format == "WEBP":
+            writer = WebpWriter(fp, animation, loop, quality)
+        else:
+            writer = (GifWriter if image_format == "GIF" else ApngWriter)(fp, animation, loop)
+        for frame in animation.frames():
+            writer.write(frame)
+        writer.close()
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "format": image_format,
+        "effect": effect,
+        "frames": animation.frame_count,
+        "bytes": os.path.getsize(path),
+        "layout_seconds": round(layout_seconds, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "frames_per_second": round(animation.frame_count / elapsed, 1) if elapsed > 0 else 0.0
+    }
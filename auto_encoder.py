@@ -0,0 +1,177 @@
+import io
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional
+
+import numpy as np
+from PIL import Image
+
+from image_renderer import write_image
+
+# Pseudo-format for the GUI quality combo and `--format auto` in batch runs
+AUTO_FORMAT = "auto"
+# A lossy candidate is only kept if it reproduces the frame at least this well (PSNR, dB)
+DEFAULT_MIN_PSNR = 37.0
+DEFAULT_LOSSY_QUALITY = 85
+# Frames with more distinct colors than this are treated as photographic
+FLAT_COLOR_LIMIT = 4096
+ENCODER_WORKERS = min(4, os.cpu_count() or 1)
+# The truecolor PNG size is estimated from strips of this many rows, spread over this fraction of the frame
+BASELINE_STRIP_ROWS = 4
+BASELINE_SAMPLE_FRACTION = 8
+
+
+class FrameAnalysis(NamedTuple):
+    # Distinct colors, or None when there are more than FLAT_COLOR_LIMIT
+    colors: Optional[int]
+    has_alpha: bool
+
+    @property
+    def flat(self) -> bool:
+        return self.colors is not None
+
+
+class Candidate(NamedTuple):
+    label: str
+    extension: str
+    lossless: bool
+    encode: Callable[[], bytes]
+    # Slower encoding of the same pixels into fewer bytes, only run for the candidate that is kept
+    recompress: Optional[Callable[[], bytes]] = None
+
+
+class AutoEncoded(NamedTuple):
+    data: bytes
+    label: str
+    extension: str
+    # Size of the truecolor PNG that would have been written otherwise (estimated unless it was the one written)
+    baseline_size: int
+    psnr: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.baseline_size - len(self.data)
+
+
+def analyze_frame(image: Image.Image) -> FrameAnalysis:
+    has_alpha = "A" in image.getbands() and image.getchannel("A").getextrema()[0] < 255
+    colors = image.getcolors(FLAT_COLOR_LIMIT)
+    return FrameAnalysis(len(colors) if colors else None, has_alpha)
+
+
+def _encoded(image: Image.Image, image_format: str, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def truecolor_png(image: Image.Image, dpi: Optional[int]) -> bytes:
+    """The PNG write_image would produce; encode_auto falls back to it."""
+    buffer = io.BytesIO()
+    write_image(image, buffer, image_format="PNG", dpi=dpi)
+    return buffer.getvalue()
+
+
+def estimate_png_size(image: Image.Image, dpi: Optional[int]) -> int:
+    """Size of truecolor_png, from a stack of thin strips of rows spread evenly over the frame.
+
+    PNG filters and deflates row by row, so the strips compress about as well
+    as the rows around them; for cards this lands within a few percent.
+    """
+    width, height = image.size
+    strips = max(1, height // (BASELINE_SAMPLE_FRACTION * BASELINE_STRIP_ROWS))
+    if strips * BASELINE_STRIP_ROWS >= height:
+        return len(truecolor_png(image, dpi))
+    sample = Image.new(image.mode, (width, strips * BASELINE_STRIP_ROWS))
+    step = height / strips
+    for strip in range(strips):
+        top = int(strip * step + (step - BASELINE_STRIP_ROWS) / 2)
+        sample.paste(image.crop((0, top, width, top + BASELINE_STRIP_ROWS)), (0, strip * BASELINE_STRIP_ROWS))
+    return round(len(truecolor_png(sample, dpi)) * height / sample.size[1])
+
+
+def candidates(image: Image.Image, analysis: FrameAnalysis, quality: int, dpi: Optional[int]) -> List[Candidate]:
+    """Encodings worth trying for this frame, given what analyze_frame found.
+
+    Flat artwork compresses best losslessly, so it is only tried as a palette
+    PNG and lossless WebP; photographic frames only with JPEG and lossy WebP.
+    The truecolor PNG is not a candidate: encode_auto falls back to it when
+    nothing here stays within min_psnr.
+    """
+    # An alpha channel that is fully opaque is dropped rather than encoded
+    frame = image if analysis.has_alpha else image.convert("RGB")
+    dpi_option = {"dpi": (dpi, dpi)} if dpi else {}
+
+    quantized = []
+
+    def palette(optimize=False):
+        # Few colors after antialiasing: a 256-color palette is exact or very close
+        if not quantized:
+            method = Image.Quantize.FASTOCTREE if analysis.has_alpha else Image.Quantize.MEDIANCUT
+            quantized.append(frame.quantize(min(256, analysis.colors), method, dither=Image.Dither.NONE))
+        return _encoded(quantized[0], "PNG", optimize=optimize, **dpi_option)
+
+    # WebP has no resolution field, so print output sticks to PNG and JPEG
+    found = []
+    if analysis.flat:
+        found.append(Candidate("palette PNG", ".png", False, palette, lambda: palette(optimize=True)))
+        if dpi is None:
+            found.append(Candidate("lossless WebP", ".webp", True, lambda: _encoded(frame, "WEBP", lossless=True)))
+    else:
+        if not analysis.has_alpha:
+            found.append(Candidate("JPEG", ".jpg", False, lambda: _encoded(frame, "JPEG", quality=quality, **dpi_option)))
+        if dpi is None:
+            found.append(Candidate("WebP", ".webp", False, lambda: _encoded(frame, "WEBP", quality=quality)))
+    return found
+
+
+def _pixels(image: Image.Image, has_alpha: bool) -> np.ndarray:
+    """Pixels to compare; with alpha, color is premultiplied (by Pillow) so hidden RGB does not count."""
+    if not has_alpha:
+        return np.asarray(image.convert("RGB"))
+    # Pillow premultiplies from RGBA only, so decoded palette and LA images go through it
+    return np.asarray((image if image.mode == "RGBA" else image.convert("RGBA")).convert("RGBa"))
+
+
+def psnr(reference: np.ndarray, data: bytes, has_alpha: bool) -> float:
+    decoded = _pixels(Image.open(io.BytesIO(data)), has_alpha)
+    difference = np.subtract(reference, decoded, dtype=np.float32).ravel()
+    mse = float(difference @ difference) / difference.size
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+
+@lru_cache(maxsize=None)
+def _encoder_pool() -> ThreadPoolExecutor:
+    # Shared by all callers; Pillow's encoders release the GIL, so candidates encode in parallel
+    return ThreadPoolExecutor(ENCODER_WORKERS, thread_name_prefix="auto-encoder")
+
+
+def encode_auto(image: Image.Image, quality: int = DEFAULT_LOSSY_QUALITY, min_psnr: float = DEFAULT_MIN_PSNR,
+                dpi: Optional[int] = None) -> AutoEncoded:
+    """Encodes the frame every way that suits it and keeps the smallest result within min_psnr."""
+    analysis = analyze_frame(image)
+    found = candidates(image, analysis, quality, dpi)
+    futures = [_encoder_pool().submit(candidate.encode) for candidate in found]
+    baseline = _encoder_pool().submit(estimate_png_size, image, dpi)
+    encoded = sorted(((candidate, future.result()) for candidate, future in zip(found, futures)),
+                     key=lambda result: len(result[1]))
+
+    # Smallest first, so only results up to the first one within min_psnr are decoded and compared
+    reference = None
+    for candidate, data in encoded:
+        if candidate.lossless:
+            quality_db = math.inf
+        else:
+            if reference is None:
+                reference = _pixels(image, analysis.has_alpha)
+            quality_db = psnr(reference, data, analysis.has_alpha)
+        if quality_db >= min_psnr:
+            if candidate.recompress is not None:
+                data = min(data, candidate.recompress(), key=len)
+            # The baseline is an estimate, so it is never reported below what was written
+            return AutoEncoded(data, candidate.label, candidate.extension, max(baseline.result(), len(data)), quality_db)
+    baseline.cancel()
+    data = truecolor_png(image, dpi)
+    return AutoEncoded(data, "PNG", ".png", len(data), math.inf)
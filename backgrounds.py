@@ -0,0 +1,331 @@
+import math
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageColor
+
+# Output sizes offered in the dimensions combo
+IMAGE_PRESETS = {
+    (1200, 675): "image_dimensions_standard",
+    (1080, 1080): "image_dimensions_square",
+    (1080, 1920): "image_dimensions_portrait"
+}
+
+# Print sizes; rendered in bands (see tiled_render) and tagged with PRINT_DPI
+PRINT_PRESETS = {
+    (2480, 3508): "image_dimensions_a4_print",
+    (7016, 9933): "image_dimensions_a1_poster"
+}
+PRINT_DPI = 300
+
+# Largest width and height any preset needs from a background
+MAX_PRESET_SIZE = (max(w for w, _ in IMAGE_PRESETS), max(h for _, h in IMAGE_PRESETS))
+
+# Resolution of the quick first decode shown while a photo is still loading
+DRAFT_PREVIEW_SIZE = (MAX_PRESET_SIZE[0] // 4, MAX_PRESET_SIZE[1] // 4)
+
+# Upper bound for the decoded working copy of a background photo (RGBA bytes)
+BACKGROUND_MEMORY_BUDGET = 32 * 1024 * 1024
+
+# EXIF orientation tag values and the transpose that undoes them
+EXIF_ORIENTATION = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90
+}
+
+# NewSubfileType tag and the bit marking a TIFF page as a reduced-resolution copy of the first one
+TIFF_SUBFILE_TYPE = 254
+TIFF_REDUCED_RESOLUTION = 0x1
+
+
+def fit_scale(size: Tuple[int, int], needed: Tuple[int, int], budget: Optional[int] = None) -> float:
+    """Largest downscale factor that still covers `needed` on both axes, capped by a byte budget."""
+    scale = min(1.0, max(needed[0] / size[0], needed[1] / size[1]))
+    if budget:
+        scale = min(scale, math.sqrt(budget / (size[0] * size[1] * 4)))
+    return scale
+
+
+def reduced_pages(image: Image.Image) -> List[Tuple[Tuple[int, int], int]]:
+    """(size, frame) of each reduced-resolution page of a TIFF, smallest first.
+
+    Pyramidal TIFFs store their overviews as pages after the full image; they
+    decode in a fraction of its time. Other formats have none.
+    """
+    pages = []
+    if image.format == "TIFF":
+        for frame in range(1, getattr(image, "n_frames", 1)):
+            image.seek(frame)
+            if image.tag_v2.get(TIFF_SUBFILE_TYPE, 0) & TIFF_REDUCED_RESOLUTION:
+                pages.append((image.size, frame))
+        image.seek(0)
+    return sorted(pages)
+
+
+def decode_scaled(path: str, needed: Tuple[int, int], budget: Optional[int] = None, draft_only: bool = False) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Decodes an image at the smallest resolution that covers `needed`, upright.
+
+    Returns the image and the upright size of the original file. JPEGs are
+    decoded with DCT scaling (draft mode) and TIFFs from the smallest
+    reduced-resolution page that covers the target, so the full-resolution
+    pixels are never materialised. With draft_only, no further resampling is
+    done and a TIFF falls back to its largest reduced page.
+    """
+    image = Image.open(path)
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    transpose = ORIENTATION_TRANSPOSE.get(orientation)
+    swapped = orientation in (5, 6, 7, 8)
+
+    width, height = image.size
+    upright_size = (height, width) if swapped else (width, height)
+    scale = fit_scale(upright_size, needed, budget)
+    # Target in the file's own (unrotated) orientation
+    target = (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale)))
+
+    if image.format == "JPEG":
+        reduction = 1
+        if budget:
+            # DCT scaling overshoots the target by up to 2x per axis; never decode more than the budget
+            while reduction < 8 and math.ceil(width / reduction) * math.ceil(height / reduction) * 4 > budget:
+                reduction *= 2
+        image.draft("RGB", (min(target[0], width // reduction), min(target[1], height // reduction)))
+    elif image.format == "TIFF":
+        pages = reduced_pages(image)
+        covering = [frame for size, frame in pages if size[0] >= target[0] and size[1] >= target[1]]
+        if covering or (draft_only and pages):
+            image.seek(covering[0] if covering else pages[-1][1])
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        # convert() always copies, so only pay for it when the mode actually changes
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+    if not draft_only and image.size[0] > target[0]:
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if transpose is not None:
+        image = image.transpose(transpose)
+    return image, upright_size
+
+
+def _as_rgba(image: Image.Image) -> Image.Image:
+    """RGBA version of a freshly made image; an RGB one gains its alpha band in place instead of being copied."""
+    if image.mode == "RGBA":
+        return image
+    if image.mode == "RGB":
+        image.putalpha(255)
+        return image
+    return image.convert("RGBA")
+
+
+class BackgroundImage:
+    """A background photo held at working resolution instead of its full size.
+
+    The working copy covers the largest preset and stays within the memory
+    budget. Exports larger than the working copy re-read the original file
+    for that one render without keeping it around.
+    """
+
+    def __init__(self, path: str, image: Image.Image, original_size: Tuple[int, int], is_draft: bool = False):
+        self.path = path
+        self.image = image
+        self.original_size = original_size
+        self.is_draft = is_draft
+        self._lock = threading.Lock()
+        self._resized = None
+        self._resized_from_original = False
+
+    @classmethod
+    def open(cls, path: str, needed: Tuple[int, int] = MAX_PRESET_SIZE, budget: int = BACKGROUND_MEMORY_BUDGET) -> "BackgroundImage":
+        image, original_size = decode_scaled(path, needed, budget)
+        return cls(path, image, original_size)
+
+    @classmethod
+    def open_draft(cls, path: str) -> Optional["BackgroundImage"]:
+        """Reduced-resolution stand-in that decodes in milliseconds, or None if the
+        file has no cheap reduced decode (JPEG draft mode or a reduced TIFF page)."""
+        with Image.open(path) as probe:
+            if probe.format != "JPEG" and not reduced_pages(probe):
+                return None
+        image, original_size = decode_scaled(path, DRAFT_PREVIEW_SIZE, draft_only=True)
+        return cls(path, image, original_size, is_draft=True)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.size
+
+    def covers(self, dims: Tuple[int, int]) -> bool:
+        return self.image.size[0] >= dims[0] and self.image.size[1] >= dims[1]
+
+    def resized(self, dims: Tuple[int, int], copy: bool = True, draft: bool = False, preview: bool = False) -> Image.Image:
+        """Returns the background stretched to dims as RGBA.
+
+        The last result is cached, since previews redraw at the same size on every
+        keystroke. Callers that draw on the result must keep copy=True. A draft
+        stretches the working copy with nearest-neighbour resampling unless the
+        cached result already has the size, and leaves the cache alone. Sizes the
+        working copy does not cover are read again from the original file, except
+        for previews, which stretch the working copy instead.
+        """
+        dims = tuple(dims)
+        with self._lock:
+            cached = self._resized if self._resized is not None and self._resized.size == dims else None
+            # A preview-quality result is not good enough for a save from the original
+            if cached is not None and not (preview or draft or self._resized_from_original):
+                cached = None
+        if draft and cached is None:
+            return self.image.resize(dims, Image.Resampling.NEAREST).convert("RGBA")
+
+        if cached is None:
+            from_original = not preview and not self.is_draft and not self.covers(dims) and self.original_size[0] > self.image.size[0]
+            if from_original:
+                source, _ = decode_scaled(self.path, dims)
+                cached = _as_rgba(source.resize(dims, Image.Resampling.LANCZOS))
+                del source
+                if dims[0] * dims[1] * 4 > BACKGROUND_MEMORY_BUDGET:
+                    # Too large to keep alongside the working copy
+                    return cached
+            else:
+                cached = _as_rgba(self.image.resize(dims, Image.Resampling.LANCZOS))
+            with self._lock:
+                self._resized, self._resized_from_original = cached, from_original
+        return cached.copy() if copy else cached
+
+
+# Background types drawn by generate_background rather than loaded or filled
+GENERATED_BACKGROUNDS = ("linear_gradient", "radial_gradient", "noise", "pattern")
+PATTERNS = ("stripes", "checker", "dots")
+
+
+def canvas_mode(background_type: str, loaded_image=None) -> str:
+    """Mode of the frame create_image returns for a background: "RGBA" or "RGB"."""
+    if background_type == "existing":
+        return "RGBA" if loaded_image else "RGB"
+    return "RGB" if background_type == "solid" or background_type in GENERATED_BACKGROUNDS else "RGBA"
+
+# Gradients are quantised to a 256-entry palette so colouring happens in C
+PALETTE_SIZE = 256
+
+
+class BackgroundSpec(NamedTuple):
+    """Hashable description of a generated background; also the cache key."""
+    kind: str
+    colors: Tuple[str, ...]
+    stops: Tuple[float, ...] = ()
+    angle: float = 90.0
+    pattern: str = "stripes"
+    scale: int = 48
+    seed: int = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "BackgroundSpec":
+        """Builds a spec from template-style keys (background_type, background_color, ...)."""
+        stops = settings.get("background_stops")
+        if stops:
+            # Multi-stop gradients: [[color, position], ...]
+            colors = tuple(str(color) for color, _ in stops)
+            positions = tuple(float(position) for _, position in stops)
+        else:
+            colors = (settings.get("background_color") or "black", settings.get("background_color2") or "white")
+            positions = ()
+        return cls(settings.get("background_type", "linear_gradient"), colors, positions,
+                   float(settings.get("gradient_angle", 90.0)), settings.get("background_pattern") or "stripes",
+                   int(settings.get("pattern_size", 48)), int(settings.get("noise_seed", 0)))
+
+
+def _gradient_palette(colors: Tuple[str, ...], stops: Tuple[float, ...]) -> np.ndarray:
+    rgb = np.array([ImageColor.getrgb(color)[:3] for color in colors], dtype=np.float32)
+    positions = np.array(stops, dtype=np.float32) if len(stops) == len(colors) else np.linspace(0, 1, len(colors), dtype=np.float32)
+    samples = np.linspace(0, 1, PALETTE_SIZE, dtype=np.float32)
+    palette = np.stack([np.interp(samples, positions, rgb[:, channel]) for channel in range(3)], axis=1)
+    return np.round(palette).astype(np.uint8)
+
+
+def _palette_image(indexes, palette: np.ndarray) -> Image.Image:
+    """Colours an index field (array or "L" image) through a palette, avoiding a per-pixel gather in NumPy."""
+    image = indexes if isinstance(indexes, Image.Image) else Image.fromarray(np.ascontiguousarray(indexes, dtype=np.uint8))
+    image.putpalette(palette.tobytes())
+    return image.convert("RGB")
+
+
+# The *_indexes helpers fold normalisation into the 1D axes, so the full-size
+# array is produced by a single broadcast add and a cast. Each can produce a
+# horizontal band (rows top..top+rows) of the full field for tiled rendering.
+
+def _linear_indexes(width: int, height: int, angle: float, top: int = 0, rows: Optional[int] = None) -> np.ndarray:
+    # 0 degrees runs left to right, 90 top to bottom
+    radians = math.radians(angle)
+    dx, dy = math.cos(radians), math.sin(radians)
+    corners = [0.0, (width - 1) * dx, (height - 1) * dy, (width - 1) * dx + (height - 1) * dy]
+    low, high = min(corners), max(corners)
+    step = (PALETTE_SIZE - 1) / ((high - low) or 1.0)
+    xs = (np.arange(width, dtype=np.float32) * dx - low) * step + 0.5
+    ys = np.arange(top, top + (height if rows is None else rows), dtype=np.float32) * dy * step
+    return (xs[None, :] + ys[:, None]).astype(np.uint8)
+
+
+def _radial_indexes(width: int, height: int, top: int = 0, rows: Optional[int] = None) -> np.ndarray:
+    xs = np.arange(width, dtype=np.float32) - (width - 1) / 2
+    ys = np.arange(top, top + (height if rows is None else rows), dtype=np.float32) - (height - 1) / 2
+    distance = xs[None, :] ** 2 + ys[:, None] ** 2
+    np.sqrt(distance, out=distance)
+    distance *= (PALETTE_SIZE - 1) / math.hypot(width / 2, height / 2)
+    return distance.astype(np.uint8)
+
+
+def _noise_indexes(width: int, height: int, scale: int, seed: int, top: int = 0, rows: Optional[int] = None) -> Image.Image:
+    # Value noise: a coarse random grid smoothly upsampled (in C) to full size
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, PALETTE_SIZE, (height // scale + 2, width // scale + 2), dtype=np.uint8)
+    rows = height if rows is None else rows
+    # Upsample only the part of the grid behind this band
+    y_scale = coarse.shape[0] / height
+    box = (0, top * y_scale, coarse.shape[1], (top + rows) * y_scale)
+    return Image.fromarray(coarse).resize((width, rows), Image.Resampling.BICUBIC, box=box)
+
+
+def _pattern_indexes(width: int, height: int, pattern: str, scale: int, top: int = 0, rows: Optional[int] = None) -> np.ndarray:
+    # Every pattern repeats with period 2*scale, so build one tile and repeat it
+    period = 2 * scale
+    xs = np.arange(period, dtype=np.int32)[None, :]
+    ys = np.arange(period, dtype=np.int32)[:, None]
+    if pattern == "checker":
+        tile = (xs // scale + ys // scale) % 2
+    elif pattern == "dots":
+        tile = ((xs % scale) - scale / 2) ** 2 + ((ys % scale) - scale / 2) ** 2 <= (scale * 0.3) ** 2
+    else:
+        tile = ((xs + ys) // scale) % 2
+    rows = height if rows is None else rows
+    # Start the tile at the band's phase of the period
+    tile = np.roll(tile.astype(np.uint8), -(top % period), axis=0)
+    repeats = (-(-rows // period), -(-width // period))
+    return np.tile(tile, repeats)[:rows, :width]
+
+
+def render_background(spec: BackgroundSpec, dims: Tuple[int, int], top: int = 0, rows: Optional[int] = None) -> Image.Image:
+    """Renders a generated background, or just the band of rows top..top+rows of it."""
+    width, height = dims
+    if spec.kind == "pattern":
+        palette = np.array([ImageColor.getrgb(color)[:3] for color in spec.colors[:2]], dtype=np.uint8)
+        return _palette_image(_pattern_indexes(width, height, spec.pattern, max(2, spec.scale), top, rows), palette)
+
+    if spec.kind == "radial_gradient":
+        indexes = _radial_indexes(width, height, top, rows)
+    elif spec.kind == "noise":
+        indexes = _noise_indexes(width, height, max(2, spec.scale), spec.seed, top, rows)
+    else:
+        indexes = _linear_indexes(width, height, spec.angle, top, rows)
+    return _palette_image(indexes, _gradient_palette(spec.colors, spec.stops))
+
+
+@lru_cache(maxsize=8)
+def generate_background(spec: BackgroundSpec, dims: Tuple[int, int]) -> Image.Image:
+    """Generates a background in one vectorised pass. The result is cached per
+    (spec, dims) and shared, so callers must copy it before drawing on it."""
+    return render_background(spec, tuple(dims))
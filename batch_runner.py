@@ -0,0 +1,561 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from PIL import Image, ImageColor
+
+from animation import ANIMATION_FORMATS, DEFAULT_ANIMATION_SECONDS, DEFAULT_FPS, DEFAULT_HOLD_SECONDS, export_animation
+from auto_encoder import AUTO_FORMAT, DEFAULT_MIN_PSNR, encode_auto
+from backgrounds import BackgroundImage, BackgroundSpec, GENERATED_BACKGROUNDS
+from blocks import card_has_text, parse_blocks
+from carousel import DEFAULT_MIN_FONT_SIZE, render_carousel
+from frame_transport import DEFAULT_SLOT_BYTES, FrameRing, attach_worker, worker_write
+from image_renderer import ImageRenderer, canvas_mode, default_font_paths, write_image
+from render_plan import BACKGROUND_TYPES, RenderPlan, compile_plan
+from text_layout import LAYOUT_ENGINES
+from tiled_render import TILED_FORMATS, needs_tiling, render_tiled
+
+JOURNAL_FILE = "journal.tsv"
+FAILURES_FILE = "failures.jsonl"
+SUMMARY_FILE = "summary.json"
+
+# Compiled plans kept per (template version, job overrides)
+PLAN_CACHE_SIZE = 256
+
+# Job keys that do not change how a card is drawn, so jobs differing only in them share a plan
+PER_JOB_KEYS = ("id", "text", "output", "format", "quality", "min_psnr", "animation", "fps", "animation_seconds",
+                "hold_seconds", "carousel", "min_font_size")
+
+IMAGE_FORMATS = {"png": "PNG", "jpg": "JPEG", "jpeg": "JPEG", "webp": "WEBP", "tif": "TIFF", "tiff": "TIFF", "gif": "GIF"}
+
+DEFAULT_JOB_PARAMS = {
+    "background_type": "solid",
+    "img_dims": (1200, 675),
+    "bg_color": "black",
+    "loaded_image": None,
+    "font_family": "Amiri",
+    "font_style": "regular",
+    "text_color": "white",
+    "fit_to_width": False,
+    "text_position": "center",
+    "font_size": 120,
+    "enable_shadow": False
+}
+
+# Template keys that are named differently in create_image
+TEMPLATE_KEYS = {
+    "background_type": "background_type",
+    "background_color": "bg_color",
+    "text_color": "text_color",
+    "image_dimensions": "img_dims",
+    "fit_to_width": "fit_to_width",
+    "enable_shadow": "enable_shadow",
+    "text_position": "text_position",
+    "font_family": "font_family",
+    "font_style": "font_style",
+    "font_size": "font_size",
+    "text_effects": "text_effects"
+}
+
+
+def iter_jobs(jobs_path: str) -> Iterator[Tuple[int, str, Optional[Dict[str, Any]]]]:
+    """Lazily yields (line number, job id, job) from a JSONL file; job is None for invalid lines."""
+    with open(jobs_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError:
+                job = None
+            if not isinstance(job, dict):
+                yield line_no, f"line-{line_no}", None
+                continue
+            job_id = str(job.get("id") or hashlib.sha1(line.encode("utf-8")).hexdigest()[:16])
+            yield line_no, job_id, job
+
+
+def _is_valid_template_value(param_key: str, value: Any) -> bool:
+    # Older templates stored translated combo labels instead of item data; the GUI
+    # ignores those, so batch runs do the same instead of failing the job.
+    if param_key == "img_dims":
+        return isinstance(value, (list, tuple)) and len(value) == 2
+    if param_key in ("bg_color", "text_color"):
+        try:
+            ImageColor.getrgb(value)
+            return True
+        except (ValueError, AttributeError):
+            return False
+    if param_key == "background_type":
+        return value in BACKGROUND_TYPES
+    if param_key == "text_position":
+        return isinstance(value, str) and value.isascii()
+    return True
+
+
+def params_from_template(template_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a saved template onto create_image keyword arguments."""
+    params = {}
+    for template_key, param_key in TEMPLATE_KEYS.items():
+        value = template_data.get(template_key)
+        if value is not None and _is_valid_template_value(param_key, value):
+            params[param_key] = value
+    return params
+
+
+class BatchJournal:
+    """Append-only record of finished job ids and the SHA-256 of their output."""
+
+    def __init__(self, path: Path, fsync_every: int = 64):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.completed = set()
+        self._pending_sync = 0
+        self._file = None
+
+    def open(self):
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    job_id, sep, _digest = line.rstrip("\n").partition("\t")
+                    # A torn last line from a crash has no separator and is ignored
+                    if sep:
+                        self.completed.add(job_id)
+        self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def record(self, job_id: str, digest: str):
+        self._file.write(f"{job_id}\t{digest}\n")
+        self._file.flush()
+        self.completed.add(job_id)
+        self._pending_sync += 1
+        if self._pending_sync >= self.fsync_every:
+            os.fsync(self._file.fileno())
+            self._pending_sync = 0
+
+    def close(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+
+def load_background(cache: OrderedDict, image_path: str, max_images: int = 4) -> BackgroundImage:
+    """Loads a background through a small LRU; a few images suffice for jobs grouped by image."""
+    if image_path in cache:
+        cache.move_to_end(image_path)
+        return cache[image_path]
+    image = BackgroundImage.open(image_path)
+    cache[image_path] = image
+    if len(cache) > max_images:
+        cache.popitem(last=False)
+    return image
+
+
+def write_atomic(path: Path, data: bytes):
+    """Writes data next to its final name and renames it into place."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def file_digest(path: Path) -> str:
+    """SHA-256 of a file written in place (tiled and animated outputs), read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Per-process state for render workers when running with processes
+_worker_renderer = None
+_worker_images = OrderedDict()
+
+
+def _init_render_worker(shm_name: str, slot_bytes: int, font_paths: Dict[str, str], layout_engine: str,
+                        fallback_fonts: Tuple[str, ...]):
+    global _worker_renderer
+    attach_worker(shm_name, slot_bytes)
+    _worker_renderer = ImageRenderer(font_paths, layout_engine, fallback_fonts)
+
+
+def _render_in_worker(slot: int, params: Dict[str, Any]) -> Optional[Image.Image]:
+    """Renders and copies the frame into the given slot. Returns None when the frame
+    is in the slot, or the image itself (pickled back) when it is too large for a slot."""
+    image_path = params.pop("image_path", None)
+    if image_path:
+        params["loaded_image"] = load_background(_worker_images, image_path)
+    image = _worker_renderer.create_image(**params)
+    if image is None:
+        raise ValueError("Nothing to render (empty text)")
+    return None if worker_write(slot, image) else image
+
+
+class BatchRunner:
+    def __init__(self, renderer: ImageRenderer, output_dir: str, templates_dir: Optional[str] = None,
+                 image_format: str = "png", quality: int = 95, workers: int = 4, max_in_flight: int = 16,
+                 processes: int = 0, slot_bytes: int = DEFAULT_SLOT_BYTES, min_psnr: float = DEFAULT_MIN_PSNR):
+        self.renderer = renderer
+        self.output_dir = Path(output_dir)
+        self.templates_dir = Path(templates_dir) if templates_dir else None
+        self.image_format = image_format.lower()
+        self.quality = quality
+        self.workers = max(1, workers)
+        self.max_in_flight = max(self.workers, processes, max_in_flight)
+        self.processes = processes
+        self.slot_bytes = slot_bytes
+        self._templates = {}
+        self._template_paths = {}
+        self._plans = OrderedDict()
+        self._plans_lock = threading.Lock()
+        self._images = OrderedDict()
+        self._tiled_lock = threading.Lock()
+        self.min_psnr = min_psnr
+        # Bytes saved by "auto" jobs against a truecolor PNG; encode_job runs on several threads
+        self._auto_saved = 0
+        self._auto_lock = threading.Lock()
+
+    def _template_path(self, name: str) -> Path:
+        template_path = self._template_paths.get(name)
+        if template_path is None or not template_path.exists():
+            template_path = None
+            if self.templates_dir:
+                candidate = self.templates_dir / f"{name}.json"
+                if candidate.exists():
+                    template_path = candidate
+                else:
+                    # Fall back to matching the display name stored in the file
+                    for candidate in self.templates_dir.glob("*.json"):
+                        with open(candidate, "r", encoding="utf-8") as f:
+                            if json.load(f).get("name") == name:
+                                template_path = candidate
+                                break
+            if template_path is None:
+                raise ValueError(f"Template not found: {name}")
+            self._template_paths[name] = template_path
+        return template_path
+
+    def _template(self, name: str) -> Tuple[Dict[str, Any], int]:
+        """The template's settings and the mtime they were read at; re-read when the file changes."""
+        template_path = self._template_path(name)
+        mtime = template_path.stat().st_mtime_ns
+        cached = self._templates.get(template_path)
+        if cached is None or cached[1] != mtime:
+            with open(template_path, "r", encoding="utf-8") as f:
+                template_data = json.load(f)
+            if not template_data:
+                raise ValueError(f"Template not found: {name}")
+            cached = self._templates[template_path] = (template_data, mtime)
+        return cached
+
+    def plan(self, job: Dict[str, Any]) -> RenderPlan:
+        """The job's template and overrides compiled once, until the template file changes."""
+        template_version = None
+        if job.get("template"):
+            template_version = (job["template"], self._template(job["template"])[1])
+        overrides = {key: value for key, value in job.items() if key not in PER_JOB_KEYS}
+        key = (template_version, json.dumps(overrides, sort_keys=True, default=str))
+        with self._plans_lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = self.compile_job_plan(job)
+        with self._plans_lock:
+            self._plans[key] = plan
+            if len(self._plans) > PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+        return plan
+
+    def compile_job_plan(self, job: Dict[str, Any]) -> RenderPlan:
+        params = dict(DEFAULT_JOB_PARAMS)
+        image_path = None
+        dpi = None
+        settings = {}
+        if job.get("template"):
+            template_data = self._template(job["template"])[0]
+            params.update(params_from_template(template_data))
+            image_path = template_data.get("image_path") or None
+            dpi = template_data.get("dpi")
+            settings.update(template_data)
+        params.update({key: job[key] for key in DEFAULT_JOB_PARAMS if key in job})
+        params.update(params_from_template(job))
+        image_path = job.get("image_path", image_path)
+        if job.get("dpi") is not None:
+            dpi = job["dpi"]
+        settings.update(job)
+
+        if params["background_type"] in GENERATED_BACKGROUNDS:
+            settings["background_type"] = params["background_type"]
+            settings["background_color"] = params["bg_color"]
+            params["background_spec"] = BackgroundSpec.from_settings(settings)
+        params["blocks"] = parse_blocks(settings.get("blocks"))
+        if params["background_type"] == "existing" and not image_path:
+            raise ValueError("Job uses an existing image background but has no image_path")
+        return compile_plan(self.renderer, params, dpi, image_path)
+
+    def build_params(self, job: Dict[str, Any], load_image: bool = True) -> Dict[str, Any]:
+        """Resolves a job into create_image arguments; without load_image the background stays a path."""
+        plan = self.plan(job)
+        params = plan.params(job.get("text", ""))
+        if plan.background_type == "existing":
+            if load_image:
+                params["loaded_image"] = load_background(self._images, plan.image_path)
+            else:
+                params["image_path"] = plan.image_path
+        return params
+
+    def _output_path(self, job_id: str, job: Dict[str, Any], image_format: str) -> Path:
+        name = Path(job.get("output") or f"{job_id}.{image_format}").name
+        if Path(name).suffix.lower().lstrip(".") not in IMAGE_FORMATS:
+            name = f"{name}.{image_format}"
+        return self.output_dir / name
+
+    def _dpi(self, job: Dict[str, Any]) -> Optional[int]:
+        return self.plan(job).dpi
+
+    def job_renderer(self, job: Dict[str, Any], params: Dict[str, Any]):
+        """The render_*_job method for a job: animated, carousel, print-size (tiled) or a single image."""
+        if job.get("animation"):
+            return self.render_animation_job
+        if job.get("carousel"):
+            return self.render_carousel_job
+        if needs_tiling(params["img_dims"]):
+            return self.render_tiled_job
+        return self.render_job
+
+    def render_job(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> Tuple[str, int]:
+        image = self.renderer.create_image(**params)
+        if image is None:
+            raise ValueError("Nothing to render (empty text)")
+        return self.encode_job(job_id, job, image)
+
+    def render_tiled_job(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> Tuple[str, int]:
+        """Print-size job: rendered and written band by band instead of as one canvas."""
+        image_format = str(job.get("format", self.image_format)).lower()
+        output_path = self._output_path(job_id, job, "png" if image_format == AUTO_FORMAT else image_format)
+        if output_path.suffix.lower() not in TILED_FORMATS:
+            raise ValueError(f"Print-size output must be PNG or TIFF, not {output_path.suffix}")
+        if not card_has_text(params):
+            raise ValueError("Nothing to render (empty text)")
+        # One at a time: each tiled render already runs its own band workers
+        with self._tiled_lock:
+            render_tiled(self.renderer, params, str(output_path), self._dpi(job))
+        return file_digest(output_path), output_path.stat().st_size
+
+    def render_animation_job(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> Tuple[str, int]:
+        """Animated job ("animation": typewriter, fade_in or line_reveal); PNG output is APNG, and formats
+        without animation (JPEG, TIFF) fall back to GIF."""
+        image_format = str(job.get("format", self.image_format)).lower()
+        output_path = self._output_path(job_id, job, image_format if f".{image_format}" in ANIMATION_FORMATS else "gif")
+        export_animation(self.renderer, params, str(output_path), job["animation"],
+                         int(job.get("fps", DEFAULT_FPS)),
+                         float(job.get("animation_seconds", DEFAULT_ANIMATION_SECONDS)),
+                         float(job.get("hold_seconds", DEFAULT_HOLD_SECONDS)),
+                         quality=int(job.get("quality", self.quality)))
+        return file_digest(output_path), output_path.stat().st_size
+
+    def render_carousel_job(self, job_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> Tuple[str, int]:
+        """Carousel job ("carousel": true): numbered pages at "min_font_size"; the journal hashes them in order."""
+        image_format = str(job.get("format", self.image_format)).lower()
+        output_path = self._output_path(job_id, job, "png" if image_format == AUTO_FORMAT else image_format)
+        stats = render_carousel(self.renderer, params, str(output_path), int(job.get("min_font_size", DEFAULT_MIN_FONT_SIZE)),
+                                int(job.get("quality", self.quality)), self._dpi(job))
+        digest = hashlib.sha256()
+        for path in stats["paths"]:
+            digest.update(file_digest(Path(path)).encode("ascii"))
+        return digest.hexdigest(), sum(Path(path).stat().st_size for path in stats["paths"])
+
+    def encode_job(self, job_id: str, job: Dict[str, Any], image: Image.Image) -> Tuple[str, int]:
+        image_format = str(job.get("format", self.image_format)).lower()
+        if image_format == AUTO_FORMAT:
+            return self.encode_auto_job(job_id, job, image)
+        output_path = self._output_path(job_id, job, image_format)
+        buffer = io.BytesIO()
+        write_image(image, buffer, int(job.get("quality", self.quality)),
+                    IMAGE_FORMATS[output_path.suffix.lower().lstrip(".")], self._dpi(job))
+        data = buffer.getvalue()
+        write_atomic(output_path, data)
+        return hashlib.sha256(data).hexdigest(), len(data)
+
+    def encode_auto_job(self, job_id: str, job: Dict[str, Any], image: Image.Image) -> Tuple[str, int]:
+        """Writes the smallest encoding within min_psnr; the extension follows the chosen format."""
+        encoded = encode_auto(image, int(job.get("quality", self.quality)),
+                              float(job.get("min_psnr", self.min_psnr)), self._dpi(job))
+        output_path = self._output_path(job_id, job, "png").with_suffix(encoded.extension)
+        write_atomic(output_path, encoded.data)
+        with self._auto_lock:
+            self._auto_saved += encoded.bytes_saved
+        return hashlib.sha256(encoded.data).hexdigest(), len(encoded.data)
+
+    def _submit_to_process(self, process_pool: ProcessPoolExecutor, pool: ThreadPoolExecutor, ring: FrameRing,
+                           job_id: str, job: Dict[str, Any], params: Dict[str, Any]) -> Future:
+        """Renders in a worker process, then encodes the frame here straight from its slot."""
+        result = Future()
+        slot = ring.acquire()
+        # Jobs sent to a worker carry the background as image_path; it is only loaded there
+        opaque = canvas_mode(params["background_type"], params.get("loaded_image") or params.get("image_path")) == "RGB"
+
+        def encode(returned_image):
+            try:
+                if returned_image is not None:
+                    image = returned_image
+                else:
+                    image = ring.frame(slot, params["img_dims"])
+                    if opaque:
+                        # Slots are always RGBA; opaque cards are RGB in thread mode, keep outputs identical
+                        image = image.convert("RGB")
+                return self.encode_job(job_id, job, image)
+            finally:
+                ring.release(slot)
+
+        def on_rendered(render_future):
+            try:
+                returned_image = render_future.result()
+            except Exception as e:
+                ring.release(slot)
+                result.set_exception(e)
+                return
+            encode_future = pool.submit(encode, returned_image)
+            encode_future.add_done_callback(
+                lambda f: result.set_exception(f.exception()) if f.exception() else result.set_result(f.result()))
+
+        process_pool.submit(_render_in_worker, slot, params).add_done_callback(on_rendered)
+        return result
+
+    def run(self, jobs_path: str) -> Dict[str, Any]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        journal = BatchJournal(self.output_dir / JOURNAL_FILE).open()
+        stats = {"jobs": 0, "rendered": 0, "skipped": 0, "failed": 0, "bytes_written": 0}
+        started = time.time()
+        started_clock = time.perf_counter()
+
+        in_flight = {}
+        in_flight_ids = set()
+        ring = None
+        process_pool = None
+        if self.processes > 0:
+            # One slot per in-flight job, so acquiring a slot never blocks
+            ring = FrameRing(self.max_in_flight, self.slot_bytes)
+            process_pool = ProcessPoolExecutor(self.processes, initializer=_init_render_worker,
+                                               initargs=(ring.name, ring.slot_bytes, self.renderer.font_paths,
+                                                         self.renderer.layout_engine, self.renderer.fallback_fonts))
+
+        with open(self.output_dir / FAILURES_FILE, "a", encoding="utf-8") as failures, \
+                ThreadPoolExecutor(max_workers=self.workers) as pool:
+
+            def record_failure(line_no, job_id, error):
+                stats["failed"] += 1
+                failures.write(json.dumps({"id": job_id, "line": line_no, "error": str(error)}, ensure_ascii=False) + "\n")
+                failures.flush()
+
+            def harvest(done):
+                for future in done:
+                    line_no, job_id = in_flight.pop(future)
+                    in_flight_ids.discard(job_id)
+                    try:
+                        digest, size = future.result()
+                    except Exception as e:
+                        record_failure(line_no, job_id, e)
+                        continue
+                    journal.record(job_id, digest)
+                    stats["rendered"] += 1
+                    stats["bytes_written"] += size
+
+            try:
+                for line_no, job_id, job in iter_jobs(jobs_path):
+                    stats["jobs"] += 1
+                    if job is None:
+                        record_failure(line_no, job_id, "Invalid JSON job")
+                        continue
+                    if job_id in journal.completed or job_id in in_flight_ids:
+                        stats["skipped"] += 1
+                        continue
+                    try:
+                        params = self.build_params(job, load_image=ring is None)
+                    except Exception as e:
+                        record_failure(line_no, job_id, e)
+                        continue
+
+                    # Keep memory constant: never queue more than max_in_flight renders
+                    while len(in_flight) >= self.max_in_flight:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        harvest(done)
+
+                    in_flight_ids.add(job_id)
+                    render = self.job_renderer(job, params)
+                    if ring is not None and render == self.render_job:
+                        future = self._submit_to_process(process_pool, pool, ring, job_id, job, params)
+                    else:
+                        if "image_path" in params:
+                            params["loaded_image"] = load_background(self._images, params.pop("image_path"))
+                        future = pool.submit(render, job_id, job, params)
+                    in_flight[future] = (line_no, job_id)
+
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    harvest(done)
+            finally:
+                journal.close()
+                if process_pool:
+                    process_pool.shutdown()
+                    ring.close()
+
+        elapsed = time.perf_counter() - started_clock
+        summary = dict(stats)
+        summary.update({
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(stats["rendered"] / elapsed, 2) if elapsed > 0 else 0.0,
+            "workers": self.workers,
+            "processes": self.processes,
+            "max_in_flight": self.max_in_flight
+        })
+        if self._auto_saved:
+            summary["auto_bytes_saved"] = self._auto_saved
+        write_atomic(self.output_dir / SUMMARY_FILE, json.dumps(summary, indent=4).encode("utf-8"))
+        return summary
+
+
+def run_batch_cli(argv, fonts_dir: str, templates_dir: str) -> int:
+    """Entry point for `imagetype batch jobs.jsonl -o output_dir`."""
+    parser = argparse.ArgumentParser(prog="imagetype batch", description="Render images from a JSONL job file.")
+    parser.add_argument("jobs", help="JSONL file with one job per line")
+    parser.add_argument("-o", "--output", required=True, help="Output directory (also holds the journal)")
+    parser.add_argument("--format", default="png", choices=sorted([*IMAGE_FORMATS, AUTO_FORMAT]),
+                        help="Default output format (auto picks the smallest encoding per image)")
+    parser.add_argument("--quality", type=int, default=95, help="Encoder quality for JPEG/WebP")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help="Lowest PSNR (dB) a lossy encoding may have when --format is auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--max-in-flight", type=int, default=16, help="Upper bound on queued renders")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Render in this many worker processes, returning frames through shared memory")
+    parser.add_argument("--layout-engine", default="auto", choices=LAYOUT_ENGINES,
+                        help="Text shaping engine (auto uses RAQM when Pillow was built with it)")
+    parser.add_argument("--fallback-font", action="append", default=[], metavar="FONT",
+                        help="Font tried for characters the job's font lacks (repeatable, in order)")
+    args = parser.parse_args(argv)
+
+    renderer = ImageRenderer(default_font_paths(fonts_dir), args.layout_engine, args.fallback_font)
+    runner = BatchRunner(renderer, args.output, templates_dir,
+                         args.format, args.quality, args.workers, args.max_in_flight, args.processes,
+                         min_psnr=args.min_psnr)
+    summary = runner.run(args.jobs)
+    print(f"Rendered {summary['rendered']}, skipped {summary['skipped']}, failed {summary['failed']} "
+          f"in {summary['elapsed_seconds']}s ({summary['images_per_second']} images/s)")
+    if "auto_bytes_saved" in summary:
+        print(f"Auto format saved {summary['auto_bytes_saved'] / 1e6:.1f} MB against truecolor PNG (estimated)")
+    return 1 if summary["failed"] else 0
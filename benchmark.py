@@ -0,0 +1,834 @@
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageDraw
+
+from animation import ANIMATION_EFFECTS, TextAnimation, export_animation
+from auto_encoder import encode_auto
+from carousel import paginate, render_carousel
+from downloads import ResumableDownload
+from backgrounds import BackgroundImage, BackgroundSpec, GENERATED_BACKGROUNDS, generate_background
+from blocks import parse_blocks
+from frame_transport import FrameRing, attach_worker, worker_write
+from image_renderer import ImageRenderer, default_font_paths, write_image
+from render_plan import compile_plan
+from text_effects import TextEffects
+from text_layout import advance_table, display_form, load_font, measure_form, raqm_available, word_widths
+from update_package import PackageExtractor, file_sha256
+from tiled_render import render_region, render_tiled
+
+APP_DIR = Path(__file__).resolve().parent
+FONTS_DIR = str(APP_DIR / "fonts")
+PORTRAIT = (1080, 1920)
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Registers a bench_* function under its short name."""
+    BENCHMARKS[func.__name__[len("bench_"):]] = func
+    return func
+
+
+def timed(func, repeat: int):
+    """Runs func repeat times and returns the per-call durations in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples, unit: str = "ms"):
+    print(f"  {name:<40} median {statistics.median(samples):9.3f} {unit}   "
+          f"min {min(samples):9.3f} {unit}   n={len(samples)}")
+
+
+def _pickled_frame(size):
+    return Image.new("RGBA", size, (20, 40, 60, 255))
+
+
+def _shared_frame(slot, size):
+    worker_write(slot, Image.new("RGBA", size, (20, 40, 60, 255)))
+
+
+@benchmark
+def bench_frame_transport(repeat: int = 40):
+    """Round trip of a rendered 1080x1920 RGBA frame from a worker process to the parent."""
+    with ProcessPoolExecutor(1) as pool:
+        pool.submit(_pickled_frame, (1, 1)).result()
+        report("pickled frame", timed(lambda: pool.submit(_pickled_frame, PORTRAIT).result().load(), repeat))
+
+    with FrameRing(2) as ring, ProcessPoolExecutor(1, initializer=attach_worker,
+                                                   initargs=(ring.name, ring.slot_bytes)) as pool:
+        pool.submit(_shared_frame, 0, (1, 1)).result()
+
+        def shared_round_trip():
+            slot = ring.acquire()
+            pool.submit(_shared_frame, slot, PORTRAIT).result()
+            ring.frame(slot, PORTRAIT).load()
+            ring.release(slot)
+
+        report("shared memory slot", timed(shared_round_trip, repeat))
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process (Unix only)."""
+    status = Path("/proc/self/status")
+    if status.exists():
+        # ru_maxrss survives exec on Linux, so a spawned child would report its parent's peak
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _render_previews(image_path: str, bounded: bool, previews: int) -> float:
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    if bounded:
+        loaded_image = BackgroundImage.open(image_path)
+    else:
+        loaded_image = Image.open(image_path)
+    for i in range(previews):
+        renderer.create_image(f"Preview {i}", "existing", PORTRAIT, "black", loaded_image, "Amiri",
+                              "regular", "white", False, "center", for_preview=True)
+    return peak_rss_mb()
+
+
+@benchmark
+def bench_background_memory(repeat: int = 5):
+    """Peak RSS while previewing over a 50MP photo, unbounded vs. downscaled at load."""
+    if sys.platform == "win32":
+        print("  skipped: peak RSS is measured with the resource module")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = str(Path(tmp) / "large.jpg")
+        Image.radial_gradient("L").resize((8660, 5774)).convert("RGB").save(image_path, quality=90)
+        for bounded in (False, True):
+            # A fresh spawned process per variant so each peak is measured in isolation
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                start = time.perf_counter()
+                peak = pool.submit(_render_previews, image_path, bounded, repeat).result()
+                elapsed = (time.perf_counter() - start) * 1000 / repeat
+            label = "downscaled at load" if bounded else "full-resolution image"
+            print(f"  {label:<40} peak RSS {peak:8.1f} MB   {elapsed:8.1f} ms/preview")
+
+
+@benchmark
+def bench_generated_backgrounds(repeat: int = 20):
+    """Uncached generation of each 1080x1920 background type, then a cached lookup."""
+    for kind in GENERATED_BACKGROUNDS:
+        spec = BackgroundSpec(kind, ("navy", "pink", "gold"), angle=30.0)
+        report(kind, timed(lambda: generate_background.__wrapped__(spec, PORTRAIT), repeat))
+    spec = BackgroundSpec("linear_gradient", ("navy", "gold"))
+    generate_background(spec, PORTRAIT)
+    report("cached lookup", timed(lambda: generate_background(spec, PORTRAIT), repeat))
+
+
+ARABIC_PARAGRAPH = ("بسم الله الرحمن الرحيم، الحمد لله رب العالمين. "
+                    "هذا نص تجريبي لقياس سرعة تشكيل النصوص العربية وتوزيعها على الأسطر.\n"
+                    "Mixed text with English words and numbers 2024 inside.")
+
+
+@benchmark
+def bench_layout_engines(repeat: int = 20):
+    """Fit-to-width render of a mixed Arabic/English paragraph with each layout engine."""
+    for engine in ("basic", "raqm"):
+        if engine == "raqm" and not raqm_available():
+            print("  raqm: skipped, this Pillow build has no libraqm")
+            continue
+        renderer = ImageRenderer(default_font_paths(FONTS_DIR), engine)
+        render = lambda: renderer.create_image(ARABIC_PARAGRAPH, "solid", PORTRAIT, "black", None, "Amiri",
+                                               "regular", "white", True, "center")
+        render()
+        report(engine, timed(render, repeat))
+
+
+@benchmark
+def bench_incremental_layout(repeat: int = 10):
+    """A 200-line text: layout cost cold vs. after editing one line, then the full fit-to-width render."""
+    lines = [f"Line {i}: مرحبا بالعالم hello" for i in range(200)]
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    font = load_font(renderer.font_paths["regular"], 40, renderer.layout_engine)
+    draw = ImageDraw.Draw(Image.new("RGB", PORTRAIT))
+    edits = iter(range(10 ** 9))
+
+    def edit_one_line():
+        lines[100] = f"Edited {next(edits)}: مرحبا بالعالم hello"
+
+    def cold_layout():
+        renderer.layout_cache.clear()
+        renderer.layout_text(draw, "\n".join(lines), font, 972)
+
+    def edited_layout():
+        edit_one_line()
+        renderer.layout_text(draw, "\n".join(lines), font, 972)
+
+    report("layout, cold", timed(cold_layout, repeat))
+    report("layout, one line edited", timed(edited_layout, repeat))
+
+    render = lambda: renderer.create_image("\n".join(lines), "solid", PORTRAIT, "black", None, "Amiri",
+                                           "regular", "white", True, "center")
+    render()
+    misses = renderer.layout_cache.misses
+    report("fit-to-width render, one line edited", timed(lambda: (edit_one_line(), render()), max(1, repeat // 5)))
+    print(f"  paragraphs laid out per edit (all fit probes): {(renderer.layout_cache.misses - misses) / max(1, repeat // 5):.1f}")
+
+
+def _textlength_fit(draw, text, font_identifier, max_width, max_height, low_size=10, high_size=1000) -> int:
+    """The fit solver as it was: every candidate line of every probe measured with textlength."""
+    def height(font):
+        bottoms = []
+        for paragraph in text.split("\n"):
+            words, lines = paragraph.split(), []
+            for word in words:
+                if lines and draw.textlength(measure_form(lines[-1] + " " + word, "basic"), font=font) <= max_width:
+                    lines[-1] += " " + word
+                else:
+                    lines.append(word)
+            bottoms += [draw.textbbox((0, 0), measure_form(line, "basic"), font=font)[3] for line in lines or [""]]
+        spacing = draw.textbbox((0, 0), "A", font=font)[3] + 4
+        return max(index * spacing + bottom for index, bottom in enumerate(bottoms))
+
+    best_size = low_size
+    while low_size <= high_size:
+        mid_size = (low_size + high_size) // 2
+        if height(load_font(font_identifier, mid_size)) < max_height:
+            best_size, low_size = mid_size, mid_size + 1
+        else:
+            high_size = mid_size - 1
+    return best_size
+
+
+@benchmark
+def bench_text_measure(repeat: int = 5):
+    """Fit-to-width size search on the basic engine: textlength per candidate line vs. advance tables."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR), "basic")
+    font_identifier = renderer.font_paths["regular"]
+    draw = ImageDraw.Draw(Image.new("RGB", PORTRAIT))
+    words = ARABIC_PARAGRAPH.split()
+    worst = 0.0
+    for size in (11, 24, 57, 120, 300):
+        font, table = load_font(font_identifier, size), advance_table(font_identifier, size)
+        for start in range(len(words)):
+            line = words[start:start + 1 + start % 9]
+            widths, join_widths = word_widths(table, line)
+            exact = draw.textlength(measure_form(" ".join(line), "basic"), font=font)
+            worst = max(worst, abs(widths.sum() + join_widths.sum() - exact))
+    print(f"  {'largest |table - textlength|':<40} {worst:9.3f} px")
+
+    text = "\n".join([ARABIC_PARAGRAPH] * 6)
+    sizes = {}
+
+    def textlength_fit():
+        load_font.cache_clear()
+        sizes["textlength"] = _textlength_fit(draw, text, font_identifier, 972, 1728)
+
+    def table_fit():
+        load_font.cache_clear()
+        advance_table.cache_clear()
+        renderer.layout_cache.clear()
+        sizes["tables"] = renderer.fitting_font_size(draw, text, font_identifier, 972, 1728)
+
+    report("textlength per candidate line, cold", timed(textlength_fit, repeat))
+    report("advance tables, cold", timed(table_fit, repeat))
+    print(f"  {'fitted size':<40} {sizes['textlength']} (textlength), {sizes['tables']} (tables)")
+
+
+POSTER = (7016, 9933)
+
+
+def _render_poster(out_path: str, tiled: bool) -> float:
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    params = dict(text=ARABIC_PARAGRAPH, background_type="linear_gradient", img_dims=POSTER, bg_color="navy",
+                  loaded_image=None, font_family="Amiri", font_style="regular", text_color="white",
+                  fit_to_width=True, text_position="center", enable_shadow=True,
+                  background_spec=BackgroundSpec("linear_gradient", ("navy", "gold")))
+    if tiled:
+        render_tiled(renderer, params, out_path, dpi=300)
+    else:
+        renderer.create_image(**params).save(out_path, dpi=(300, 300))
+    return peak_rss_mb()
+
+
+@benchmark
+def bench_tiled_render(repeat: int = 1):
+    """A1 poster (7016x9933) at 300 DPI: one full canvas vs. banded rendering and encoding."""
+    if sys.platform == "win32":
+        print("  skipped: peak RSS is read from /proc or the resource module")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        for tiled in (False, True):
+            out_path = str(Path(tmp) / f"poster_{tiled}.png")
+            samples, peak = [], 0.0
+            for _ in range(repeat):
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    start = time.perf_counter()
+                    peak = pool.submit(_render_poster, out_path, tiled).result()
+                    samples.append(time.perf_counter() - start)
+            label = "banded, thread pool" if tiled else "single canvas"
+            print(f"  {label:<40} peak RSS {peak:8.1f} MB   {statistics.median(samples):8.2f} s   "
+                  f"{Path(out_path).stat().st_size / 1e6:6.1f} MB file")
+
+
+@benchmark
+def bench_auto_encoder(repeat: int = 5):
+    """Truecolor PNG vs. the auto encoder on flat, transparent, gradient and noise cards (PNG size as estimated)."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    cards = {
+        "solid": ("solid", None),
+        "transparent": ("transparent", None),
+        "linear_gradient": ("linear_gradient", BackgroundSpec("linear_gradient", ("navy", "gold"))),
+        "noise": ("noise", BackgroundSpec("noise", ("navy", "gold"))),
+    }
+    for name, (background_type, spec) in cards.items():
+        image = renderer.create_image(ARABIC_PARAGRAPH, background_type, PORTRAIT, "black", None, "Amiri",
+                                      "regular", "white", True, "center", background_spec=spec)
+        png = lambda: write_image(image, tempfile.SpooledTemporaryFile(), image_format="PNG")
+        encoded = encode_auto(image)
+        report(f"{name}: PNG", timed(png, repeat))
+        report(f"{name}: auto ({encoded.label})", timed(lambda: encode_auto(image), repeat))
+        print(f"  {'':<40} {encoded.baseline_size / 1024:8.1f} KB -> {len(encoded.data) / 1024:8.1f} KB   "
+              f"saved {100 * encoded.bytes_saved / encoded.baseline_size:5.1f}%   PSNR {encoded.psnr:.1f} dB")
+
+
+@benchmark
+def bench_animation(repeat: int = 3):
+    """Frames per second of animated export: incremental frames vs. create_image per frame, then per format."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    params = dict(text=ARABIC_PARAGRAPH, background_type="linear_gradient", img_dims=(1080, 1080), bg_color="navy",
+                  loaded_image=None, font_family="Amiri", font_style="regular", text_color="white",
+                  fit_to_width=True, text_position="center", enable_shadow=True,
+                  background_spec=BackgroundSpec("linear_gradient", ("navy", "gold")))
+
+    # What the export would cost without layout reuse: a full render per typewriter frame
+    frame_count = TextAnimation(renderer, params, "typewriter").frame_count
+    texts = [params["text"][:round(len(params["text"]) * i / (frame_count - 1))] or " " for i in range(frame_count)]
+    samples = timed(lambda: [renderer.create_image(**dict(params, text=text)) for text in texts], repeat)
+    print(f"  {'create_image per frame':<40} {frame_count * 1000 / statistics.median(samples):8.1f} frames/s")
+
+    for effect in ANIMATION_EFFECTS:
+        animation = TextAnimation(renderer, params, effect)
+        samples = timed(lambda: [frame for frame in animation.frames()], repeat)
+        setup = timed(lambda: TextAnimation(renderer, params, effect), 1)[0]
+        print(f"  {effect + ', frames only':<40} {animation.frame_count * 1000 / statistics.median(samples):8.1f} frames/s"
+              f"   setup {setup:7.1f} ms   {animation.frame_count} frames")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for extension in (".gif", ".png", ".webp"):
+            stats = export_animation(renderer, params, str(Path(tmp) / f"typewriter{extension}"), "typewriter")
+            print(f"  {'typewriter export ' + extension:<40} {stats['frames_per_second']:8.1f} frames/s"
+                  f"   {stats['bytes'] / 1024:8.1f} KB")
+
+
+@benchmark
+def bench_carousel(repeat: int = 3):
+    """A 60-sentence post split into 1080x1080 pages at 60px: pagination, then the numbered set."""
+    text = " ".join(f"Sentence {i} of a long post, which goes on for a little while. " for i in range(60))
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    font = load_font(renderer.font_paths["regular"], 60, renderer.layout_engine)
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def cold_paginate():
+        renderer.layout_cache.clear()
+        return paginate(renderer, draw, text, font, 1040, 1040)
+
+    report("paginate, cold layout cache", timed(cold_paginate, repeat))
+    params = dict(text=text, background_type="solid", img_dims=(1080, 1080), bg_color="navy", loaded_image=None,
+                  font_family="Amiri", font_style="regular", text_color="white", fit_to_width=False,
+                  text_position="center", enable_shadow=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "page.png")
+        pages = render_carousel(renderer, params, path, 60)["pages"]
+        report(f"{pages} pages", timed(lambda: render_carousel(renderer, params, path, 60), repeat))
+
+
+@benchmark
+def bench_blocks(repeat: int = 10):
+    """Title/body/footer card at 1080x1080: every block redrawn vs. editing only the footer."""
+    blocks = parse_blocks([
+        {"name": "title", "text": "عنوان البطاقة Title", "box": [0.05, 0.04, 0.9, 0.18], "font_style": "bold", "fit": "width"},
+        {"name": "body", "box": [0.05, 0.24, 0.9, 0.6], "font_size": 110, "fit": "shrink"},
+        {"name": "footer", "text": "@handle", "box": [0, 0.86, 1, 0.14], "font_size": 45, "position": "bottom_right"}
+    ])
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    params = dict(text="مرحبا بالعالم hello world " * 12, background_type="solid", img_dims=(1080, 1080), bg_color="black",
+                  loaded_image=None, font_family="Amiri", font_style="regular", text_color="white", fit_to_width=False,
+                  text_position="center", enable_shadow=False, blocks=blocks)
+    edits = iter(range(10 ** 9))
+
+    def all_blocks():
+        renderer.block_layers.clear()
+        renderer.create_image(**params)
+
+    def footer_edited():
+        footer = blocks[2]._replace(text=f"@handle {next(edits)}")
+        renderer.create_image(**dict(params, blocks=blocks[:2] + (footer,)))
+
+    report("all blocks drawn (layout cached)", timed(all_blocks, repeat))
+    report("footer edited, title and body cached", timed(footer_edited, repeat))
+
+
+@benchmark
+def bench_text_effects(repeat: int = 10):
+    """Text effects on a 1080x1920 card: each effect with its layer rendered vs. taken from the cache."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    params = dict(text=ARABIC_PARAGRAPH, background_type="linear_gradient", img_dims=PORTRAIT, bg_color="navy",
+                  loaded_image=None, font_family="Amiri", font_style="regular", text_color="white",
+                  fit_to_width=False, text_position="center", font_size=90, enable_shadow=True,
+                  background_spec=BackgroundSpec("linear_gradient", ("navy", "gold")))
+    with tempfile.TemporaryDirectory() as tmp:
+        texture_path = str(Path(tmp) / "texture.png")
+        Image.effect_noise((64, 64), 48).convert("RGB").save(texture_path)
+        variants = {
+            "outline 8": TextEffects(8),
+            "glow 16": TextEffects(glow_radius=16, glow_color="gold"),
+            "gradient fill": TextEffects(fill="gradient", fill_colors=("white", "gold", "orange"), fill_angle=45),
+            "texture fill": TextEffects(fill="texture", texture_path=texture_path),
+            "inner shadow 4": TextEffects(inner_shadow=4),
+            "all of them": TextEffects(8, "black", 16, "gold", "gradient", ("white", "orange"), 45.0, None, 4),
+        }
+        renderer.create_image(**params)
+        report("plain 2 px outline (Pillow stroke)", timed(lambda: renderer.create_image(**params), repeat))
+
+        font = renderer.load_font(renderer.font_paths["regular"], 90)
+        measure = ImageDraw.Draw(Image.new("RGB", PORTRAIT))
+        wrapped = display_form(renderer.wrap_text(measure, ARABIC_PARAGRAPH, font, PORTRAIT[0] - 40), renderer.layout_engine)
+
+        def pillow_stroke():
+            ImageDraw.Draw(Image.new("RGB", PORTRAIT)).multiline_text(
+                (PORTRAIT[0] / 2, PORTRAIT[1] / 2), wrapped, font=font, fill="white", anchor="mm", align="center",
+                stroke_width=8, stroke_fill="black")
+        report("text alone, Pillow stroke_width=8", timed(pillow_stroke, repeat))
+
+        for name, effects in variants.items():
+            card = dict(params, text_effects=effects)
+
+            def rendered():
+                renderer.effect_layers.clear()
+                renderer.create_image(**card)
+            report(f"{name}, layer rendered", timed(rendered, repeat))
+            report(f"{name}, layer cached", timed(lambda: renderer.create_image(**card), repeat))
+
+
+@benchmark
+def bench_render_plan(repeat: int = 50):
+    """Short mixed-script card at 1200x675: compiling settings per render vs. rendering from a compiled plan."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    settings = dict(background_type="solid", img_dims=(1200, 675), bg_color="navy", font_family="Amiri",
+                    font_style="bold", text_color="yellow", fit_to_width=False, text_position="center",
+                    font_size=90, enable_shadow=True)
+    texts = iter(f"Offer {i}: خصم {i}% ★ today" for i in range(10 ** 9))
+    plan = compile_plan(renderer, settings)
+
+    report("compile plan", timed(lambda: compile_plan(renderer, settings), repeat))
+    report("render, plan compiled per image", timed(lambda: renderer.create_image(**compile_plan(renderer, settings).params(next(texts))), repeat))
+    report("render from compiled plan", timed(lambda: renderer.create_image(**plan.params(next(texts))), repeat))
+
+
+class _ReleaseHandler(BaseHTTPRequestHandler):
+    """Serves server.payload with Range support, server.delay seconds per 64 KB; drops the connection once after server.drop_after bytes."""
+
+    def do_GET(self):
+        payload, start = self.server.payload, 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range") in (None, '"release"'):
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.send_header("ETag", '"release"')
+        self.end_headers()
+        end = len(payload)
+        if self.server.drop_after and start < self.server.drop_after:
+            end, self.server.drop_after = self.server.drop_after, 0
+        self.server.served += end - start
+        for offset in range(start, end, 1 << 16):
+            self.wfile.write(payload[offset:min(offset + (1 << 16), end)])
+            time.sleep(self.server.delay)
+        if end < len(payload):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def _download(server, path, drop_after=0, delay=0.0):
+    server.drop_after, server.served, server.delay = drop_after, 0, delay
+    reports = []
+    download = ResumableDownload(f"http://127.0.0.1:{server.server_port}/release.zip", path, on_progress=reports.append)
+    start = time.perf_counter()
+    download.run()
+    return time.perf_counter() - start, len(reports), download.resumed_bytes
+
+
+@benchmark
+def bench_download(repeat: int = 3):
+    """64 MB update from a local server: full download, progress reports at ~16 MB/s, then a drop at 60% and resume."""
+    payload = os.urandom(64 * 1024 * 1024)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ReleaseHandler)
+    server.payload = payload
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "release.zip"
+        durations, reports = [], []
+        for _ in range(repeat):
+            seconds, count, _ = _download(server, path)
+            durations.append(seconds * 1000)
+            reports.append(count)
+        report("full download", durations)
+        print(f"  {'progress reports per download':<40} {statistics.median(reports):9.0f}   "
+              f"(8 KB chunks would report {len(payload) // 8192})")
+        seconds, count, _ = _download(server, path, delay=0.004)
+        print(f"  {'progress reports/s at ~16 MB/s':<40} {count / seconds:9.1f}   ({count} in {seconds:.1f} s)")
+
+        drop = len(payload) * 6 // 10
+        seconds, count, resumed = _download(server, path, drop_after=drop)
+        intact = hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(payload).digest()
+        print(f"  {'dropped at 60%, resumed':<40} {seconds * 1000:9.3f} ms   resumed from {resumed >> 20} MB, "
+              f"{server.served >> 20} MB sent in all, file {'intact' if intact else 'CORRUPT'}")
+    server.shutdown()
+
+
+def _release_zip(installed: Path) -> bytes:
+    """A 40 MB release zip (photos, code, fonts); half of its files are already in installed."""
+    package = io.BytesIO()
+    with zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED) as release:
+        for index in range(40):
+            data = os.urandom(1 << 20) if index % 2 else (b"def render(text):  # %d\n" % index) * 40000
+            name = f"lib/module_{index:02d}.bin"
+            release.writestr(f"ImageType/{name}", data)
+            if index < 20:
+                (installed / name).parent.mkdir(parents=True, exist_ok=True)
+                (installed / name).write_bytes(data)
+    return package.getvalue()
+
+
+@benchmark
+def bench_update_pipeline(repeat: int = 3):
+    """40 MB release zip from a local server at ~32 MB/s: download, verify, then extract vs. all three pipelined."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        installed = tmp / "installed"
+        payload = _release_zip(installed)
+        digest = hashlib.sha256(payload).hexdigest()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _ReleaseHandler)
+        server.payload, server.drop_after, server.served, server.delay = payload, 0, 0, 0.002
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/release.zip"
+        path = tmp / "release.zip"
+        changed = []
+
+        def sequential():
+            ResumableDownload(url, path).run()
+            assert file_sha256(path) == digest
+            # Given no chunks, the extractor reads the whole finished file from disk
+            extractor = PackageExtractor(path, tmp / "staging", installed)
+            extractor.start()
+            changed[:] = extractor.finish(len(payload)).changed
+
+        def pipelined():
+            download = ResumableDownload(url, path, expected_sha256=digest)
+            extractor = PackageExtractor(download.part_path, tmp / "staging", installed)
+            download.on_data, download.on_complete = extractor.feed, extractor.finish
+            extractor.start()
+            download.run()
+            changed[:] = extractor.result.changed
+
+        report("download, then hash, then extract", timed(sequential, repeat))
+        report("hash and extract while downloading", timed(pipelined, repeat))
+        print(f"  {'files replaced':<40} {len(changed):9d}   of 40 (20 unchanged)")
+        server.shutdown()
+
+
+def _cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a running process (Linux only)."""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+@benchmark
+def bench_hot_folder(repeat: int = 2000):
+    """`imagetype watch` under a burst of dropped job files (repeat = file count; try 10000): latency, throughput, idle CPU."""
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, output = Path(tmp) / "in", Path(tmp) / "out"
+        folder.mkdir()
+        daemon = subprocess.Popen([sys.executable, str(APP_DIR / "main.py"), "watch", str(folder), "-o", str(output)],
+                                  stdout=subprocess.DEVNULL, env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+        status_path = output / "status.json"
+        try:
+            while not status_path.exists():
+                time.sleep(0.1)
+            start = time.perf_counter()
+            for index in range(repeat):
+                job = {"text": f"Post {index} منشور", "image_dimensions": [320, 180], "font_size": 40}
+                staging = folder / f".job{index}.tmp"
+                staging.write_text(json.dumps(job, ensure_ascii=False), encoding="utf-8")
+                os.replace(staging, folder / f"job{index}.json")
+            dropped = time.perf_counter() - start
+            while True:
+                time.sleep(0.2)
+                status = json.loads(status_path.read_text(encoding="utf-8"))
+                if status["state"] == "idle" and status["rendered"] + status["failed"] + status["duplicates"] >= repeat:
+                    break
+            elapsed = time.perf_counter() - start
+            idle_start = _cpu_seconds(daemon.pid)
+            time.sleep(5)
+            idle_end = _cpu_seconds(daemon.pid)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+    latency = status.get("latency_seconds", {})
+    print(f"  {'files dropped':<40} {repeat:9d}   in {dropped:.1f} s")
+    print(f"  {'burst drained':<40} {elapsed:9.1f} s    {status['rendered'] / elapsed:.1f} images/s, {status['failed']} failed")
+    print(f"  {'latency, drop to output (last 1000)':<40} median {latency.get('median', 0):.2f} s   p95 {latency.get('p95', 0):.2f} s")
+    if idle_start is not None:
+        print(f"  {'idle CPU after the burst':<40} {(idle_end - idle_start) / 5 * 100:9.2f} %")
+
+
+@benchmark
+def bench_preview_zoom(repeat: int = 60):
+    """Zooming and panning a 1080x1920 preview: cached mipmap tiles vs. rescaling the whole frame per step."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PIL.ImageQt import ImageQt
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QPixmap
+    from PySide6.QtWidgets import QApplication
+    from preview_view import PreviewView
+
+    app = QApplication.instance() or QApplication([])
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    params = dict(text=ARABIC_PARAGRAPH, background_type="linear_gradient", img_dims=PORTRAIT, bg_color="navy",
+                  loaded_image=None, font_family="Amiri", font_style="regular", text_color="white",
+                  fit_to_width=True, text_position="center", enable_shadow=True, for_preview=True,
+                  background_spec=BackgroundSpec("linear_gradient", ("navy", "gold")))
+    qimage = ImageQt(renderer.create_image(**params))
+    view = PreviewView()
+    view.resize(800, 900)
+    view.show()
+    app.processEvents()
+    view.setImage(qimage)
+    view.viewport().repaint()
+    zooms = [view.zoom() * 1.25 ** (step % 12) for step in range(repeat)]
+
+    def zoom_step(step=iter(range(repeat * 2))):
+        view.zoom_by(zooms[next(step) % repeat] / view.zoom())
+        view.viewport().repaint()
+
+    def pan_step(step=iter(range(repeat * 2))):
+        bar = view.verticalScrollBar()
+        bar.setValue(bar.value() + (40 if next(step) % 40 < 20 else -40))
+        view.viewport().repaint()
+
+    pixmap = QPixmap.fromImage(qimage)
+
+    def rescale_step(step=iter(range(repeat * 2))):
+        # What the QLabel preview did: scale the whole frame to the new size
+        zoom = zooms[next(step) % repeat]
+        pixmap.scaled(round(PORTRAIT[0] * zoom), round(PORTRAIT[1] * zoom),
+                      Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+    report("rescale whole pixmap per zoom step", timed(rescale_step, repeat))
+    report("tiled view, zoom step + repaint", timed(zoom_step, repeat))
+    view.zoom_by(2 / view.zoom())
+    report("tiled view, pan step at 200% + repaint", timed(pan_step, repeat))
+    region = view.visible_region()
+    view.close()
+    app.processEvents()
+
+    detail = dict(params, img_dims=(PORTRAIT[0] * 2, PORTRAIT[1] * 2))
+    box = tuple(value * 2 for value in region)
+    report("detail: whole frame at 2x", timed(lambda: renderer.create_image(**detail), 2))
+    report("detail: region in view at 2x", timed(lambda: render_region(renderer, detail, box), 2))
+
+
+def _typing_session(pooled: bool, keystrokes: int) -> dict:
+    """Types into a live preview like the main window does; counts frame-sized allocations on the way."""
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PySide6.QtGui import QPixmap
+    from PySide6.QtWidgets import QApplication
+    import preview_view
+    import render_queue
+
+    counts = {"canvases": 0, "conversions": 0, "pixmaps": 0}
+    new_image = Image.new
+
+    def counted_new(mode, size, *args, **kwargs):
+        counts["canvases"] += tuple(size) == PORTRAIT
+        return new_image(mode, size, *args, **kwargs)
+
+    def counted_imageqt(image):
+        counts["conversions"] += 2  # the converted bytes and the copy handed to the GUI thread
+        return ImageQt(image)
+
+    class CountedPixmap(QPixmap):
+        def __init__(self, *args):
+            super().__init__(*args)
+            counts["pixmaps"] += 1
+
+    from PIL.ImageQt import ImageQt
+    Image.new = counted_new
+    render_queue.ImageQt = counted_imageqt
+    preview_view.QPixmap = CountedPixmap
+
+    app = QApplication([])
+    queue = render_queue.RenderQueue(pooled=pooled)
+    view = preview_view.PreviewView()
+    view.resize(800, 900)
+    view.show()
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    shown = {"image": None, "token": 0, "frames": 0}
+
+    def on_image(image, qimage, action, token):
+        if token > shown["token"]:
+            shown["token"] = token
+            replaced, shown["image"] = shown["image"], image
+            view.setImage(qimage)
+            view.viewport().repaint()
+            queue.release(replaced)
+            shown["frames"] += 1
+        else:
+            queue.release(image)
+
+    queue.finished_image.connect(on_image)
+    text = (ARABIC_PARAGRAPH + " ") * 2
+    start = time.perf_counter()
+    for index in range(1, keystrokes + 1):
+        params = dict(text=text[:index * 4], background_type="linear_gradient", img_dims=PORTRAIT, bg_color="navy",
+                      loaded_image=None, font_family="Amiri", font_style="regular", text_color="white",
+                      fit_to_width=False, text_position="center", font_size=64, enable_shadow=True, for_preview=True,
+                      background_spec=BackgroundSpec("linear_gradient", ("navy", "gold")))
+        last = queue.submit("preview", renderer, params)
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.002)
+    while shown["token"] < last:
+        app.processEvents()
+        time.sleep(0.002)
+    elapsed = time.perf_counter() - start
+    queue.shutdown()
+    return dict(counts, frames=shown["frames"], seconds=elapsed, peak=peak_rss_mb(),
+                pooled=queue.canvases.allocations if pooled else 0)
+
+
+@benchmark
+def bench_progressive_preview(repeat: int = 12):
+    """Typing into a slow preview (long text, shadow, photo background): time to the first frame per keystroke."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    import render_queue
+    from preview_view import PreviewView
+
+    app = QApplication.instance() or QApplication([])
+    budget = render_queue.DRAFT_BUDGET_SECONDS
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = str(Path(tmp) / "photo.jpg")
+        Image.radial_gradient("L").resize((4000, 3000)).convert("RGB").save(image_path, quality=90)
+        for drafts in (False, True):
+            render_queue.DRAFT_BUDGET_SECONDS = budget if drafts else float("inf")
+            queue = render_queue.RenderQueue()
+            view = PreviewView()
+            view.resize(800, 900)
+            view.show()
+            renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+            background = BackgroundImage.open(image_path)
+            shown = {"token": 0, "image": None}
+            counts = {"draft": 0, "preview": 0}
+
+            def on_image(image, qimage, action, token):
+                if token > shown["token"]:
+                    shown["token"] = token
+                    replaced, shown["image"] = shown["image"], image
+                    view.setImage(qimage, draft=action == "draft")
+                    queue.release(replaced)
+                    counts[action] += 1
+                else:
+                    queue.release(image)
+
+            queue.finished_image.connect(on_image)
+            latencies, previous = {True: [], False: []}, 0
+            text = ARABIC_PARAGRAPH * 3
+            for keystroke in range(repeat + 1):
+                params = dict(text=text + f" {keystroke}", background_type="existing", img_dims=PORTRAIT, bg_color="black",
+                              loaded_image=background, font_family="Amiri", font_style="regular", text_color="white",
+                              fit_to_width=True, text_position="center", enable_shadow=True, for_preview=True, blocks=())
+                start = time.perf_counter()
+                token = queue.submit("preview", renderer, params)
+                while shown["token"] <= previous:
+                    app.processEvents()
+                    time.sleep(0.001)
+                if keystroke:  # the first keystroke only measures how long a full preview takes
+                    latencies[keystroke % 4 == 1].append((time.perf_counter() - start) * 1000)
+                previous = token
+                # The next key comes before a slow full preview would finish, then typing pauses
+                pause = time.perf_counter() + (0.05 if keystroke % 4 else 1.5)
+                while time.perf_counter() < pause:
+                    app.processEvents()
+                    time.sleep(0.001)
+            queue.shutdown()
+            view.close()
+            label = "draft first, then full preview" if drafts else "full preview only"
+            print(f"  {label}: {counts['draft']} drafts and {counts['preview']} full previews shown")
+            report("first frame, key after a pause", latencies[True])
+            report("first frame, key while typing", latencies[False])
+    render_queue.DRAFT_BUDGET_SECONDS = budget
+
+
+@benchmark
+def bench_preview_memory(repeat: int = 100):
+    """Typing into a 1080x1920 preview (repeat = keystrokes, 50 ms apart): frame allocations and peak RSS."""
+    if sys.platform == "win32":
+        print("  skipped: peak RSS is read from /proc or the resource module")
+        return
+    for pooled in (False, True):
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(_typing_session, pooled, repeat).result()
+        label = "canvas pool, pooled QImage buffers" if pooled else "new canvas and ImageQt copy per frame"
+        allocations = result["canvases"] + result["conversions"] + result["pooled"]
+        print(f"  {label:<40} {result['frames']:4d} frames   {allocations:4d} frame buffers   "
+              f"{result['pixmaps']:5d} tile pixmaps   peak RSS {result['peak']:7.1f} MB   {result['seconds']:6.1f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ImageType performance benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=None, help="Override the number of iterations")
+    args = parser.parse_args(argv)
+
+    for name in args.names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            parser.error(f"Unknown benchmark: {name}")
+        print(f"{name}:")
+        func = BENCHMARKS[name]
+        func() if args.repeat is None else func(repeat=args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
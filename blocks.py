@@ -0,0 +1,155 @@
+from typing import Any, Dict, Iterable, Mapping, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from text_effects import TextEffects
+from text_layout import LayoutCache
+
+# How a block's text is sized inside its box:
+# "wrap" keeps the font size and wraps to the box width,
+# "shrink" wraps like "wrap" but lowers the size until the text fits the box height,
+# "width" picks the largest size that fits the box, like the fit-to-width checkbox.
+FIT_RULES = ("wrap", "shrink", "width")
+
+# Card settings a block inherits when it leaves them out
+INHERITED_FIELDS = ("text", "font_family", "font_style", "font_size", "text_color", "enable_shadow", "text_effects")
+
+
+class TextBlock(NamedTuple):
+    """One text box of a multi-block card; also the key of its cached layer.
+
+    box is (left, top, width, height) as fractions of the card, so a template
+    works at any output size. Fields left as None take the card's settings:
+    a block without text shows the text being edited.
+    """
+    name: str
+    box: Tuple[float, float, float, float]
+    text: Optional[str] = None
+    font_family: Optional[str] = None
+    font_style: Optional[str] = None
+    font_size: Optional[int] = None
+    text_color: Optional[str] = None
+    fit: Optional[str] = None
+    position: Optional[str] = None
+    enable_shadow: Optional[bool] = None
+    text_effects: Optional[TextEffects] = None
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "TextBlock":
+        """Builds a block from its template entry; raises ValueError for a bad box, fit rule or text effects."""
+        box = settings.get("box")
+        if not (isinstance(box, (list, tuple)) and len(box) == 4):
+            raise ValueError(f"Text block box must be [left, top, width, height], got {box!r}")
+        left, top, width, height = (float(value) for value in box)
+        if width <= 0 or height <= 0 or left < 0 or top < 0 or left + width > 1.0001 or top + height > 1.0001:
+            raise ValueError(f"Text block box {box!r} is not inside the card")
+        fit = settings.get("fit")
+        if fit is not None and fit not in FIT_RULES:
+            raise ValueError(f"Unknown text block fit rule {fit!r}; expected one of {', '.join(FIT_RULES)}")
+        font_size = settings.get("font_size")
+        enable_shadow = settings.get("enable_shadow")
+        text_effects = settings.get("text_effects")
+        return cls(str(settings.get("name", "")), (left, top, width, height), settings.get("text"),
+                   settings.get("font_family"), settings.get("font_style"),
+                   int(font_size) if font_size is not None else None, settings.get("text_color"), fit,
+                   settings.get("position"), bool(enable_shadow) if enable_shadow is not None else None,
+                   TextEffects.from_settings(text_effects) if text_effects is not None else None)
+
+    def to_settings(self) -> Dict[str, Any]:
+        """Template entry for this block; inherited fields are left out."""
+        settings = {key: value for key, value in self._asdict().items() if value is not None}
+        settings["box"] = list(self.box)
+        if self.text_effects is not None:
+            settings["text_effects"] = self.text_effects.to_settings()
+        return settings
+
+    def resolved(self, card: Mapping[str, Any]) -> "TextBlock":
+        """Fills the fields this block leaves out from the card's create_image settings."""
+        values = {field: card.get(field) for field in INHERITED_FIELDS if getattr(self, field) is None}
+        if self.fit is None:
+            values["fit"] = "width" if card.get("fit_to_width") else "wrap"
+        if self.position is None:
+            values["position"] = card.get("text_position") or "center"
+        return self._replace(**values)
+
+    def scaled(self, factor: float) -> "TextBlock":
+        """The same block for a card scaled by factor, as in the print-size preview."""
+        if factor == 1:
+            return self
+        block = self
+        if self.font_size is not None:
+            block = block._replace(font_size=max(1, round(self.font_size * factor)))
+        if self.text_effects is not None:
+            block = block._replace(text_effects=self.text_effects.scaled(factor))
+        return block
+
+    def pixel_box(self, dims: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        """(left, top, right, bottom) of the box on a card of dims, at least one pixel each way."""
+        left, top, width, height = self.box
+        x0, y0 = round(left * dims[0]), round(top * dims[1])
+        return x0, y0, max(x0 + 1, round((left + width) * dims[0])), max(y0 + 1, round((top + height) * dims[1]))
+
+
+def parse_blocks(settings: Optional[Iterable[Dict[str, Any]]]) -> Tuple[TextBlock, ...]:
+    """Text blocks from a template or job "blocks" list, in drawing order."""
+    return tuple(TextBlock.from_settings(entry) for entry in settings or ())
+
+
+def resolve_blocks(blocks: Iterable[TextBlock], card: Mapping[str, Any]) -> Tuple[TextBlock, ...]:
+    return tuple(block.resolved(card) for block in blocks)
+
+
+def card_has_text(params: Mapping[str, Any]) -> bool:
+    """Whether create_image params would draw any text, in the single text or a block's own."""
+    return bool(params.get("text")) or any(block.text for block in params.get("blocks") or ())
+
+
+class BlockLayer(NamedTuple):
+    """A block's rendered text, cropped to its ink; image is None when nothing was drawn."""
+    offset: Tuple[int, int]
+    image: Optional[Image.Image]
+
+
+class LayerCache(LayoutCache):
+    """LRU of rendered block layers keyed by (resolved block, card size).
+
+    Editing one block changes only that block's key, so the other blocks are
+    composited from their cached layers without being laid out or drawn again.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        super().__init__(maxsize)
+
+
+class OffsetDraw:
+    """Forwards to an ImageDraw-like target with drawing shifted by offset.
+
+    Lets a block be drawn in its box on a full-size target (such as the
+    recording draw of a tiled render); measurements are not shifted.
+    """
+
+    def __init__(self, draw, offset: Tuple[int, int]):
+        self._draw = draw
+        self.offset = offset
+        self.fontmode = draw.fontmode
+
+    def _shift(self, xy):
+        return xy[0] + self.offset[0], xy[1] + self.offset[1]
+
+    def textlength(self, *args, **kwargs):
+        return self._draw.textlength(*args, **kwargs)
+
+    def textbbox(self, *args, **kwargs):
+        return self._draw.textbbox(*args, **kwargs)
+
+    def multiline_textbbox(self, *args, **kwargs):
+        return self._draw.multiline_textbbox(*args, **kwargs)
+
+    def text(self, xy, *args, **kwargs):
+        self._draw.text(self._shift(xy), *args, **kwargs)
+
+    def multiline_text(self, xy, *args, **kwargs):
+        self._draw.multiline_text(self._shift(xy), *args, **kwargs)
+
+    def composite(self, layer, offset):
+        self._draw.composite(layer, self._shift(offset))
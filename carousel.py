@@ -0,0 +1,155 @@
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageDraw
+
+from image_renderer import write_image
+
+# A word that ends a sentence (Latin, Arabic and Urdu punctuation), maybe followed by closing quotes or brackets
+SENTENCE_END = re.compile(r"[.!?؟۔…]+[\"'»”’)\]]*$")
+
+DEFAULT_MIN_FONT_SIZE = 60
+
+
+def lines_per_page(renderer, draw, font, max_height: float) -> int:
+    """Lines of font that fit max_height, spaced the way multiline text with a stroke is drawn."""
+    spacing = renderer.line_spacing(draw, font)
+    # The first line takes its full height plus the stroke above and below
+    first_line = sum(font.getmetrics()) + 4
+    return max(1, int((max_height - first_line) // spacing) + 1)
+
+
+def _sentence_break(words: List[str]) -> int:
+    """Number of words up to the last sentence end among words (0 if none)."""
+    return next((count for count in range(len(words), 0, -1) if SENTENCE_END.search(words[count - 1])), 0)
+
+
+def _wrap_counts(renderer, draw, words: List[str], font, max_width: float, chain, limit: int) -> List[int]:
+    """Words per line, wrapped like ImageRenderer.layout_paragraph, stopping once a line past limit starts."""
+    counts = []
+    line, count = words[0], 1
+    for word in words[1:]:
+        candidate = line + " " + word
+        if renderer.text_width(draw, candidate, font, chain) <= max_width:
+            line, count = candidate, count + 1
+        else:
+            counts.append(count)
+            if len(counts) > limit:
+                return counts
+            line, count = word, 1
+    counts.append(count)
+    return counts
+
+
+def paginate(renderer, draw, text: str, font, max_width: float, max_height: float, chain=None) -> List[str]:
+    """Splits text into pages that fit max_height at the font's size.
+
+    Paragraphs are laid out once, through the renderer's layout cache, and
+    placed in order. A paragraph that overflows the page is split after its
+    last sentence that still fits, or at a line break if a single sentence is
+    longer than a page; the carried-over remainder is wrapped again only as
+    far as the next page reaches, so long paragraphs stay linear.
+    """
+    capacity = lines_per_page(renderer, draw, font, max_height)
+    pages: List[str] = []
+    page: List[str] = []
+    used = 0
+    # (paragraph, whether it is the rest of a paragraph split across pages)
+    paragraphs = deque((paragraph, False) for paragraph in text.split("\n"))
+    while paragraphs:
+        paragraph, carried = paragraphs.popleft()
+        words = paragraph.split()
+        if not words:
+            if page and used < capacity:
+                page.append("")
+                used += 1
+            continue  # blank lines are dropped at the top and bottom of a page
+        free = capacity - used
+        if carried:
+            counts = _wrap_counts(renderer, draw, words, font, max_width, chain, free)
+        else:
+            counts = [len(line.split()) for line in renderer.layout_text(draw, paragraph, font, max_width, chain)[0].lines]
+        if len(counts) <= free:
+            page.append(paragraph)
+            used += len(counts)
+            continue
+
+        fitting = sum(counts[:free])
+        cut = _sentence_break(words[:fitting]) or (0 if page else fitting)
+        if cut:
+            page.append(" ".join(words[:cut]))
+            paragraphs.appendleft((" ".join(words[cut:]), True))
+        else:
+            paragraphs.appendleft((paragraph, carried))
+        pages.append("\n".join(page).strip("\n"))
+        page, used = [], 0
+    if page:
+        pages.append("\n".join(page).strip("\n"))
+    return pages
+
+
+def page_paths(path: str, count: int) -> List[str]:
+    """card.png -> card_01.png, card_02.png, ... (wider numbers for long sets)."""
+    base = Path(path)
+    suffix = base.suffix or ".png"
+    digits = max(2, len(str(count)))
+    return [str(base.with_name(f"{base.stem}_{number:0{digits}d}{suffix}")) for number in range(1, count + 1)]
+
+
+def render_carousel(renderer, params: Dict[str, Any], path: str, min_font_size: int = DEFAULT_MIN_FONT_SIZE,
+                    quality: int = 95, dpi: Optional[int] = None) -> Dict[str, Any]:
+    """Splits the card's text into pages at min_font_size and writes them as a numbered set.
+
+    Every page uses the same font size and position, so the set reads as one
+    carousel. Pages are rendered one after another: drawing holds the GIL, so
+    threads only made the set slower.
+    """
+    start = time.perf_counter()
+    text = params.get("text", "")
+    if not text.strip():
+        raise ValueError("Nothing to render (empty text)")
+    width, height = params["img_dims"]
+    blocks = tuple(params.get("blocks") or ())
+    # With text blocks, the text flows through the first block without text of its own
+    # and the other blocks (title, footer, ...) repeat on every page
+    body = next((index for index, block in enumerate(blocks) if block.text is None), None)
+    card = dict(params, text_position=params.get("text_position", "center"))
+    if body is not None:
+        resolved_body = blocks[body].resolved(card)
+        left, top, right, bottom = resolved_body.pixel_box((width, height))
+        width, height = right - left, bottom - top
+        card.update(font_family=resolved_body.font_family, font_style=resolved_body.font_style,
+                    fit_to_width=resolved_body.fit == "width", text_position=resolved_body.position)
+
+    resolved = renderer.resolve_font(text, card["font_family"], card["font_style"])
+    if resolved is None:
+        raise ValueError(f"Font not found: {card['font_family']}")
+    font_identifier, chain = resolved
+
+    margin = renderer.POSITION_MARGIN
+    font = renderer.load_font(font_identifier, min_font_size)
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    pages = paginate(renderer, draw, text, font, width - 2 * margin, height - 2 * margin, chain)
+    paginate_seconds = time.perf_counter() - start
+
+    # Fit-to-width has no position of its own; its pages are centred
+    position = "center" if card.get("fit_to_width") else card["text_position"]
+    page_params = dict(params, fit_to_width=False, text_position=position, font_size=min_font_size)
+    if body is not None:
+        page_params["blocks"] = blocks[:body] + (blocks[body]._replace(fit="wrap", position=position, font_size=min_font_size),) + blocks[body + 1:]
+    paths = page_paths(path, len(pages))
+
+    for page_text, page_path in zip(pages, paths):
+        image = renderer.create_image(**dict(page_params, text=page_text))
+        write_image(image, page_path, quality, dpi=dpi)
+
+    return {
+        "pages": len(pages),
+        "paths": paths,
+        "font_size": min_font_size,
+        "paginate_seconds": round(paginate_seconds, 3),
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    }
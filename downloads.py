@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import requests
+from urllib3.exceptions import HTTPError as StreamError
+
+# Reads start small so the first progress report comes quickly, then grow
+# while the connection keeps up, so a fast link is not throttled by per-chunk overhead
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# A chunk taking about this long keeps its size; faster chunks double, slower ones halve
+CHUNK_SECONDS = 0.25
+
+# Progress is reported at most this many times per second (plus once at the end)
+PROGRESS_RATE = 10
+
+# Dropped connections are resumed where they stopped, up to this many times in a row without new data
+RETRIES = 5
+RETRY_DELAY = 1.0
+
+# Throughput is averaged over roughly this window, so the ETA does not jump with every chunk
+RATE_WINDOW = 3.0
+
+
+# Part files written before this run are hashed in blocks of this size when resuming
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class DownloadCorrupted(Exception):
+    """The finished file's SHA-256 is not the published one; the partial file was discarded."""
+
+
+class DownloadProgress(NamedTuple):
+    """Where a download is: bytes so far of total (0 when the server did not say), speed and time left."""
+    downloaded: int
+    total: int
+    bytes_per_second: float
+    eta_seconds: Optional[float]
+
+    @property
+    def percent(self) -> int:
+        return int(self.downloaded * 100 / self.total) if self.total else 0
+
+
+def format_progress(progress: DownloadProgress) -> str:
+    """'12.3 of 48.0 MB - 2.1 MB/s - 17 s left', for the progress dialog."""
+    mb = 1024 * 1024
+    done = f"{progress.downloaded / mb:.1f} of {progress.total / mb:.1f} MB" if progress.total else f"{progress.downloaded / mb:.1f} MB"
+    text = f"{done} - {progress.bytes_per_second / mb:.1f} MB/s"
+    if progress.eta_seconds is not None:
+        minutes, seconds = divmod(int(progress.eta_seconds + 0.5), 60)
+        text += f" - {minutes} min {seconds} s left" if minutes else f" - {seconds} s left"
+    return text
+
+
+class _RateMeter:
+    """Bytes per second over the last RATE_WINDOW seconds."""
+
+    def __init__(self, downloaded: int):
+        self.samples = [(time.monotonic(), downloaded)]
+
+    def add(self, downloaded: int) -> float:
+        now = time.monotonic()
+        self.samples.append((now, downloaded))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= RATE_WINDOW:
+            self.samples.pop(0)
+        (start, first), (end, last) = self.samples[0], self.samples[-1]
+        return (last - first) / (end - start) if end > start else 0.0
+
+
+class ResumableDownload:
+    """Downloads url to path through path + '.part', resuming with HTTP Range requests.
+
+    The partial file survives a dropped connection, a cancel or a restart of
+    the app: the next attempt asks only for the missing bytes. The server's
+    ETag or Last-Modified is kept next to it (path + '.part.json') and sent as
+    If-Range, so a release replaced in between is downloaded again from the
+    start instead of being spliced onto the old bytes.
+
+    The SHA-256 is computed as chunks arrive and checked against
+    expected_sha256 before the file is renamed. on_data(offset, chunk) sees
+    every chunk as it is written (offset 0 again means the download started
+    over), and on_complete(size) runs once all bytes are on disk and verified,
+    also before the rename, so a consumer can follow the download without
+    reading the file a second time.
+    """
+
+    def __init__(self, url: str, path, on_progress: Optional[Callable[[DownloadProgress], None]] = None,
+                 should_stop: Callable[[], bool] = lambda: False, progress_rate: float = PROGRESS_RATE,
+                 retries: int = RETRIES, timeout: float = 10, expected_sha256: Optional[str] = None,
+                 on_data: Optional[Callable[[int, bytes], None]] = None,
+                 on_complete: Optional[Callable[[int], None]] = None):
+        self.url = url
+        self.path = Path(path)
+        self.part_path = self.path.with_name(self.path.name + ".part")
+        self.meta_path = self.path.with_name(self.path.name + ".part.json")
+        self.on_progress = on_progress
+        self.should_stop = should_stop
+        self.progress_interval = 1 / progress_rate
+        self.retries = retries
+        self.timeout = timeout
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.on_data = on_data
+        self.on_complete = on_complete
+        self.resumed_bytes = 0  # bytes kept from earlier attempts, for reporting
+        self._connected = False
+        self._sha256 = hashlib.sha256()
+        self._hashed = 0
+
+    def run(self) -> Path:
+        """Downloads until complete and returns the final path; raises requests.RequestException, DownloadCancelled or DownloadCorrupted."""
+        failures = 0
+        while True:
+            written = self._part_size()
+            try:
+                self._attempt()
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                # A connection that dropped after delivering data is a fresh start, not another failure in a row
+                failures = 1 if self._part_size() > written else failures + 1
+                if failures > self.retries or self.should_stop():
+                    raise
+                time.sleep(RETRY_DELAY * 2 ** (failures - 1))
+        size = self._hashed
+        if self.expected_sha256 and self._sha256.hexdigest() != self.expected_sha256:
+            self.part_path.unlink(missing_ok=True)
+            self.meta_path.unlink(missing_ok=True)
+            raise DownloadCorrupted(f"Checksum mismatch: expected SHA-256 {self.expected_sha256}, got {self._sha256.hexdigest()}")
+        if self.on_complete:
+            self.on_complete(size)
+        os.replace(self.part_path, self.path)
+        self.meta_path.unlink(missing_ok=True)
+        return self.path
+
+    def _validator(self) -> Optional[str]:
+        try:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return meta.get("validator") if meta.get("url") == self.url else None
+
+    def _save_validator(self, response):
+        validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+        if validator:
+            self.meta_path.write_text(json.dumps({"url": self.url, "validator": validator}), encoding="utf-8")
+        else:
+            self.meta_path.unlink(missing_ok=True)
+
+    def _catch_up(self, offset: int):
+        """Brings the running hash to offset, reading back what earlier runs wrote (once per resume from disk)."""
+        if self._hashed == offset:
+            return
+        self._sha256, self._hashed = hashlib.sha256(), 0
+        with open(self.part_path, "rb") as part:
+            while self._hashed < offset:
+                block = part.read(min(HASH_BLOCK_SIZE, offset - self._hashed))
+                if not block:
+                    raise requests.ConnectionError("Partial download is shorter than expected")
+                self._sha256.update(block)
+                self._hashed += len(block)
+
+    def _part_size(self) -> int:
+        return self.part_path.stat().st_size if self.part_path.exists() else 0
+
+    def _attempt(self):
+        offset = self._part_size()
+        validator = self._validator() if offset else None
+        # Byte offsets only line up with the file on disk if the body is not compressed in transit
+        headers = {"Accept-Encoding": "identity"}
+        if offset and (validator or self._connected):
+            # Without a validator, only a part written by this run is trusted
+            headers["Range"] = f"bytes={offset}-"
+            if validator:
+                headers["If-Range"] = validator
+        with requests.get(self.url, stream=True, timeout=self.timeout, headers=headers) as response:
+            if response.status_code == 416:
+                # Everything was already downloaded before the interruption
+                if response.headers.get("Content-Range", "").rpartition("/")[2] == str(offset):
+                    self._catch_up(offset)
+                    self._report(DownloadProgress(offset, offset, 0.0, 0.0))
+                    return
+                # Longer than the file on the server: start over
+                self.part_path.unlink(missing_ok=True)
+                self.meta_path.unlink(missing_ok=True)
+                raise requests.ConnectionError("Partial download does not match the server's file")
+            response.raise_for_status()
+            self._connected = True
+            if response.status_code == 206 and not response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+                self.part_path.unlink(missing_ok=True)
+                raise requests.ConnectionError("Server resumed from the wrong offset")
+            if response.status_code != 206:
+                offset = 0  # the server sent the whole file (no range support, or it changed)
+            elif not self.resumed_bytes:
+                self.resumed_bytes = offset
+            self._save_validator(response)
+            length = int(response.headers.get("Content-Length", 0))
+            total = offset + length if length else 0
+            self._stream(response, offset, total)
+
+    def _stream(self, response, downloaded: int, total: int):
+        self._catch_up(downloaded)
+        meter = _RateMeter(downloaded)
+        chunk_size = MIN_CHUNK_SIZE
+        last_report = 0.0
+        with open(self.part_path, "ab" if downloaded else "wb") as part:
+            while True:
+                if self.should_stop():
+                    raise DownloadCancelled()
+                started = time.monotonic()
+                try:
+                    chunk = response.raw.read(chunk_size)
+                except StreamError as e:
+                    # Reads from raw bypass requests, which would wrap a broken connection in its own error
+                    raise requests.ConnectionError(e) from e
+                if not chunk:
+                    break
+                part.write(chunk)
+                self._sha256.update(chunk)
+                self._hashed += len(chunk)
+                if self.on_data:
+                    self.on_data(downloaded, chunk)
+                downloaded += len(chunk)
+
+                elapsed = time.monotonic() - started
+                if elapsed < CHUNK_SECONDS / 2:
+                    chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+                elif elapsed > CHUNK_SECONDS * 2:
+                    chunk_size = max(chunk_size // 2, MIN_CHUNK_SIZE)
+
+                rate = meter.add(downloaded)
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    eta = (total - downloaded) / rate if total and rate else None
+                    self._report(DownloadProgress(downloaded, total, rate, eta))
+        if total and downloaded < total:
+            # The connection closed early without an error; resume from here
+            raise requests.ConnectionError(f"Connection closed after {downloaded} of {total} bytes")
+        self._report(DownloadProgress(downloaded, total or downloaded, meter.add(downloaded), 0.0))
+
+    def _report(self, progress: DownloadProgress):
+        if self.on_progress:
+            self.on_progress(progress)
@@ -0,0 +1,175 @@
+import queue
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# Largest preset (1080x1920) as RGBA
+DEFAULT_SLOT_BYTES = 1080 * 1920 * 4
+
+# Canvases per size: one for each render worker, the frame on screen and one on its way there
+POOL_CANVASES = 4
+# Sizes pooled at once: a preview and its smaller draft
+POOL_SIZES = 2
+
+
+class FrameRing:
+    """Fixed ring of RGBA frame slots in shared memory.
+
+    The parent owns the block and hands slot indexes to worker processes, which
+    copy each finished frame into their slot instead of pickling it. The parent
+    then wraps the slot without copying and puts it back in the ring once the
+    frame has been encoded.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int = DEFAULT_SLOT_BYTES):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._free = queue.Queue()
+        for index in range(slots):
+            self._free.put(index)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def acquire(self, timeout: Optional[float] = None) -> int:
+        return self._free.get(timeout=timeout)
+
+    def release(self, index: int):
+        self._free.put(index)
+
+    def frame(self, index: int, size: Tuple[int, int]) -> Image.Image:
+        """Returns a read-only image backed directly by the slot memory."""
+        return slot_image(self.shm, self.slot_bytes, index, size)
+
+    def qimage(self, index: int, size: Tuple[int, int]):
+        """Returns a QImage over the slot memory; it must not outlive the slot's release."""
+        from PySide6.QtGui import QImage
+        width, height = size
+        view = slot_view(self.shm, self.slot_bytes, index, size)
+        return QImage(view, width, height, width * 4, QImage.Format.Format_RGBA8888)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CanvasPool:
+    """Reusable frames for previews, per (mode, size), cleared in place instead of allocated.
+
+    Each canvas comes with a QImage buffer of its size. Pillow only draws on
+    memory it owns, so qimage copies the finished pixels into that buffer in
+    one pass, and a preview reaches the screen without a conversion or a new
+    allocation. RGB canvases are copied as RGBX, which Qt reads directly. A
+    leased canvas is returned with release once a newer frame has replaced it
+    on screen. Only the POOL_SIZES sizes
+    asked for last are pooled; when every canvas of a size is leased, acquire
+    returns None and the render allocates as usual.
+    """
+
+    def __init__(self, canvases: int = POOL_CANVASES, sizes: int = POOL_SIZES):
+        self.canvases = canvases
+        self.sizes = sizes
+        self.allocations = 0
+        self._lock = threading.Lock()
+        self._free: "OrderedDict[Tuple[str, Tuple[int, int]], List[Tuple[Image.Image, object]]]" = OrderedDict()
+        self._leased: Dict[int, Tuple[Tuple[str, Tuple[int, int]], Image.Image, object]] = {}
+
+    def acquire(self, mode: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+        """A canvas of mode ("RGB" or "RGBA") and size whose pixels are left from an earlier frame."""
+        key = (mode, tuple(size))
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(self._free) > self.sizes:
+                self._free.popitem(last=False)
+            if free:
+                canvas, qimage = free.pop()
+            elif sum(1 for leased in self._leased.values() if leased[0] == key) < self.canvases:
+                canvas, qimage = self._allocate(*key)
+            else:
+                return None
+            self._leased[id(canvas)] = (key, canvas, qimage)
+            return canvas
+
+    def _allocate(self, mode: str, size: Tuple[int, int]):
+        from PySide6.QtGui import QImage
+        self.allocations += 1
+        width, height = size
+        buffer = bytearray(width * height * 4)
+        image_format = QImage.Format.Format_RGBA8888 if mode == "RGBA" else QImage.Format.Format_RGBX8888
+        return Image.new(mode, size), (buffer, QImage(buffer, width, height, width * 4, image_format))
+
+    def qimage(self, canvas: Image.Image):
+        """The QImage of a leased canvas, holding its pixels as drawn; None for an image the pool did not lend."""
+        with self._lock:
+            leased = self._leased.get(id(canvas))
+        if leased is None or leased[1] is not canvas:
+            return None
+        buffer, qimage = leased[2]
+        copy_frame(buffer, canvas)
+        return qimage
+
+    def release(self, canvas: Optional[Image.Image]):
+        """Returns a leased canvas; images the pool did not lend (and None) are ignored."""
+        with self._lock:
+            leased = self._leased.get(id(canvas))
+            if leased is None or leased[1] is not canvas:
+                return
+            del self._leased[id(canvas)]
+            free = self._free.get(leased[0])
+            if free is not None and len(free) < self.canvases:
+                free.append(leased[1:])
+
+
+def slot_view(shm: shared_memory.SharedMemory, slot_bytes: int, index: int, size: Tuple[int, int]) -> memoryview:
+    offset = index * slot_bytes
+    return shm.buf[offset:offset + size[0] * size[1] * 4]
+
+
+def slot_image(shm: shared_memory.SharedMemory, slot_bytes: int, index: int, size: Tuple[int, int]) -> Image.Image:
+    """Read-only image over a slot; frombuffer maps RGBA buffers without copying."""
+    return Image.frombuffer("RGBA", size, slot_view(shm, slot_bytes, index, size), "raw", "RGBA", 0, 1)
+
+
+def copy_frame(buffer, image: Image.Image):
+    """Copies an RGB or RGBA frame into buffer as 4 bytes per pixel (RGB as RGBX, which reads as opaque RGBA)."""
+    buffer[:] = image.tobytes("raw", "RGBA" if image.mode == "RGBA" else "RGBX")
+
+
+def fits_slot(size: Tuple[int, int], slot_bytes: int) -> bool:
+    return size[0] * size[1] * 4 <= slot_bytes
+
+
+# Worker-side state, set once per process by attach_worker
+_worker_shm = None
+_worker_slot_bytes = 0
+
+
+def attach_worker(shm_name: str, slot_bytes: int):
+    """Process pool initializer: attaches the worker to the parent's ring."""
+    global _worker_shm, _worker_slot_bytes
+    try:
+        # The parent unlinks the block; workers must not register it for cleanup too
+        _worker_shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError: # Python < 3.13
+        _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_slot_bytes = slot_bytes
+
+
+def worker_write(index: int, image: Image.Image) -> bool:
+    """Copies a finished frame into the given slot; False if it does not fit."""
+    if _worker_shm is None or not fits_slot(image.size, _worker_slot_bytes):
+        return False
+    copy_frame(slot_view(_worker_shm, _worker_slot_bytes, index, image.size), image)
+    return True
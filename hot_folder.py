@@ -0,0 +1,296 @@
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PySide6.QtCore import QCoreApplication, QFileSystemWatcher, QObject, QSocketNotifier, QTimer, Signal
+
+from auto_encoder import AUTO_FORMAT, DEFAULT_MIN_PSNR
+from batch_runner import FAILURES_FILE, IMAGE_FORMATS, JOURNAL_FILE, BatchJournal, BatchRunner, write_atomic
+from image_renderer import ImageRenderer, default_font_paths
+from text_layout import LAYOUT_ENGINES
+
+STATUS_FILE = "status.json"
+PROCESSED_DIR = "processed"
+FAILED_DIR = "failed"
+
+# Notifications arriving within this window are handled by one directory scan
+SCAN_DELAY_MS = 100
+# A job file this recent that does not parse yet is probably still being copied in; it is retried
+SETTLE_SECONDS = 2.0
+# The status file is rewritten at most this often while busy (and always on becoming idle)
+STATUS_INTERVAL_MS = 1000
+# Shared folders can miss change notifications, so the folder is also rescanned this often
+RESCAN_SECONDS = 60
+# Latency percentiles in the status file cover this many recent jobs
+LATENCY_SAMPLES = 1000
+
+
+class HotFolder(QObject):
+    """Renders JSON job files dropped into a folder, like `imagetype batch` but as they arrive.
+
+    A job file holds one job object (text, template and any batch setting).
+    The folder is watched with the platform's change notifications (inotify,
+    ReadDirectoryChangesW, kqueue) through QFileSystemWatcher, falling back to
+    polling when it cannot be watched, so an idle folder costs no CPU.
+    Jobs are de-duplicated by the SHA-256 of the file, across restarts, via
+    the batch journal. At most max_in_flight renders are queued on the
+    worker pool; the rest wait in the folder. Finished job files are moved
+    to processed/ or failed/, and status.json in the output folder is
+    rewritten atomically with counts, latency and throughput.
+    All bookkeeping runs on the thread of the Qt event loop; workers only render.
+    """
+
+    job_finished = Signal(object)  # the job's future, delivered to the event loop thread
+
+    def __init__(self, runner: BatchRunner, watch_dir: str, poll_seconds: Optional[float] = None, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+        self.watch_dir = Path(watch_dir)
+        self.output_dir = runner.output_dir
+        self.poll_seconds = poll_seconds
+        self.backlog = deque()  # job file names found but not started
+        self.queued = set()  # names in the backlog or in flight
+        self.in_flight = {}  # future -> (name, job id, content hash, drop time)
+        self.claimed = set()  # content hashes in flight
+        self.stats = {"rendered": 0, "failed": 0, "duplicates": 0, "bytes_written": 0}
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.busy_since = None
+        self.busy_rendered = 0
+        self.images_per_second = None  # over the current or last burst of jobs
+        self.last_status = 0.0
+        self.notifications = False
+        self.job_finished.connect(self._on_job_finished)
+
+        self.scan_timer = QTimer(self, singleShot=True, interval=SCAN_DELAY_MS, timeout=self.scan)
+        self.status_timer = QTimer(self, singleShot=True, timeout=self.write_status)
+        self.rescan_timer = QTimer(self, timeout=self.scan)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._schedule_scan)
+
+    def start(self):
+        self.watch_dir.mkdir(parents=True, exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.journal = BatchJournal(self.output_dir / JOURNAL_FILE).open()
+        self.failures = open(self.output_dir / FAILURES_FILE, "a", encoding="utf-8")
+        self.pool = ThreadPoolExecutor(max_workers=self.runner.workers)
+        self.notifications = self.poll_seconds is None and self.watcher.addPath(str(self.watch_dir))
+        self.rescan_timer.start(int((RESCAN_SECONDS if self.notifications else self.poll_seconds or 2.0) * 1000))
+        self.scan()
+        self.write_status()
+
+    def stop(self):
+        """Stops watching, finishes the renders in flight and writes the final status."""
+        for timer in (self.scan_timer, self.status_timer, self.rescan_timer):
+            timer.stop()
+        self.watcher.removePaths(self.watcher.directories())
+        self.backlog.clear()
+        self.pool.shutdown(wait=True)
+        for future in list(self.in_flight):
+            self._on_job_finished(future)
+        self.journal.close()
+        self.failures.close()
+        self.write_status()
+
+    def _schedule_scan(self, *args):
+        if not self.scan_timer.isActive():
+            self.scan_timer.start()
+
+    def scan(self):
+        """Queues job files not seen yet, oldest first, and starts as many as the pool takes."""
+        found = []
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                name = entry.name
+                if name in self.queued or name.startswith(".") or not name.lower().endswith(".json"):
+                    continue
+                try:
+                    if entry.is_file():
+                        found.append((entry.stat().st_mtime, name))
+                except FileNotFoundError:
+                    continue
+        for _, name in sorted(found):
+            self.backlog.append(name)
+            self.queued.add(name)
+        self._fill()
+
+    def _fill(self):
+        while self.backlog and len(self.in_flight) < self.runner.max_in_flight:
+            self._start_job(self.backlog.popleft())
+        self._status_changed()
+
+    def _start_job(self, name: str):
+        path = self.watch_dir / name
+        try:
+            dropped = path.stat().st_mtime
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.queued.discard(name)
+            return
+        key = hashlib.sha256(data).hexdigest()
+        if key in self.journal.completed or key in self.claimed:
+            self.stats["duplicates"] += 1
+            self._finish_file(name, PROCESSED_DIR)
+            return
+        try:
+            job = json.loads(data)
+        except ValueError:
+            if time.time() - dropped < SETTLE_SECONDS:
+                # Probably still being written; look again once it has settled
+                self.queued.discard(name)
+                QTimer.singleShot(int(SETTLE_SECONDS * 1000), self.scan)
+                return
+            job = None
+        if not isinstance(job, dict):
+            self._fail(name, Path(name).stem, "Invalid JSON job")
+            return
+        job_id = str(job.get("id") or Path(name).stem)
+        try:
+            params = self.runner.build_params(job)
+        except Exception as e:
+            self._fail(name, job_id, e)
+            return
+
+        if self.busy_since is None:
+            self.busy_since, self.busy_rendered = time.time(), 0
+        self.claimed.add(key)
+        future = self.pool.submit(self.runner.job_renderer(job, params), job_id, job, params)
+        self.in_flight[future] = (name, job_id, key, dropped)
+        future.add_done_callback(self.job_finished.emit)
+
+    def _on_job_finished(self, future):
+        if future not in self.in_flight:
+            return  # already handled by stop()
+        name, job_id, key, dropped = self.in_flight.pop(future)
+        self.claimed.discard(key)
+        try:
+            digest, size = future.result()
+        except Exception as e:
+            self._fail(name, job_id, e)
+        else:
+            self.journal.record(key, digest)
+            self.stats["rendered"] += 1
+            self.stats["bytes_written"] += size
+            self.busy_rendered += 1
+            self.latencies.append(time.time() - dropped)
+            self._finish_file(name, PROCESSED_DIR)
+        self._fill()
+
+    def _fail(self, name: str, job_id: str, error):
+        self.stats["failed"] += 1
+        self.failures.write(json.dumps({"id": job_id, "file": name, "error": str(error)}, ensure_ascii=False) + "\n")
+        self.failures.flush()
+        self._finish_file(name, FAILED_DIR)
+
+    def _finish_file(self, name: str, folder: str):
+        """Moves a handled job file out of the watched folder, so later scans stay short."""
+        self.queued.discard(name)
+        target_dir = self.watch_dir / folder
+        target_dir.mkdir(exist_ok=True)
+        try:
+            os.replace(self.watch_dir / name, target_dir / name)
+        except FileNotFoundError:
+            pass
+
+    def _status_changed(self):
+        idle = not self.in_flight and not self.backlog
+        if idle or time.monotonic() - self.last_status >= STATUS_INTERVAL_MS / 1000:
+            self.write_status()
+        elif not self.status_timer.isActive():
+            self.status_timer.start(STATUS_INTERVAL_MS)
+
+    def write_status(self):
+        self.status_timer.stop()
+        self.last_status = time.monotonic()
+        status = dict(self.stats)
+        status.update({
+            "state": "busy" if self.in_flight or self.backlog else "idle",
+            "watching": str(self.watch_dir),
+            "change_notifications": self.notifications,
+            "pending": len(self.backlog),
+            "in_flight": len(self.in_flight),
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        })
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            status["latency_seconds"] = {"median": round(statistics.median(ordered), 3),
+                                         "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                                         "max": round(ordered[-1], 3)}
+        if self.busy_since is not None:
+            elapsed = time.time() - self.busy_since
+            self.images_per_second = round(self.busy_rendered / elapsed, 2) if elapsed > 0 else 0.0
+            if status["state"] == "idle":
+                self.busy_since = None
+        if self.images_per_second is not None:
+            status["images_per_second"] = self.images_per_second
+        write_atomic(self.output_dir / STATUS_FILE, json.dumps(status, indent=4).encode("utf-8"))
+
+
+def _quit_on_signals(app: QCoreApplication):
+    """Quits the event loop on Ctrl+C or SIGTERM.
+
+    Python runs signal handlers only when the interpreter gets control, so the
+    signal is written to a socket the event loop watches instead of waking up
+    on a timer, which keeps an idle daemon at zero CPU.
+    """
+    receiver, sender = socket.socketpair()
+    sender.setblocking(False)
+    signal.set_wakeup_fd(sender.fileno())
+    notifier = QSocketNotifier(receiver.fileno(), QSocketNotifier.Type.Read, app)
+    notifier.activated.connect(lambda *args: receiver.recv(64))
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: app.quit())
+    return receiver, sender, notifier
+
+
+def _restore_signals(wakeup):
+    signal.set_wakeup_fd(-1)
+    receiver, sender, notifier = wakeup
+    notifier.setEnabled(False)
+    receiver.close()
+    sender.close()
+
+
+def run_watch_cli(argv, fonts_dir: str, templates_dir: str) -> int:
+    """Entry point for `imagetype watch folder`."""
+    parser = argparse.ArgumentParser(prog="imagetype watch",
+                                     description="Render JSON job files as they are dropped into a folder.")
+    parser.add_argument("folder", help="Folder to watch for *.json job files")
+    parser.add_argument("-o", "--output", help="Output directory (default: FOLDER/output); holds status.json")
+    parser.add_argument("--format", default="png", choices=sorted([*IMAGE_FORMATS, AUTO_FORMAT]),
+                        help="Default output format (auto picks the smallest encoding per image)")
+    parser.add_argument("--quality", type=int, default=95, help="Encoder quality for JPEG/WebP")
+    parser.add_argument("--min-psnr", type=float, default=DEFAULT_MIN_PSNR,
+                        help="Lowest PSNR (dB) a lossy encoding may have when --format is auto")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--max-in-flight", type=int, default=16, help="Upper bound on queued renders")
+    parser.add_argument("--poll", type=float, metavar="SECONDS",
+                        help="Poll the folder every SECONDS instead of using change notifications")
+    parser.add_argument("--layout-engine", default="auto", choices=LAYOUT_ENGINES,
+                        help="Text shaping engine (auto uses RAQM when Pillow was built with it)")
+    parser.add_argument("--fallback-font", action="append", default=[], metavar="FONT",
+                        help="Font tried for characters the job's font lacks (repeatable, in order)")
+    args = parser.parse_args(argv)
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    renderer = ImageRenderer(default_font_paths(fonts_dir), args.layout_engine, args.fallback_font)
+    runner = BatchRunner(renderer, args.output or str(Path(args.folder) / "output"), templates_dir,
+                         args.format, args.quality, args.workers, args.max_in_flight, min_psnr=args.min_psnr)
+    folder = HotFolder(runner, args.folder, args.poll)
+    folder.start()
+    wakeup = _quit_on_signals(app)
+    print(f"Watching {args.folder} ({'change notifications' if folder.notifications else 'polling'}); "
+          f"press Ctrl+C to stop")
+    app.exec()
+    _restore_signals(wakeup)
+    folder.stop()
+    print(f"Rendered {folder.stats['rendered']}, duplicates {folder.stats['duplicates']}, failed {folder.stats['failed']}")
+    return 0
@@ -0,0 +1,588 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, BinaryIO, NamedTuple, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
+from blocks import BlockLayer, LayerCache, OffsetDraw, TextBlock, resolve_blocks
+from backgrounds import BackgroundImage, BackgroundSpec, GENERATED_BACKGROUNDS, canvas_mode, generate_background
+from text_effects import EffectCache, TextEffects, composite_layer, effect_layer, op_key
+from tiled_render import RecordingDraw
+from text_layout import REFERENCE_SIZE, FontChain, LayoutCache, ParagraphLayout, advance_table, display_form, greedy_lines, load_font, measure_form, reference_widths, resolve_layout_engine, runs_length, visual_runs, word_widths
+
+
+# Formats whose Pillow encoders store a resolution
+DPI_FORMATS = ("PNG", "JPEG", "JPG", "TIFF", "TIF")
+
+FONT_STYLES = ("regular", "bold", "italic", "bold_italic")
+
+TEXT_POSITIONS = ("top_left", "top_center", "top_right", "middle_left", "center", "middle_right",
+                  "bottom_left", "bottom_center", "bottom_right")
+
+# Text colors drawn with a dark shadow; every other color gets a light one
+DARK_SHADOW_COLORS = ("white", "yellow", "pink", "lightgreen", "lightblue")
+
+
+class TextStyle(NamedTuple):
+    """Fill, outline and shadow colors (RGBA) derived from one text color."""
+    fill: Tuple[int, int, int, int]
+    stroke: Tuple[int, int, int, int]
+    shadow: Tuple[int, int, int, int]
+
+
+@lru_cache(maxsize=256)
+def text_style(text_color) -> TextStyle:
+    """Parses a text color (name, hex string or RGBA tuple) once; a TextStyle is returned as is."""
+    if isinstance(text_color, TextStyle):
+        return text_color
+    fill = ImageColor.getcolor(text_color, "RGBA") if isinstance(text_color, str) else tuple(text_color)
+    if len(fill) == 3:
+        fill += (255,)
+    stroke = (255, 255, 255, 255) if fill[:3] == (0, 0, 0) else (0, 0, 0, 255)
+    dark_shadow = fill[:3] in {ImageColor.getrgb(color) for color in DARK_SHADOW_COLORS}
+    return TextStyle(fill, stroke, (0, 0, 0, 128) if dark_shadow else (255, 255, 255, 128))
+
+
+def default_font_paths(fonts_dir: str) -> Dict[str, str]:
+    """Returns the bundled Amiri font files keyed by font style."""
+    amiri_dir = Path(fonts_dir) / "Amiri"
+    return {
+        "regular": str(amiri_dir / "Amiri-Regular.ttf"),
+        "bold": str(amiri_dir / "Amiri-Bold.ttf"),
+        "italic": str(amiri_dir / "Amiri-Italic.ttf"),
+        "bold_italic": str(amiri_dir / "Amiri-BoldItalic.ttf")
+    }
+
+
+def write_image(image: Image.Image, fp: Union[str, BinaryIO], quality: int = 95, image_format: Optional[str] = None, dpi: Optional[int] = None):
+    """Encodes an image to a path or file object, flattening transparency for JPEG."""
+    if image_format is None:
+        image_format = "JPEG" if str(fp).lower().endswith((".jpg", ".jpeg")) else None
+
+    options = {"quality": quality}
+    if dpi and (image_format or Path(str(fp)).suffix[1:]).upper() in DPI_FORMATS:
+        options["dpi"] = (dpi, dpi)
+
+    if image_format == "JPEG":
+        if image.mode == 'RGBA':
+            # Create a white background and paste the image onto it
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, (0, 0), image)
+            image = background
+        image.save(fp, format="JPEG", **options)
+    else: # For PNG and others
+        image.save(fp, format=image_format, **options)
+
+
+def fill_canvas(canvas: Image.Image, color, background: Optional[Image.Image] = None) -> Image.Image:
+    """Resets a caller-provided canvas in place instead of allocating a new frame."""
+    if background is not None:
+        canvas.paste(background, (0, 0))
+    else:
+        if isinstance(color, str):
+            color = ImageColor.getcolor(color, canvas.mode)
+        canvas.paste(color, (0, 0) + canvas.size)
+    return canvas
+
+
+class CardDraw(ImageDraw.ImageDraw):
+    """ImageDraw that can also lay RGBA layers (text drawn with effects) over its image.
+
+    Given a deferred list, layers are collected there instead, for a caller
+    that still has to convert the drawn pixels before compositing them.
+    """
+
+    def __init__(self, image: Image.Image, deferred: Optional[list] = None):
+        super().__init__(image)
+        self.image = image
+        self.deferred = deferred
+
+    def composite(self, layer: Image.Image, offset: Tuple[int, int]):
+        if self.deferred is not None:
+            self.deferred.append((layer, offset))
+        else:
+            composite_layer(self.image, layer, offset)
+
+
+class ImageRenderer:
+    """Renders text cards without touching any widget, so it can run off the GUI thread."""
+
+    # Distance from the edges for positioned (not fit-to-width) text
+    POSITION_MARGIN = 20
+
+    def __init__(self, font_paths: Dict[str, str], layout_engine: str = "auto", fallback_fonts: Sequence[str] = ()):
+        self.font_paths = dict(font_paths)
+        self.layout_engine = resolve_layout_engine(layout_engine)
+        # Tried in order for characters the chosen font lacks; bundled Amiri is always last
+        self.fallback_fonts = tuple(fallback_fonts)
+        self.layout_cache = LayoutCache()
+        self.block_layers = LayerCache()
+        self.effect_layers = EffectCache()
+        # Size the last full fit chose for each text box, which drafts reuse instead of searching
+        self.fitted_sizes: Dict[Tuple, int] = {}
+        # One chain per primary font, so the per-character font choices are kept between renders
+        self._font_chains: Dict[str, FontChain] = {}
+
+    def load_font(self, font_identifier, size):
+        try:
+            return load_font(font_identifier, size, self.layout_engine)
+        except IOError:
+            return load_font(self.font_paths.get("regular"), size, self.layout_engine)
+
+    def create_image(self, text, background_type, img_dims, bg_color, loaded_image, font_family, font_style, text_color, fit_to_width, text_position, font_size=120, for_preview=False, enable_shadow=False, canvas=None, background_spec=None, blocks=(), font_path=None, draft=False, text_effects=None) -> Optional[Image.Image]:
+        """Renders a card. If canvas (an image of img_dims) is given, it is drawn into in place.
+
+        A canvas of the mode canvas_mode gives (RGBX for RGB) renders exactly
+        the pixels of a new frame; an RGBA canvas can take any background.
+
+        font_path, as resolved by a RenderPlan, skips looking up the font for family and style.
+
+        With blocks (TextBlocks), each block is drawn in its own box instead of
+        the single text; blocks inherit the settings they leave out from the card.
+
+        text_effects (TextEffects) replaces the plain outline with the effects
+        stage: outline width, glow, gradient or texture fill and inner shadow.
+
+        A draft is a quick stand-in for a slow preview: the background image is
+        stretched with nearest-neighbour resampling, shadows and outlines are
+        left out (effects keep only their fill) and fit-to-width text keeps the
+        size its box was last fitted to.
+        """
+        if blocks:
+            blocks = resolve_blocks(blocks, {
+                "text": text, "font_family": font_family, "font_style": font_style, "font_size": font_size,
+                "text_color": text_color, "fit_to_width": fit_to_width, "text_position": text_position,
+                "enable_shadow": enable_shadow, "text_effects": text_effects
+            })
+            if not any(block.text for block in blocks) and not for_preview:
+                return None
+            if draft:
+                blocks = tuple(block._replace(enable_shadow=False) for block in blocks)
+        elif not text and not for_preview:
+            return None
+
+        base_image = None
+
+        if background_type == "existing":
+            if loaded_image:
+                if isinstance(loaded_image, BackgroundImage):
+                    # The cached resize can be pasted as-is; it is only copied when drawn on directly
+                    base_image = loaded_image.resized(img_dims, copy=canvas is None, draft=draft, preview=for_preview)
+                else:
+                    base_image = loaded_image.resize(img_dims, Image.Resampling.LANCZOS).convert("RGBA")
+                if canvas is not None:
+                    base_image = fill_canvas(canvas, None, base_image)
+            elif for_preview:
+                return Image.new("RGB", img_dims, color="gray") if canvas is None else fill_canvas(canvas, "gray")
+            else:
+                return None
+        elif background_type == "solid":
+            base_image = Image.new("RGB", img_dims, color=bg_color) if canvas is None else fill_canvas(canvas, bg_color)
+        elif background_type in GENERATED_BACKGROUNDS:
+            spec = background_spec or BackgroundSpec(background_type, (bg_color, "white"))
+            # Generated backgrounds are cached and shared, so never draw on them directly
+            generated = generate_background(spec, tuple(img_dims))
+            base_image = generated.copy() if canvas is None else fill_canvas(canvas, None, generated)
+        else: # Transparent
+            base_image = Image.new("RGBA", img_dims, (255, 255, 255, 0)) if canvas is None else fill_canvas(canvas, (255, 255, 255, 0))
+
+        if blocks:
+            return self.draw_blocks(base_image, blocks)
+        if text:
+            return self.add_text_to_image(base_image, text, font_family, font_style, text_color, fit_to_width, text_position, font_size,
+                                          enable_shadow and not draft, font_path, draft, text_effects)
+        return base_image
+
+    def draw_blocks(self, image, blocks):
+        """Composites the cached layer of each resolved block onto image, in order."""
+        for block in blocks:
+            layer = self.block_layer(block, image.size)
+            if layer.image is None:
+                continue
+            if image.mode == "RGBA":
+                image.alpha_composite(layer.image, layer.offset)
+            else:
+                image.paste(layer.image, layer.offset, layer.image)
+        return image
+
+    def block_layer(self, block: TextBlock, dims) -> BlockLayer:
+        """The block's text on a transparent layer, drawn only when the block or card size changed."""
+        return self.block_layers.get((block, tuple(dims)), lambda: self.render_block_layer(block, dims))
+
+    def render_block_layer(self, block: TextBlock, dims) -> BlockLayer:
+        left, top, right, bottom = block.pixel_box(dims)
+        # Drawing onto transparent black leaves premultiplied color, so the
+        # layer is read back as RGBa; antialiased edges then keep their color.
+        # Effect layers are already straight RGBA and go on after that
+        layer = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+        effects = []
+        self.draw_block_text(CardDraw(layer, effects), block, layer.size)
+        layer = Image.frombytes("RGBa", layer.size, layer.tobytes()).convert("RGBA")
+        for effect, offset in effects:
+            composite_layer(layer, effect, offset)
+        bbox = layer.getbbox()
+        if bbox is None:
+            return BlockLayer((left, top), None)
+        return BlockLayer((left + bbox[0], top + bbox[1]), layer.crop(bbox))
+
+    def draw_block(self, draw, block: TextBlock, dims):
+        """Draws a resolved block in its box on a draw target covering the whole card."""
+        left, top, right, bottom = block.pixel_box(dims)
+        self.draw_block_text(OffsetDraw(draw, (left, top)), block, (right - left, bottom - top))
+
+    def draw_block_text(self, draw, block: TextBlock, box_size):
+        """Draws a resolved block on a target the size of its box."""
+        if not block.text:
+            return
+        resolved = self.resolve_font(block.text, block.font_family, block.font_style)
+        if resolved is None:
+            return
+        font_identifier, chain = resolved
+
+        if block.fit == "width":
+            # Boxes are often wide and short, so the margin follows the shorter side
+            self.draw_text_fit_to_width(draw, block.text, font_identifier, block.text_color, box_size, block.enable_shadow,
+                                        chain, int(min(box_size) * 0.05), effects=block.text_effects)
+            return
+        font_size = block.font_size
+        if block.fit == "shrink":
+            margin = self.POSITION_MARGIN
+            font_size = self.fitting_font_size(draw, block.text, font_identifier, box_size[0] - (2 * margin),
+                                               box_size[1] - (2 * margin), chain, min(10, font_size), font_size)
+        self.draw_text_at_position(draw, block.text, font_identifier, block.text_color, box_size, block.position,
+                                   font_size, block.enable_shadow, chain, effects=block.text_effects)
+
+    def add_text_to_image(self, image, text, font_family, font_style, text_color, fit_to_width, text_position, font_size, enable_shadow, font_path=None, draft=False, text_effects=None):
+        draw = CardDraw(image)
+        self.draw_text(draw, image.size, text, font_family, font_style, text_color, fit_to_width, text_position, font_size, enable_shadow, font_path, draft, text_effects)
+        return image
+
+    def draw_text(self, draw, image_size, text, font_family, font_style, text_color, fit_to_width, text_position, font_size, enable_shadow, font_path=None, draft=False, text_effects=None):
+        """Lays out and draws text on any ImageDraw-like target of the given size."""
+        resolved = self.resolve_font(text, font_family, font_style, font_path)
+        if resolved is None:
+            return
+        font_identifier, chain = resolved
+
+        if fit_to_width:
+            self.draw_text_fit_to_width(draw, text, font_identifier, text_color, image_size, enable_shadow, chain, draft=draft, effects=text_effects)
+        else:
+            self.draw_text_at_position(draw, text, font_identifier, text_color, image_size, text_position, font_size, enable_shadow, chain, draft, text_effects)
+
+    def font_identifier(self, font_family, font_style):
+        """Font file or name for a family and style; None if the bundled font is missing."""
+        if font_family == "Amiri":
+            font_identifier = self.font_paths.get(font_style, self.font_paths.get("regular"))
+            return font_identifier if Path(font_identifier).exists() else None
+
+        style_str = ""
+        if font_style == "bold":
+            style_str = " Bold"
+        elif font_style == "italic":
+            style_str = " Italic"
+        elif font_style == "bold_italic":
+            style_str = " Bold Italic"
+        return f"{font_family}{style_str}"
+
+    def font_chain(self, font_identifier) -> FontChain:
+        chain = self._font_chains.get(font_identifier)
+        if chain is None:
+            chain = FontChain((font_identifier, *self.fallback_fonts, self.font_paths.get("regular")), self.layout_engine)
+            self._font_chains[font_identifier] = chain
+        return chain
+
+    def resolve_font(self, text, font_family, font_style, font_path=None):
+        """Font to draw text with, plus the fallback chain when one font does not cover it all.
+
+        Returns (font identifier, chain or None), or None if the bundled font is missing.
+        """
+        font_identifier = font_path or self.font_identifier(font_family, font_style)
+        if font_identifier is None:
+            return None
+
+        # Per-run font fallback: characters the chosen font lacks (like Arabic in a
+        # Latin system font) are drawn with the first font in the chain that has them
+        chain = self.font_chain(font_identifier)
+        single_font = chain.single_font(text)
+        if single_font is not None:
+            # Common case: one font covers everything and Pillow lays out the whole block
+            font_identifier, chain = single_font, None
+        return font_identifier, chain
+
+    def draw_text_fit_to_width(self, draw, text, font_identifier, text_color, image_size, enable_shadow=False, chain=None, margin=None, draft=False, effects=None):
+        img_width, img_height = image_size
+        if margin is None:
+            margin = int(img_width * 0.05)
+        target_width = img_width - (2 * margin)
+
+        # A draft reuses the box's last fitted size, so only edited paragraphs are laid out again
+        fit_key = (font_identifier, target_width, img_height - (2 * margin), chain is not None)
+        best_size = self.fitted_sizes.get(fit_key) if draft else None
+        if best_size is None:
+            best_size = self.fitting_font_size(draw, text, font_identifier, target_width, img_height - (2 * margin), chain)
+            if len(self.fitted_sizes) >= 256:
+                self.fitted_sizes.clear()
+            self.fitted_sizes[fit_key] = best_size
+        font = self.load_font(font_identifier, best_size)
+
+        layouts = self.layout_text(draw, text, font, target_width, chain)
+        wrapped_text = "\n".join(line for layout in layouts for line in layout.lines)
+        text_height = self.text_height(draw, layouts, font, chain)
+
+        y = (img_height - text_height) / 2
+        self.draw_lines(draw, (img_width/2, y), wrapped_text, font, chain, "ma", "center", text_style(text_color),
+                        enable_shadow, draft, effects)
+
+    def fitting_font_size(self, draw, text, font_identifier, max_width, max_height, chain=None, low_size=10, high_size=1000):
+        """Largest size whose wrapped text stays under max_height, or low_size if none does."""
+        if chain is None and self.layout_engine == "basic":
+            return self.fitting_font_size_scaled(draw, text, font_identifier, max_width, max_height, low_size, high_size)
+        best_size = low_size
+
+        # Binary Search Optimization for Font Sizing
+        while low_size <= high_size:
+            mid_size = (low_size + high_size) // 2
+            font = self.load_font(font_identifier, mid_size)
+
+            # Wrapping and measuring work on logical text; only drawing needs the display form
+            text_height = self.text_height(draw, self.layout_text(draw, text, font, max_width, chain), font, chain)
+
+            if text_height < max_height:
+                best_size = mid_size
+                low_size = mid_size + 1
+            else:
+                high_size = mid_size - 1
+        return best_size
+
+    def fitting_font_size_scaled(self, draw, text, font_identifier, max_width, max_height, low_size=10, high_size=1000):
+        """fitting_font_size for one font on the basic engine.
+
+        The binary search runs on word widths read once at REFERENCE_SIZE and
+        scaled to each probed size, which FreeType's hinting makes only nearly
+        linear; the sizes around its answer are then checked with the exact
+        layout, so only those are laid out and measured.
+        """
+        reference = advance_table(self.load_font(font_identifier, REFERENCE_SIZE).path, REFERENCE_SIZE)
+        paragraphs = [reference_widths(reference.font.path, paragraph) for paragraph in text.split('\n')]
+        ascent, descent = reference.font.getmetrics()
+        spacing = draw.textbbox((0, 0), "A", font=reference.font)[3]
+        totals = np.array([widths.sum() + joins.sum() for widths, joins in paragraphs])
+
+        def estimated_fit(size):
+            scale = size / REFERENCE_SIZE
+            # Paragraphs narrower than the box are one line each; only the rest are wrapped
+            wrapped = np.flatnonzero(totals * scale > max_width)
+            lines = len(paragraphs) - len(wrapped) + sum(
+                len(greedy_lines(paragraphs[index][0] * scale, paragraphs[index][1] * scale, max_width)) for index in wrapped)
+            return (lines - 1) * (spacing * scale + 4) + (ascent + descent) * scale < max_height
+
+        def fits(size):
+            font = self.load_font(font_identifier, size)
+            return self.text_height(draw, self.layout_text(draw, text, font, max_width), font) < max_height
+
+        best_size = low_size
+        low, high = low_size, high_size
+        while low <= high:
+            mid_size = (low + high) // 2
+            if estimated_fit(mid_size):
+                best_size = mid_size
+                low = mid_size + 1
+            else:
+                high = mid_size - 1
+
+        if fits(best_size):
+            while best_size < high_size and fits(best_size + 1):
+                best_size += 1
+            return best_size
+        while best_size > low_size:
+            best_size -= 1
+            if fits(best_size):
+                return best_size
+        return low_size
+
+    def text_width(self, draw, text, font, chain=None):
+        if chain is None:
+            return draw.textlength(measure_form(text, self.layout_engine), font=font)
+        return runs_length(chain.runs(text), font.size, self.layout_engine)
+
+    def text_height(self, draw, layouts, font, chain=None):
+        """Height of laid-out paragraphs as drawn by multiline_text, from the cached line metrics."""
+        if chain is not None:
+            # Mixed-font lines are spaced by the primary font, like Pillow spaces multiline text
+            line_count = sum(len(layout.lines) for layout in layouts)
+            return (line_count - 1) * self.line_spacing(draw, font) + sum(font.getmetrics())
+        # multiline_textbbox: line i sits i * spacing down and the block ends at the lowest line bottom
+        spacing = draw.textbbox((0, 0), "A", font=font)[3] + 4
+        bottoms = [bottom for layout in layouts for bottom in layout.bottoms]
+        return max(index * spacing + bottom for index, bottom in enumerate(bottoms))
+
+    @staticmethod
+    def line_spacing(draw, font):
+        # Same spacing ImageDraw.multiline_text uses for stroke_width=2 and spacing=4
+        return draw.textbbox((0, 0), "A", font=font, stroke_width=2)[3] + 2 + 4
+
+    def outline(self, draw, font, stroked=True):
+        """multiline_text options for the text outline. Stroking is most of the cost of drawing text,
+        so a draft leaves it out, spacing the lines as they are with it; so do effect masks."""
+        if stroked:
+            return {"stroke_width": 2}
+        return {"stroke_width": 0, "spacing": self.line_spacing(draw, font) - draw.textbbox((0, 0), "A", font=font)[3]}
+
+    def draw_lines(self, draw, xy, wrapped_text, font, chain, anchor, align, style, enable_shadow=False, draft=False, effects=None):
+        """Draws wrapped text anchored at xy: outlined by Pillow, or through the effects stage."""
+        if draft and effects is not None:
+            effects = effects.for_draft()
+        if effects is not None and not effects.plain:
+            self.draw_effects(draw, xy, wrapped_text, font, chain, anchor, align, style, enable_shadow, effects)
+            return
+
+        if chain is not None:
+            self.draw_runs(draw, xy, wrapped_text, font, chain, anchor, align, style, enable_shadow, draft)
+            return
+
+        x, y = xy
+        reshaped_text = display_form(wrapped_text, self.layout_engine)
+        if enable_shadow:
+            draw.multiline_text((x + 2, y + 2), reshaped_text, font=font, fill=style.shadow,
+                                anchor=anchor, align=align)
+
+        draw.multiline_text((x, y), reshaped_text, font=font, fill=style.fill,
+                            anchor=anchor, align=align, stroke_fill=style.stroke, **self.outline(draw, font, not draft))
+
+    def draw_effects(self, draw, xy, wrapped_text, font, chain, anchor, align, style, enable_shadow, effects: TextEffects):
+        """Draws wrapped text with effects as one layer composited onto draw.
+
+        The glyphs are recorded rather than drawn, at the positions plain text
+        would take; the layer for those positions is taken from the cache or
+        rendered from their coverage mask.
+        """
+        recording = RecordingDraw("L")
+        if chain is not None:
+            self.draw_runs(recording, xy, wrapped_text, font, chain, anchor, align, style, draft=True)
+        else:
+            recording.multiline_text(xy, display_form(wrapped_text, self.layout_engine), font=font, fill=255,
+                                     anchor=anchor, align=align, **self.outline(recording, font, stroked=False))
+        key = (tuple(op_key(op) for op in recording.ops), effects, style, enable_shadow)
+        layer = self.effect_layers.get(key, lambda: effect_layer(recording.ops, effects, style, enable_shadow))
+        if layer.image is not None:
+            draw.composite(layer.image, layer.offset)
+
+    def draw_runs(self, draw, xy, wrapped_text, font, chain, anchor, align, style, enable_shadow=False, draft=False):
+        """Draws wrapped text line by line, each run with its own font, on a shared baseline."""
+        x, y = xy
+        lines = wrapped_text.split("\n")
+        spacing = self.line_spacing(draw, font)
+        ascent, descent = font.getmetrics()
+
+        # Vertical anchors follow multiline_text: the block is shifted, then each line is anchored
+        if anchor[1] == "m":
+            y -= (len(lines) - 1) * spacing / 2
+            baseline_offset = (ascent - descent) / 2
+        elif anchor[1] == "d":
+            y -= (len(lines) - 1) * spacing
+            baseline_offset = -descent
+        else:
+            baseline_offset = ascent
+
+        shadow_color = style.shadow if enable_shadow else None
+        for index, line in enumerate(lines):
+            runs = visual_runs(chain.runs(line))
+            placed = []
+            for run in runs:
+                run_font = load_font(run.font_identifier, font.size, self.layout_engine)
+                run_text = display_form(run.text, self.layout_engine)
+                placed.append((run_text, run_font, draw.textlength(run_text, font=run_font)))
+
+            line_width = sum(width for _, _, width in placed)
+            if align == "left":
+                cursor = x
+            elif align == "right":
+                cursor = x - line_width
+            else:
+                cursor = x - line_width / 2
+            baseline = y + index * spacing + baseline_offset
+
+            for run_text, run_font, width in placed:
+                if shadow_color is not None:
+                    draw.text((cursor + 2, baseline + 2), run_text, font=run_font, fill=shadow_color, anchor="ls")
+                draw.text((cursor, baseline), run_text, font=run_font, fill=style.fill, anchor="ls",
+                          stroke_width=0 if draft else 2, stroke_fill=style.stroke)
+                cursor += width
+
+    def wrap_text(self, draw, text, font, max_width, chain=None):
+        """Greedy word wrap of logical text, measured in the engine's shaped form
+        (run by run, each with its own font, when a font chain is given)."""
+        return "\n".join(line for layout in self.layout_text(draw, text, font, max_width, chain) for line in layout.lines)
+
+    def layout_text(self, draw, text, font, max_width, chain=None):
+        """Lays out each paragraph of text, reusing cached layouts of unchanged paragraphs."""
+        fonts = chain.font_identifiers if chain is not None else None
+        return [
+            self.layout_cache.get((paragraph, font.path, font.size, max_width, fonts),
+                                  lambda paragraph=paragraph: self.layout_paragraph(draw, paragraph, font, max_width, chain))
+            for paragraph in text.split('\n')
+        ]
+
+    def layout_paragraph(self, draw, paragraph, font, max_width, chain=None) -> ParagraphLayout:
+        words = paragraph.split()
+        if not words:
+            wrapped_lines = ['']
+        elif chain is None and self.layout_engine == "basic":
+            # Every word measured in one gather over the font's advance table, instead of each candidate line
+            widths, join_widths = word_widths(advance_table(font.path, font.size), words)
+            wrapped_lines = [" ".join(words[start:end]) for start, end in greedy_lines(widths, join_widths, max_width)]
+        else:
+            wrapped_lines = []
+            current_line = words[0]
+            for word in words[1:]:
+                if self.text_width(draw, current_line + " " + word, font, chain) <= max_width:
+                    current_line += " " + word
+                else:
+                    wrapped_lines.append(current_line)
+                    current_line = word
+            wrapped_lines.append(current_line)
+
+        if chain is not None:
+            # Mixed-font blocks are measured from the line count alone
+            return ParagraphLayout(tuple(wrapped_lines))
+        bottoms = tuple(draw.textbbox((0, 0), measure_form(line, self.layout_engine), font=font)[3] for line in wrapped_lines)
+        return ParagraphLayout(tuple(wrapped_lines), bottoms)
+
+    def draw_text_at_position(self, draw, text, font_identifier, text_color, image_size, position, font_size, enable_shadow=False, chain=None, draft=False, effects=None):
+        margin = self.POSITION_MARGIN
+        font = self.load_font(font_identifier, font_size)
+
+        # Wrap text to fit image width
+        wrapped_text = self.wrap_text(draw, text, font, image_size[0] - (2 * margin), chain)
+
+        # Determine horizontal and vertical alignment from position
+        if "left" in position:
+            h_align = "left"
+            anchor_h = "l"
+        elif "right" in position:
+            h_align = "right"
+            anchor_h = "r"
+        else:
+            h_align = "center"
+            anchor_h = "m"
+
+        if "top" in position:
+            anchor_v = "a"
+            y = margin
+        elif "bottom" in position:
+            anchor_v = "d"
+            y = image_size[1] - margin
+        else: # Middle
+            anchor_v = "m"
+            y = image_size[1] / 2
+
+        # Calculate X coordinate based on alignment
+        if h_align == "left":
+            x = margin
+        elif h_align == "right":
+            x = image_size[0] - margin
+        else: # Center
+            x = image_size[0] / 2
+
+        anchor = anchor_h + anchor_v
+        self.draw_lines(draw, (x, y), wrapped_text, font, chain, anchor, h_align, text_style(text_color),
+                        enable_shadow, draft, effects)
@@ -1,22 +1,28 @@
 import sys
-import requests
 import json
 import os
 import shutil
+import multiprocessing
 from pathlib import Path
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QGridLayout, QLabel,
     QPushButton, QPlainTextEdit, QComboBox, QFileDialog, QMessageBox, QCheckBox,
     QDialog, QVBoxLayout, QHBoxLayout, QMenuBar, QSizePolicy, QMenu, QInputDialog, QSpinBox
 )
-from PySide6.QtGui import QPixmap, QImage, QKeyEvent, QGuiApplication, QDesktopServices, QAction, QActionGroup, QFontDatabase
-from PySide6.QtCore import Qt, QUrl, QSize, QThread, Signal
-from PIL import Image, ImageDraw, ImageFont
-from PIL.ImageQt import ImageQt
-from typing import Optional, Dict, Any
-import io
-import arabic_reshaper
-from bidi.algorithm import get_display
+from PySide6.QtGui import QImage, QKeyEvent, QGuiApplication, QDesktopServices, QAction, QActionGroup, QFontDatabase
+from PySide6.QtCore import Qt, QUrl, QSize, QThread, QTimer, Signal
+from typing import Dict, Any
+from animation import ANIMATION_EFFECTS, ANIMATION_FORMATS, export_animation
+from auto_encoder import AUTO_FORMAT, encode_auto
+from backgrounds import BackgroundImage, BackgroundSpec, GENERATED_BACKGROUNDS, IMAGE_PRESETS, PATTERNS, PRINT_DPI, PRINT_PRESETS
+from blocks import parse_blocks
+from carousel import render_carousel
+from image_renderer import ImageRenderer, default_font_paths, write_image
+from preview_view import PreviewView
+from render_plan import compile_plan, parse_text_effects
+from render_queue import RenderQueue
+from text_layout import LAYOUT_ENGINES, raqm_available
+from tiled_render import TILED_FORMATS, needs_tiling, preview_scale, render_tiled, scaled_params
 
 APP_VERSION = "1.9"
 GITHUB_VERSION_URL = "https://raw.githubusercontent.com/ahmedthebest31/ImageType/main/version.json"
@@ -78,6 +84,11 @@ FONTS_DIR = PathProvider.get_path("fonts")
 TEMPLATES_DIR = PathProvider.get_path("templates")
 THEMES_DIR = PathProvider.get_path("themes")
 TRANSLATIONS = {}
+
+# Generated background settings that have no widget and are carried over from templates
+TEMPLATE_BACKGROUND_OPTIONS = ("background_stops", "gradient_angle", "pattern_size", "noise_seed")
+# Item data of the dimensions combo entry that opens CustomSizeDialog
+CUSTOM_DIMENSIONS = "custom"
 CURRENT_LANG = "en"
 
 def load_config():
@@ -88,8 +99,9 @@ def load_config():
             config = json.load(f)
             config.setdefault("language", "en")
             config.setdefault("theme", "dark_theme.qss")
+            config.setdefault("layout_engine", "auto")
             return config
-    return {"language": "en", "theme": "dark_theme.qss"}
+    return {"language": "en", "theme": "dark_theme.qss", "layout_engine": "auto"}
 
 def save_config(config):
     """Saves configuration to file."""
@@ -160,6 +172,44 @@ class AboutDialog(QDialog):
         button_layout.addStretch()
         layout.addLayout(button_layout)
 
+class CustomSizeDialog(QDialog):
+    """Asks for output dimensions and print resolution beyond the presets."""
+    def __init__(self, dims, dpi, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(tr("dialog_title_custom_size"))
+        self.setAccessibleName(tr("dialog_title_custom_size") + " Dialog")
+
+        layout = QGridLayout(self)
+        self.width_spinbox = QSpinBox()
+        self.height_spinbox = QSpinBox()
+        self.dpi_spinbox = QSpinBox()
+        for row, (spinbox, key, value, maximum) in enumerate((
+                (self.width_spinbox, "custom_size_width", dims[0], 30000),
+                (self.height_spinbox, "custom_size_height", dims[1], 30000),
+                (self.dpi_spinbox, "custom_size_dpi", dpi, 2400))):
+            spinbox.setRange(16, maximum)
+            spinbox.setValue(value)
+            spinbox.setAccessibleName(tr(key))
+            label = QLabel(tr(key))
+            label.setBuddy(spinbox)
+            layout.addWidget(label, row, 0)
+            layout.addWidget(spinbox, row, 1)
+
+        ok_button = QPushButton(tr("dialog_ok_button"))
+        ok_button.setDefault(True)
+        ok_button.clicked.connect(self.accept)
+        cancel_button = QPushButton(tr("dialog_cancel_button"))
+        cancel_button.clicked.connect(self.reject)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout, 3, 0, 1, 2)
+
+    def values(self):
+        return (self.width_spinbox.value(), self.height_spinbox.value()), self.dpi_spinbox.value()
+
 class AccessiblePlainTextEdit(QPlainTextEdit):
     def keyPressEvent(self, event: QKeyEvent):
         if event.key() == Qt.Key.Key_Backtab:
@@ -171,40 +221,51 @@ class AccessiblePlainTextEdit(QPlainTextEdit):
         else:
             super().keyPressEvent(event)
 
-class ImageProcessorThread(QThread):
-    finished_image = Signal(object, object, str)
+class ExportThread(QThread):
+    """Runs a file export (print-size save, animation, carousel) off the GUI thread.
 
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.params = {}
-        self.action = "preview"
-        self.is_cancelled = False
+    export is called as export(renderer, params, *args) and its result is emitted on success.
+    """
+    saved = Signal(object)
+    failed = Signal(str)
 
-    def setup(self, params: Dict[str, Any], action: str = "preview"):
+    def __init__(self, export, params: Dict[str, Any], *args, parent=None):
+        super().__init__(parent)
+        self.export = export
         self.params = params
-        self.action = action
-        self.is_cancelled = False
+        self.args = args
 
     def run(self):
-        processor = self.params.pop("processor", None)
-        if not processor:
-            return
+        processor = self.params.pop("processor")
+        try:
+            self.saved.emit(self.export(processor, self.params, *self.args))
+        except Exception as e:
+            self.failed.emit(str(e))
 
+class ImageLoaderThread(QThread):
+    """Decodes a background photo off the GUI thread: a quick draft first, then the full image."""
+    draft_ready = Signal(object, int)
+    image_loaded = Signal(object, int)
+    load_failed = Signal(str, int)
+
+    def __init__(self, path: str, token: int, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.token = token
+
+    def run(self):
         try:
-            image = processor.create_image(**self.params)
-            if self.is_cancelled:
+            draft = BackgroundImage.open_draft(self.path)
+            if draft and not self.isInterruptionRequested():
+                self.draft_ready.emit(draft, self.token)
+            if self.isInterruptionRequested():
                 return
-
-            qimage = None
-            if image:
-                # Decoupled thread-safe deep copy using ImageQt
-                qim = ImageQt(image)
-                qimage = qim.copy()
-            
-            if not self.is_cancelled:
-                self.finished_image.emit(image, qimage, self.action)
+            image = BackgroundImage.open(self.path)
+            if not self.isInterruptionRequested():
+                self.image_loaded.emit(image, self.token)
         except Exception as e:
-            print(f"Error in image processing thread: {e}")
+            if not self.isInterruptionRequested():
+                self.load_failed.emit(str(e), self.token)
 
 class ImageTextEditorApp(QMainWindow):
     def __init__(self):
@@ -213,20 +274,48 @@ class ImageTextEditorApp(QMainWindow):
         self.current_image_path = ""
         self.generated_image = None
 
-        self.font_paths = {
-            "regular": str(Path(FONTS_DIR) / "Amiri" / "Amiri-Regular.ttf"),
-            "bold": str(Path(FONTS_DIR) / "Amiri" / "Amiri-Bold.ttf"),
-            "italic": str(Path(FONTS_DIR) / "Amiri" / "Amiri-Italic.ttf"),
-            "bold_italic": str(Path(FONTS_DIR) / "Amiri" / "Amiri-BoldItalic.ttf")
-        }
-
-        self.processing_thread = ImageProcessorThread(self)
-        self.processing_thread.finished_image.connect(self.on_image_processed)
+        # Background loads in flight; only the one matching image_load_token is applied
+        self.image_loaders = []
+        self.image_load_token = 0
+        self.image_loading = False
+        self.pending_image_action = None
+
+        # Generated background options only settable from templates (stops, angle, ...)
+        self.background_options = {}
+        # Title/body/footer text blocks from the applied template; the editor text fills blocks without text
+        self.text_blocks = ()
+        # Outline width, glow, fill and inner shadow from the applied template (None draws plain outlined text)
+        self.text_effects = None
+        # Render plan compiled from the current settings, and the settings it was compiled from
+        self.render_plan = None
+        self.render_plan_key = None
+
+        # Size behind the "custom" dimensions entry, and the last entry picked before it
+        self.custom_dims = next(iter(PRINT_PRESETS))
+        self.custom_dpi = PRINT_DPI
+        self.dimensions_index = 0
+        self.tiled_save_thread = None
+        self.animation_thread = None
+        self.carousel_thread = None
+
+        self.render_queue = RenderQueue(parent=self)
+        self.render_queue.finished_image.connect(self.on_image_processed)
+        self.render_queue.failed.connect(self.on_render_failed)
+        # Token of the render shown in the preview; results of older renders are not shown
+        self.displayed_render = 0
+        # (token, region, factor) of the zoomed-in detail being rendered
+        self.pending_detail = None
 
         global CURRENT_LANG
         config = load_config()
         CURRENT_LANG = config.get("language", "en")
 
+        # "auto" resolves to RAQM when this Pillow build has it
+        self.layout_engine = config.get("layout_engine", "auto")
+        # Fonts (paths or names) tried for characters the selected font lacks, before Amiri
+        self.fallback_fonts = config.get("font_fallback_chain", [])
+        self.renderer = ImageRenderer(default_font_paths(FONTS_DIR), self.layout_engine, self.fallback_fonts)
+
         self.apply_theme(config.get("theme", "dark_theme.qss"))
 
         self.setWindowTitle(tr("app_title"))
@@ -241,11 +330,19 @@ class ImageTextEditorApp(QMainWindow):
 
         from update_manager import UpdateManager
         self.update_manager = UpdateManager(self, tr, load_config, save_config, APP_VERSION)
-        self.update_manager.check_for_updates(silent=True)
+        self.update_check_started = False
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.update_check_started:
+            # Checking for updates waits until the window is on screen
+            self.update_check_started = True
+            QTimer.singleShot(0, lambda: self.update_manager.check_for_updates(silent=True))
 
     def set_default_settings(self):
         self._set_combo_by_data(self.background_type_combo, "solid")
         self._set_combo_by_data(self.background_color_combo, "black")
+        self._set_combo_by_data(self.background_color2_combo, "blue")
         self._set_combo_by_data(self.text_color_combo, "white")
         self._set_combo_by_data(self.text_position_combo, "center")
         self.update_background_options()
@@ -262,6 +359,11 @@ class ImageTextEditorApp(QMainWindow):
         save_template_action = file_menu.addAction(tr("menu_file_save_template"))
         save_template_action.triggered.connect(self.save_template)
         file_menu.addSeparator()
+        export_animation_action = file_menu.addAction(tr("menu_file_export_animation"))
+        export_animation_action.triggered.connect(self.export_animation)
+        export_carousel_action = file_menu.addAction(tr("menu_file_export_carousel"))
+        export_carousel_action.triggered.connect(self.export_carousel)
+        file_menu.addSeparator()
         exit_action = file_menu.addAction(tr("menu_file_exit"))
         exit_action.triggered.connect(self.close)
 
@@ -282,6 +384,18 @@ class ImageTextEditorApp(QMainWindow):
             if lang_code == CURRENT_LANG:
                 action.setChecked(True)
 
+        self.layout_engine_menu = settings_menu.addMenu(tr("menu_settings_layout_engine"))
+        engine_group = QActionGroup(self)
+        engine_group.setExclusive(True)
+        for engine in LAYOUT_ENGINES:
+            action = self.layout_engine_menu.addAction(tr(f"layout_engine_{engine}"))
+            action.setCheckable(True)
+            action.setEnabled(engine != "raqm" or raqm_available())
+            action.triggered.connect(lambda checked, name=engine: self.change_layout_engine(name))
+            engine_group.addAction(action)
+            if engine == self.layout_engine:
+                action.setChecked(True)
+
         # Help Menu
         help_menu = menubar.addMenu(tr("menu_help"))
         about_action = help_menu.addAction(tr("about_action"))
@@ -301,8 +415,12 @@ class ImageTextEditorApp(QMainWindow):
         self.fit_to_width_checkbox.setChecked(False)
         self.image_dimensions_combo.setCurrentIndex(0)
         self.enable_shadow_checkbox.setChecked(False)
+        self.cancel_image_load()
         self.loaded_image = None
         self.current_image_path = ""
+        self.background_options = {}
+        self.text_blocks = ()
+        self.text_effects = None
         
         self.set_default_settings()
         self.update_preview_live()
@@ -321,13 +439,21 @@ class ImageTextEditorApp(QMainWindow):
                 "font_style": self.font_style_combo.currentData(),
                 "background_type": self.background_type_combo.currentData(),
                 "background_color": self.background_color_combo.currentData(),
+                "background_color2": self.background_color2_combo.currentData(),
+                "background_pattern": self.background_pattern_combo.currentData(),
+                **self.background_options,
                 "text_color": self.text_color_combo.currentData(),
-                "image_dimensions": self.image_dimensions_combo.currentData(),
+                "image_dimensions": self.current_dims(),
+                "dpi": self.current_dpi(),
                 "fit_to_width": self.fit_to_width_checkbox.isChecked(),
                 "enable_shadow": self.enable_shadow_checkbox.isChecked(),
                 "text_position": self.text_position_combo.currentData(),
                 "image_path": self.current_image_path if self.loaded_image else ""
             }
+            if self.text_blocks:
+                template_data["blocks"] = [block.to_settings() for block in self.text_blocks]
+            if self.text_effects is not None:
+                template_data["text_effects"] = self.text_effects.to_settings()
 
             try:
                 with open(template_path, "w", encoding="utf-8") as f:
@@ -367,22 +493,30 @@ class ImageTextEditorApp(QMainWindow):
     def apply_template(self, template_data):
         """Applies a selected template's settings to the UI."""
         try:
+            # Parsed first so a template with a broken block changes nothing
+            text_blocks = parse_blocks(template_data.get("blocks"))
+            text_effects = parse_text_effects(template_data.get("text_effects"))
+            self.text_blocks = text_blocks
+            self.text_effects = text_effects
             self.text_input.setPlainText(template_data.get("sample_text", ""))
 
             self._set_combo_by_data(self.font_style_combo, template_data.get("font_style"))
             self.fit_to_width_checkbox.setChecked(template_data.get("fit_to_width", False))
             self._set_combo_by_data(self.background_type_combo, template_data.get("background_type"))
             self._set_combo_by_data(self.background_color_combo, template_data.get("background_color"))
+            self._set_combo_by_data(self.background_color2_combo, template_data.get("background_color2"))
+            self._set_combo_by_data(self.background_pattern_combo, template_data.get("background_pattern"))
+            self.background_options = {key: template_data[key] for key in TEMPLATE_BACKGROUND_OPTIONS if key in template_data}
             self._set_combo_by_data(self.text_color_combo, template_data.get("text_color"))
-            self._set_combo_by_data(self.image_dimensions_combo, template_data.get("image_dimensions"))
+            self.apply_template_dimensions(template_data.get("image_dimensions"), template_data.get("dpi"))
             self.enable_shadow_checkbox.setChecked(template_data.get("enable_shadow", False))
             self._set_combo_by_data(self.text_position_combo, template_data.get("text_position"))
 
             image_path = template_data.get("image_path")
             if image_path and Path(image_path).exists():
-                self.loaded_image = Image.open(image_path)
-                self.current_image_path = image_path
+                self.start_image_load(image_path)
             else:
+                self.cancel_image_load()
                 self.loaded_image = None
                 self.current_image_path = ""
                 if image_path:
@@ -393,13 +527,31 @@ class ImageTextEditorApp(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_apply_template_error", e))
 
+    def apply_template_dimensions(self, dims, dpi):
+        """Selects a preset, or the custom entry for any other [width, height]."""
+        if not (isinstance(dims, (list, tuple)) and len(dims) == 2):
+            return # Legacy templates stored the translated label instead
+        dims = tuple(dims)
+        if dims in IMAGE_PRESETS or dims in PRINT_PRESETS:
+            self._set_combo_by_data(self.image_dimensions_combo, dims)
+            return
+        self.custom_dims = dims
+        self.custom_dpi = dpi or self.custom_dpi
+        self._update_custom_dimensions_label()
+        self._set_combo_by_data(self.image_dimensions_combo, CUSTOM_DIMENSIONS)
+
     def _set_combo_by_data(self, combo, data):
         """Helper to set a QComboBox's current index by its item data."""
         if data is None: return
-        index = combo.findData(data)
+        index = self._find_combo_data(combo, data)
         if index != -1:
             combo.setCurrentIndex(index)
 
+    @staticmethod
+    def _find_combo_data(combo, data):
+        # findData compares Python objects such as tuples by identity, not by value
+        return next((i for i in range(combo.count()) if combo.itemData(i) == data), -1)
+
     def load_themes_to_menu(self):
         """Loads available themes and adds them to the Themes menu."""
         self.themes_menu.clear()
@@ -438,6 +590,16 @@ class ImageTextEditorApp(QMainWindow):
         config["theme"] = theme_file
         save_config(config)
 
+    def change_layout_engine(self, engine):
+        """Switches the text shaping engine and saves it to the config."""
+        self.layout_engine = engine
+        # Queued renders keep the renderer they were dispatched with
+        self.renderer = ImageRenderer(default_font_paths(FONTS_DIR), engine, self.fallback_fonts)
+        config = load_config()
+        config["layout_engine"] = engine
+        save_config(config)
+        self.update_preview_live()
+
     def apply_theme(self, theme_file):
         """Reads a QSS file and applies it to the application."""
         theme_path = Path(THEMES_DIR) / theme_file
@@ -508,20 +670,30 @@ class ImageTextEditorApp(QMainWindow):
         grid_layout.addWidget(self.background_color_label, 6, 0)
         grid_layout.addWidget(self.background_color_combo, 6, 1)
 
-        # Row 7: Image Quality and Copy
+        # Row 7: Second Color and Pattern (generated backgrounds only)
+        self.background_color2_label = QLabel()
+        self.background_color2_combo = QComboBox()
+        self.background_pattern_combo = QComboBox()
+        row7_right_layout = QHBoxLayout()
+        row7_right_layout.addWidget(self.background_color2_combo)
+        row7_right_layout.addWidget(self.background_pattern_combo)
+        grid_layout.addWidget(self.background_color2_label, 7, 0)
+        grid_layout.addLayout(row7_right_layout, 7, 1)
+
+        # Row 8: Image Quality and Copy
         self.image_quality_combo = QComboBox()
-        grid_layout.addWidget(self.image_quality_combo, 7, 0)
+        grid_layout.addWidget(self.image_quality_combo, 8, 0)
         self.copy_button = QPushButton()
-        grid_layout.addWidget(self.copy_button, 7, 1)
+        grid_layout.addWidget(self.copy_button, 8, 1)
 
-        # Row 8: Generate and Save
+        # Row 9: Generate and Save
         self.generate_image_button = QPushButton()
-        grid_layout.addWidget(self.generate_image_button, 8, 0, 1, 2)
+        grid_layout.addWidget(self.generate_image_button, 9, 0, 1, 2)
 
         # Image Preview (spans all rows)
-        self.image_preview = QLabel()
-        self.image_preview.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        grid_layout.addWidget(self.image_preview, 0, 2, 9, 1)
+        self.image_preview = PreviewView()
+        self.image_preview.detail_requested.connect(self.render_preview_detail)
+        grid_layout.addWidget(self.image_preview, 0, 2, 10, 1)
 
         grid_layout.setColumnStretch(0, 1)
         grid_layout.setColumnStretch(1, 1)
@@ -538,8 +710,11 @@ class ImageTextEditorApp(QMainWindow):
         self.enable_shadow_checkbox.toggled.connect(self.update_preview_live)
         self.text_position_combo.currentIndexChanged.connect(self.update_preview_live)
         self.image_dimensions_combo.currentIndexChanged.connect(self.update_preview_live)
+        self.image_dimensions_combo.activated.connect(self.on_dimensions_activated)
         self.background_type_combo.currentIndexChanged.connect(self.update_background_options)
         self.background_color_combo.currentIndexChanged.connect(self.update_preview_live)
+        self.background_color2_combo.currentIndexChanged.connect(self.update_preview_live)
+        self.background_pattern_combo.currentIndexChanged.connect(self.update_preview_live)
         self.copy_button.clicked.connect(self.copy_image_to_clipboard)
         self.generate_image_button.clicked.connect(self.generate_and_save_image)
 
@@ -568,26 +743,37 @@ class ImageTextEditorApp(QMainWindow):
         })
 
         self._populate_combo(self.image_dimensions_combo, tr("image_dimensions_combo_label"), {
-            (1200, 675): "image_dimensions_standard", (1080, 1080): "image_dimensions_square", (1080, 1920): "image_dimensions_portrait"
+            **IMAGE_PRESETS, **PRINT_PRESETS, CUSTOM_DIMENSIONS: "image_dimensions_custom"
         })
+        self._update_custom_dimensions_label()
 
         self._populate_combo(self.background_type_combo, tr("background_type_combo_label"), {
-            "existing": "background_type_existing", "transparent": "background_type_transparent", "solid": "background_type_solid_color"
+            "existing": "background_type_existing", "transparent": "background_type_transparent", "solid": "background_type_solid_color",
+            "linear_gradient": "background_type_linear_gradient", "radial_gradient": "background_type_radial_gradient",
+            "noise": "background_type_noise", "pattern": "background_type_pattern"
         })
 
-        self._populate_combo(self.background_color_combo, tr("background_color_label"), {
+        background_colors = {
             "white": "color_white", "black": "color_black", "gray": "color_gray", "blue": "color_blue", "lightblue": "color_lightblue",
             "green": "color_green", "lightgreen": "color_lightgreen", "yellow": "color_yellow", "red": "color_red", "orange": "color_orange", "pink": "color_pink"
+        }
+        self._populate_combo(self.background_color_combo, tr("background_color_label"), background_colors)
+        self._populate_combo(self.background_color2_combo, tr("background_color2_label"), background_colors)
+
+        self._populate_combo(self.background_pattern_combo, tr("background_pattern_label"), {
+            pattern: f"pattern_{pattern}" for pattern in PATTERNS
         })
 
         self._populate_combo(self.image_quality_combo, tr("image_quality_combo_label"), {
-            95: "image_quality_high", 80: "image_quality_medium", 65: "image_quality_low"
+            95: "image_quality_high", 80: "image_quality_medium", 65: "image_quality_low",
+            AUTO_FORMAT: "image_quality_auto"
         })
 
         self.copy_button.setText(tr("copy_button"))
         self.generate_image_button.setText(tr("generate_and_save_button"))
         self.image_preview.setText(tr("image_preview_placeholder"))
         self.background_color_label.setText(tr("background_color_label"))
+        self.background_color2_label.setText(tr("background_color2_label"))
 
         self.setup_menubar()
         self.update_background_options()
@@ -644,6 +830,36 @@ class ImageTextEditorApp(QMainWindow):
             combo.addItem(tr(key), data)
         self._set_combo_by_data(combo, current_data)
 
+    def _update_custom_dimensions_label(self):
+        index = self._find_combo_data(self.image_dimensions_combo, CUSTOM_DIMENSIONS)
+        if index != -1:
+            self.image_dimensions_combo.setItemText(index, tr("image_dimensions_custom_value", *self.custom_dims, self.custom_dpi))
+
+    def on_dimensions_activated(self, index):
+        """Opens the custom size dialog when the user picks the custom entry."""
+        if self.image_dimensions_combo.itemData(index) != CUSTOM_DIMENSIONS:
+            self.dimensions_index = index
+            return
+        dialog = CustomSizeDialog(self.custom_dims, self.custom_dpi, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.custom_dims, self.custom_dpi = dialog.values()
+            self.dimensions_index = index
+            self._update_custom_dimensions_label()
+            self.update_preview_live()
+        else:
+            self.image_dimensions_combo.setCurrentIndex(self.dimensions_index)
+
+    def current_dims(self):
+        data = self.image_dimensions_combo.currentData()
+        return self.custom_dims if data == CUSTOM_DIMENSIONS else data
+
+    def current_dpi(self):
+        """Resolution stored in saved files; None for the social presets, as before."""
+        data = self.image_dimensions_combo.currentData()
+        if data == CUSTOM_DIMENSIONS:
+            return self.custom_dpi
+        return PRINT_DPI if data in PRINT_PRESETS else None
+
     def toggle_position_combo(self, *args, **kwargs):
         is_checked = self.fit_to_width_checkbox.isChecked()
         self.text_position_combo.setEnabled(not is_checked)
@@ -670,17 +886,72 @@ class ImageTextEditorApp(QMainWindow):
     def load_image(self):
         file_name, _ = QFileDialog.getOpenFileName(self, tr("load_image_button"), "", tr("file_dialog_filter"))
         if file_name:
-            try:
-                self.loaded_image = Image.open(file_name)
-                self.current_image_path = file_name
-                self.update_preview_live()
-            except Exception as e:
-                QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_load_image", e))
+            self.start_image_load(file_name)
+
+    def start_image_load(self, path):
+        """Loads a background in the background; picking another file supersedes this load."""
+        self.cancel_image_load()
+        self.image_loading = True
+        self.current_image_path = path
+
+        loader = ImageLoaderThread(path, self.image_load_token, self)
+        loader.draft_ready.connect(self.on_image_draft_ready)
+        loader.image_loaded.connect(self.on_image_loaded)
+        loader.load_failed.connect(self.on_image_load_failed)
+        loader.finished.connect(lambda: self.image_loaders.remove(loader))
+        self.image_loaders.append(loader)
+        loader.start()
+
+    def cancel_image_load(self):
+        # Superseded loaders are not waited on; their results are dropped by token
+        for loader in self.image_loaders:
+            loader.requestInterruption()
+        self.image_load_token += 1
+        self.image_loading = False
+        self.pending_image_action = None
+
+    def on_image_draft_ready(self, image, token):
+        if token != self.image_load_token:
+            return
+        self.loaded_image = image
+        self.update_preview_live()
+
+    def on_image_loaded(self, image, token):
+        if token != self.image_load_token:
+            return
+        self.loaded_image = image
+        self.image_loading = False
+        self.update_preview_live()
+
+        # A save, copy or export requested while the draft was showing runs on the full image
+        if self.pending_image_action:
+            action, self.pending_image_action = self.pending_image_action, None
+            if action == "animation":
+                self.export_animation()
+            elif action == "carousel":
+                self.export_carousel()
+            else:
+                self._dispatch_render(action)
+
+    def on_image_load_failed(self, error, token):
+        if token != self.image_load_token:
+            return
+        self.image_loading = False
+        self.pending_image_action = None
+        self.loaded_image = None
+        self.current_image_path = ""
+        self.update_preview_live()
+        QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_load_image", error))
 
     def update_background_options(self, *args, **kwargs):
-        is_solid_color = self.background_type_combo.currentData() == "solid"
+        background_type = self.background_type_combo.currentData()
+        is_generated = background_type in GENERATED_BACKGROUNDS
+        is_solid_color = background_type == "solid" or is_generated
         self.background_color_label.setVisible(is_solid_color)
         self.background_color_combo.setVisible(is_solid_color)
+        self.background_color2_label.setVisible(is_generated)
+        self.background_color2_combo.setVisible(is_generated)
+        self.background_pattern_combo.setVisible(background_type == "pattern")
 
         is_existing_image = self.background_type_combo.currentData() == "existing"
         self.load_image_button.setVisible(is_existing_image)
@@ -688,289 +959,277 @@ class ImageTextEditorApp(QMainWindow):
         self.update_preview_live()
 
     def get_current_params(self):
-        return {
-            "text": self.text_input.toPlainText(),
+        return self.current_render_plan().params(self.text_input.toPlainText(), self.loaded_image)
+
+    def current_render_plan(self):
+        """Compiles the settings into a render plan only when one of them changed, not on every keystroke."""
+        settings = {
             "background_type": self.background_type_combo.currentData(),
-            "img_dims": self.image_dimensions_combo.currentData(),
+            "img_dims": self.current_dims(),
             "bg_color": self.background_color_combo.currentData(),
-            "loaded_image": self.loaded_image,
+            "background_spec": self.current_background_spec(),
             "font_family": self.font_family_combo.currentText(),
             "font_style": self.font_style_combo.currentData() or "regular",
             "text_color": self.text_color_combo.currentData(),
             "fit_to_width": self.fit_to_width_checkbox.isChecked(),
             "enable_shadow": self.enable_shadow_checkbox.isChecked(),
             "text_position": self.text_position_combo.currentData(),
-            "font_size": self.font_size_spinbox.value() * 5
+            "font_size": self.font_size_spinbox.value() * 5,
+            "blocks": self.text_blocks,
+            "text_effects": self.text_effects
         }
+        key = (self.renderer, *settings.values())
+        if key != self.render_plan_key:
+            self.render_plan = compile_plan(self.renderer, settings, self.current_dpi())
+            self.render_plan_key = key
+        return self.render_plan
+
+    def current_background_spec(self):
+        """Describes the generated background selected in the UI, or None for the other types."""
+        background_type = self.background_type_combo.currentData()
+        if background_type not in GENERATED_BACKGROUNDS:
+            return None
+        settings = dict(self.background_options)
+        settings.update({
+            "background_type": background_type,
+            "background_color": self.background_color_combo.currentData(),
+            "background_color2": self.background_color2_combo.currentData(),
+            "background_pattern": self.background_pattern_combo.currentData()
+        })
+        return BackgroundSpec.from_settings(settings)
 
-    def _dispatch_thread(self, action="preview"):
-        if self.processing_thread.isRunning():
-            self.processing_thread.is_cancelled = True
-            self.processing_thread.wait()
-
-        params = self.get_current_params()
+    def _dispatch_render(self, action="preview"):
+        """Queues a render of the current settings; a save or copy never waits for a preview."""
+        try:
+            params = self.get_current_params()
+        except ValueError:
+            return # Combos are empty while being repopulated (language change); the last change renders
         params["for_preview"] = (action == "preview")
-        params["processor"] = self
-        self.processing_thread.setup(params, action)
-        self.processing_thread.start()
-
-    def on_image_processed(self, image, qimage, action):
+        scale = preview_scale(params["img_dims"])
+        if action == "preview" and scale < 1:
+            # Print sizes are previewed scaled down; only saving renders them in full
+            params = scaled_params(params, scale)
+        self.render_queue.submit(action, self.renderer, params)
+
+    def render_preview_detail(self, region, factor):
+        """Renders the part of the preview in view at factor times its resolution, for a zoomed-in preview."""
+        if self.image_preview.image_item is None:
+            return
+        try:
+            params = self.get_current_params()
+        except ValueError:
+            return
+        params["for_preview"] = True
+        # The frame on screen may be a draft, drawn smaller than the size it is shown at
+        scale = self.image_preview.frame_size[0] / params["img_dims"][0]
+        if scale < 1:
+            params = scaled_params(params, scale)
+        params = scaled_params(params, factor)
+        box = tuple(value * factor for value in region)
+        token = self.render_queue.submit("detail", self.renderer, params, region=box)
+        self.pending_detail = (token, region, factor)
+
+    def on_image_processed(self, image, qimage, action, token):
         if not image or not qimage:
             return
 
-        self.generated_image = image
-        pixmap = QPixmap.fromImage(qimage)
-        self.image_preview.setPixmap(pixmap.scaled(
-            self.image_preview.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        ))
+        if action == "detail":
+            if self.pending_detail and self.pending_detail[0] == token and token > self.displayed_render:
+                self.image_preview.set_detail(self.pending_detail[1], self.pending_detail[2], qimage)
+            return
+
+        # A slow preview arrives twice, as a draft and then in full with a larger token; both replace the frame shown
+        if token > self.displayed_render:
+            # A save can finish after a newer preview; the newer one stays on screen
+            self.displayed_render = token
+            replaced, self.generated_image = self.generated_image, image
+            self.image_preview.setImage(qimage, draft=action == "draft")
+            # The preview's canvas goes back to the pool only once it is off screen
+            self.render_queue.release(replaced)
+        else:
+            self.render_queue.release(image)
 
         if action == "save":
-            self.save_image(self.generated_image)
+            self.save_image(image)
         elif action == "copy":
             clipboard = QGuiApplication.clipboard()
             clipboard.setImage(qimage)
-            if not self.generated_image.mode == 'RGBA' or self.background_type_combo.currentData() != "transparent":
+            if not image.mode == 'RGBA' or self.background_type_combo.currentData() != "transparent":
                 QMessageBox.information(self, tr("dialog_title_success"), tr("msg_image_copied"))
 
+    def on_render_failed(self, error, action):
+        if action in ("draft", "preview", "detail"):
+            print(f"Error in image processing thread: {error}")
+        else:
+            QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_save_image", error))
+
+    def closeEvent(self, event):
+        self.render_queue.shutdown()
+        super().closeEvent(event)
+
     def update_preview_live(self, *args, **kwargs):
         """Generates and updates the image preview in real-time using a background thread."""
-        self._dispatch_thread("preview")
+        self._dispatch_render("preview")
 
     def generate_and_save_image(self):
         if not self.text_input.toPlainText():
             QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_enter_text"))
             return
+        if self.background_type_combo.currentData() == "existing" and self.image_loading:
+            self.pending_image_action = "save"
+            return
         if self.background_type_combo.currentData() == "existing" and not self.loaded_image:
             QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_load_image_first"))
             return
-        self._dispatch_thread("save")
+        if needs_tiling(self.current_dims()):
+            self.save_tiled_image()
+            return
+        self._dispatch_render("save")
 
     def copy_image_to_clipboard(self):
         if not self.text_input.toPlainText():
             QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_enter_text"))
             return
+        if self.background_type_combo.currentData() == "existing" and self.image_loading:
+            self.pending_image_action = "copy"
+            return
         if self.background_type_combo.currentData() == "existing" and not self.loaded_image:
             QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_load_image_first"))
             return
-        self._dispatch_thread("copy")
-
-    def create_image(self, text, background_type, img_dims, bg_color, loaded_image, font_family, font_style, text_color, fit_to_width, text_position, font_size=120, for_preview=False, enable_shadow=False) -> Optional[Image.Image]:
-        if not text and not for_preview:
-            return None
+        self._dispatch_render("copy")
 
-        base_image = None
+    # old update_preview and pil_to_qimage have been replaced by Thread signal and on_image_processed.
 
-        if background_type == "existing":
-            if loaded_image:
-                base_image = loaded_image.copy().resize(img_dims, Image.Resampling.LANCZOS).convert("RGBA")
-            elif for_preview:
-                return Image.new("RGB", img_dims, color="gray")
-            else:
-                return None
-        elif background_type == "solid":
-            base_image = Image.new("RGB", img_dims, color=bg_color)
-        else: # Transparent
-            base_image = Image.new("RGBA", img_dims, (255, 255, 255, 0))
-
-        if text:
-            return self.add_text_to_image(base_image, text, font_family, font_style, text_color, fit_to_width, text_position, font_size, enable_shadow)
-        return base_image
-
-    def add_text_to_image(self, image, text, font_family, font_style, text_color, fit_to_width, text_position, font_size, enable_shadow):
-        amiri_fallback_path = self.font_paths.get("regular")
-
-        font_identifier = None
-        if font_family == "Amiri":
-            font_identifier = self.font_paths.get(font_style, amiri_fallback_path)
-        else:
-            style_str = ""
-            if font_style == "bold":
-                style_str = " Bold"
-            elif font_style == "italic":
-                style_str = " Italic"
-            elif font_style == "bold_italic":
-                style_str = " Bold Italic"
-            font_identifier = f"{font_family}{style_str}"
+    def save_image(self, image):
+        save_path, selected_filter = QFileDialog.getSaveFileName(self, tr("generate_and_save_button"), "generated_image.png", tr("file_dialog_filter"))
+        if save_path:
+            try:
+                if self.image_quality_combo.currentData() == AUTO_FORMAT:
+                    self.save_image_auto(image, save_path)
+                    return
+                write_image(image, save_path, self.image_quality_combo.currentData(), dpi=self.current_dpi())
 
-        draw = ImageDraw.Draw(image)
+                QMessageBox.information(self, tr("dialog_title_success"), tr("msg_image_saved", save_path))
+            except Exception as e:
+                QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_save_image", e))
 
-        if not Path(font_identifier).exists() and font_family == "Amiri":
-             return image
+    def save_image_auto(self, image, save_path):
+        """Writes the smallest encoding that keeps the image visually intact; the extension follows the format."""
+        encoded = encode_auto(image, dpi=self.current_dpi())
+        save_path = str(Path(save_path).with_suffix(encoded.extension))
+        with open(save_path, "wb") as f:
+            f.write(encoded.data)
+        saved_percent = 100 * encoded.bytes_saved / encoded.baseline_size if encoded.baseline_size else 0
+        QMessageBox.information(self, tr("dialog_title_success"), tr(
+            "msg_image_saved_auto", save_path, encoded.label, len(encoded.data) // 1024,
+            encoded.bytes_saved // 1024, round(saved_percent)))
+
+    def save_tiled_image(self):
+        """Print sizes are too large for one canvas: render and write them in bands in the background."""
+        if self.tiled_save_thread is not None and self.tiled_save_thread.isRunning():
+            QMessageBox.information(self, tr("dialog_title_warning"), tr("msg_print_save_in_progress"))
+            return
+        save_path, _ = QFileDialog.getSaveFileName(self, tr("generate_and_save_button"), "generated_image.png", tr("print_file_dialog_filter"))
+        if not save_path:
+            return
+        if Path(save_path).suffix.lower() not in TILED_FORMATS:
+            save_path += ".png"
 
-        # Font fallback mechanism for unsupported characters (like Arabic)
         try:
-            test_font = ImageFont.truetype(font_identifier, 20)
-            
-            missing_boxes = [
-                test_font.getmask('\uFFFF').getbbox(),
-                test_font.getmask('\uFFFD').getbbox(),
-                test_font.getmask('\u0000').getbbox()
-            ]
-            
-            reshaped_text = get_display(arabic_reshaper.reshape(text))
-            
-            for char in set(reshaped_text):
-                if char.isspace(): continue
-                char_bbox = test_font.getmask(char).getbbox()
-                if char_bbox is None or char_bbox in missing_boxes:
-                    # Unsupported character spotted, fallback to Amiri
-                    font_identifier = amiri_fallback_path
-                    font_family = "Amiri"
-                    break
-        except Exception:
-            font_identifier = amiri_fallback_path
-            font_family = "Amiri"
-
-        if fit_to_width:
-            self.draw_text_fit_to_width(draw, text, font_identifier, text_color, image.size, enable_shadow)
-        else:
-            self.draw_text_at_position(draw, text, font_identifier, text_color, image.size, text_position, font_size, enable_shadow)
-
-        return image
-
-    def draw_text_fit_to_width(self, draw, text, font_identifier, text_color, image_size, enable_shadow=False):
-        img_width, img_height = image_size
-        margin = int(img_width * 0.05)
-        target_width = img_width - (2 * margin)
-
-        low_size = 10
-        high_size = 1000
-        best_size = low_size
-
-        # Binary Search Optimization for Font Sizing
-        while low_size <= high_size:
-            mid_size = (low_size + high_size) // 2
-            try:
-                font = ImageFont.truetype(font_identifier, mid_size)
-            except IOError:
-                font = ImageFont.truetype(self.font_paths.get("regular"), mid_size)
+            params = self.get_current_params()
+        except ValueError:
+            return # Combos are empty while being repopulated (language change)
+        params["processor"] = self.renderer
+        self.tiled_save_thread = ExportThread(render_tiled, params, save_path, self.current_dpi(), parent=self)
+        self.tiled_save_thread.saved.connect(lambda stats: QMessageBox.information(self, tr("dialog_title_success"), tr("msg_image_saved", stats["path"])))
+        self.tiled_save_thread.failed.connect(lambda error: QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_save_image", error)))
+        self.generate_image_button.setEnabled(False)
+        self.tiled_save_thread.finished.connect(lambda: self.generate_image_button.setEnabled(True))
+        self.tiled_save_thread.start()
+
+    def export_animation(self):
+        """Asks for an effect and a file, then renders the animation in the background."""
+        if not self.text_input.toPlainText():
+            QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_enter_text"))
+            return
+        if self.background_type_combo.currentData() == "existing" and self.image_loading:
+            self.pending_image_action = "animation"
+            return
+        if self.background_type_combo.currentData() == "existing" and not self.loaded_image:
+            QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_load_image_first"))
+            return
+        if self.animation_thread is not None and self.animation_thread.isRunning():
+            QMessageBox.information(self, tr("dialog_title_warning"), tr("msg_animation_in_progress"))
+            return
 
-            wrapped_text = self.wrap_text(draw, text, font, target_width)
-            reshaped_text = get_display(arabic_reshaper.reshape(wrapped_text))
-            text_height = draw.multiline_textbbox((0,0), reshaped_text, font=font, align="center")[3]
+        effect_names = [tr(f"animation_effect_{effect}") for effect in ANIMATION_EFFECTS]
+        effect_name, ok = QInputDialog.getItem(self, tr("dialog_title_export_animation"),
+                                               tr("animation_effect_label"), effect_names, 0, False)
+        if not ok:
+            return
+        effect = ANIMATION_EFFECTS[effect_names.index(effect_name)]
 
-            if text_height < img_height - (2 * margin):
-                best_size = mid_size
-                low_size = mid_size + 1
-            else:
-                high_size = mid_size - 1
+        save_path, _ = QFileDialog.getSaveFileName(self, tr("dialog_title_export_animation"), "animated_image.gif",
+                                                   tr("animation_file_dialog_filter"))
+        if not save_path:
+            return
+        if Path(save_path).suffix.lower() not in ANIMATION_FORMATS:
+            save_path += ".gif"
 
         try:
-            font = ImageFont.truetype(font_identifier, best_size)
-        except IOError:
-            font = ImageFont.truetype(self.font_paths.get("regular"), best_size)
+            params = self.get_current_params()
+        except ValueError:
+            return # Combos are empty while being repopulated (language change)
+        params["processor"] = self.renderer
+        self.animation_thread = ExportThread(export_animation, params, save_path, effect, parent=self)
+        self.animation_thread.saved.connect(lambda stats: QMessageBox.information(
+            self, tr("dialog_title_success"), tr("msg_animation_saved", stats["path"], stats["frames"], stats["frames_per_second"])))
+        self.animation_thread.failed.connect(lambda error: QMessageBox.critical(
+            self, tr("dialog_title_error"), tr("msg_could_not_save_image", error)))
+        self.animation_thread.start()
+
+    def export_carousel(self):
+        """Splits long text into numbered pages at the chosen font size (as the minimum) and saves them all."""
+        if not self.text_input.toPlainText().strip():
+            QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_enter_text"))
+            return
+        if self.background_type_combo.currentData() == "existing" and self.image_loading:
+            self.pending_image_action = "carousel"
+            return
+        if self.background_type_combo.currentData() == "existing" and not self.loaded_image:
+            QMessageBox.warning(self, tr("dialog_title_warning"), tr("msg_load_image_first"))
+            return
+        if self.carousel_thread is not None and self.carousel_thread.isRunning():
+            QMessageBox.information(self, tr("dialog_title_warning"), tr("msg_carousel_in_progress"))
+            return
 
-        wrapped_text = self.wrap_text(draw, text, font, target_width)
-        reshaped_text = get_display(arabic_reshaper.reshape(wrapped_text))
-        text_height = draw.multiline_textbbox((0,0), reshaped_text, font=font, align="center")[3]
+        save_path, _ = QFileDialog.getSaveFileName(self, tr("menu_file_export_carousel"), "carousel.png", tr("file_dialog_filter"))
+        if not save_path:
+            return
 
-        y = (img_height - text_height) / 2
-        stroke_color = "black" if text_color != "black" else "white"
-        
-        if enable_shadow:
-            shadow_color = (0, 0, 0, 128) if text_color in ["white", "yellow", "pink", "lightgreen", "lightblue"] else (255, 255, 255, 128)
-            draw.multiline_text((img_width/2 + 2, y + 2), reshaped_text, font=font, fill=shadow_color,
-                                anchor="ma", align="center")
-                                
-        draw.multiline_text((img_width/2, y), reshaped_text, font=font, fill=text_color,
-                            anchor="ma", align="center", stroke_width=2, stroke_fill=stroke_color)
-
-    def wrap_text(self, draw, text, font, max_width):
-        lines = text.split('\n')
-        wrapped_lines = []
-        for line in lines:
-            words = line.split()
-            if not words:
-                wrapped_lines.append('')
-                continue
-
-            current_line = words[0]
-            for word in words[1:]:
-                if draw.textlength(current_line + " " + word, font=font) <= max_width:
-                    current_line += " " + word
-                else:
-                    wrapped_lines.append(current_line)
-                    current_line = word
-            wrapped_lines.append(current_line)
-        return "\n".join(wrapped_lines)
-
-    def draw_text_at_position(self, draw, text, font_identifier, text_color, image_size, position, font_size, enable_shadow=False):
-        margin = 20
         try:
-            font = ImageFont.truetype(font_identifier, font_size)
-        except IOError:
-            font = ImageFont.truetype(self.font_paths.get("regular"), font_size)
-
-        # Wrap text to fit image width
-        wrapped_text = self.wrap_text(draw, text, font, image_size[0] - (2 * margin))
-        reshaped_text = get_display(arabic_reshaper.reshape(wrapped_text))
-
-        # Determine horizontal and vertical alignment from position
-        if "left" in position:
-            h_align = "left"
-            anchor_h = "l"
-        elif "right" in position:
-            h_align = "right"
-            anchor_h = "r"
-        else:
-            h_align = "center"
-            anchor_h = "m"
-
-        if "top" in position:
-            anchor_v = "a"
-            y = margin
-        elif "bottom" in position:
-            anchor_v = "d"
-            y = image_size[1] - margin
-        else: # Middle
-            anchor_v = "m"
-            y = image_size[1] / 2
-
-        # Calculate X coordinate based on alignment
-        if h_align == "left":
-            x = margin
-        elif h_align == "right":
-            x = image_size[0] - margin
-        else: # Center
-            x = image_size[0] / 2
-
-        anchor = anchor_h + anchor_v
-        stroke_color = "black" if text_color != "black" else "white"
-        
-        if enable_shadow:
-            shadow_color = (0, 0, 0, 128) if text_color in ["white", "yellow", "pink", "lightgreen", "lightblue"] else (255, 255, 255, 128)
-            draw.multiline_text((x + 2, y + 2), reshaped_text, font=font, fill=shadow_color,
-                                anchor=anchor, align=h_align)
-                                
-        draw.multiline_text((x, y), reshaped_text, font=font, fill=text_color,
-                            anchor=anchor, align=h_align, stroke_width=2, stroke_fill=stroke_color)
-
-    # old update_preview and pil_to_qimage have been replaced by Thread signal and on_image_processed.
-
-    def save_image(self, image):
-        save_path, selected_filter = QFileDialog.getSaveFileName(self, tr("generate_and_save_button"), "generated_image.png", tr("file_dialog_filter"))
-        if save_path:
-            try:
-                quality = self.image_quality_combo.currentData()
-
-                # For JPG, ensure image is RGB and save with quality
-                if save_path.lower().endswith((".jpg", ".jpeg")):
-                    if image.mode == 'RGBA':
-                        # Create a white background and paste the image onto it
-                        background = Image.new("RGB", image.size, (255, 255, 255))
-                        background.paste(image, (0, 0), image)
-                        image = background
-                    image.save(save_path, format="JPEG", quality=quality)
-                else: # For PNG and others
-                    image.save(save_path, quality=quality)
-
-                QMessageBox.information(self, tr("dialog_title_success"), tr("msg_image_saved", save_path))
-            except Exception as e:
-                QMessageBox.critical(self, tr("dialog_title_error"), tr("msg_could_not_save_image", e))
+            params = self.get_current_params()
+        except ValueError:
+            return # Combos are empty while being repopulated (language change)
+        params["processor"] = self.renderer
+        quality = self.image_quality_combo.currentData()
+        self.carousel_thread = ExportThread(render_carousel, params, save_path, params["font_size"],
+                                            95 if quality == AUTO_FORMAT else quality, self.current_dpi(), parent=self)
+        self.carousel_thread.saved.connect(lambda stats: QMessageBox.information(
+            self, tr("dialog_title_success"), tr("msg_carousel_saved", stats["pages"], str(Path(stats["paths"][0]).parent))))
+        self.carousel_thread.failed.connect(lambda error: QMessageBox.critical(
+            self, tr("dialog_title_error"), tr("msg_could_not_save_image", error)))
+        self.carousel_thread.start()
 
 def main():
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch_runner import run_batch_cli
+        sys.exit(run_batch_cli(sys.argv[2:], FONTS_DIR, TEMPLATES_DIR))
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        from hot_folder import run_watch_cli
+        sys.exit(run_watch_cli(sys.argv[2:], FONTS_DIR, TEMPLATES_DIR))
+
     load_translations()
     app = QApplication(sys.argv)
     window = ImageTextEditorApp()
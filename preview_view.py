@@ -0,0 +1,243 @@
+import math
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PySide6.QtCore import QRectF, Qt, QTimer, Signal
+from PySide6.QtGui import QImage, QKeySequence, QPainter, QPixmap
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsPixmapItem, QGraphicsScene, QGraphicsSimpleTextItem, QGraphicsView
+
+# Side of a cached tile in pixels of its mipmap level
+TILE_SIZE = 256
+# Tiles kept as pixmaps; a 1080x1920 frame is 40 tiles at full size and 14 at the next level
+MAX_TILES = 256
+
+ZOOM_STEP = 1.25
+MAX_ZOOM = 16.0
+# Beyond this zoom (screen pixels per frame pixel) the visible region is rendered again at a higher resolution
+DETAIL_ZOOM = 1.0
+MAX_DETAIL_FACTOR = 4
+# Pan and zoom must pause this long before a detail render is requested
+DETAIL_DELAY_MS = 150
+
+
+class MipmapTiles:
+    """A frame as a pyramid of halved copies, each cut into tiles that become pixmaps on first paint.
+
+    Drawing at a small zoom reads a small level instead of filtering the
+    whole frame, and panning only uploads tiles that come into view. The
+    pixmaps of the frame before (spare, same size) are painted over rather
+    than allocated again, so the preview is double-buffered while typing.
+    """
+
+    def __init__(self, image: QImage, spare: Optional[OrderedDict] = None):
+        self.levels = [image]
+        self.tiles = OrderedDict()
+        self.spare = spare if spare is not None else OrderedDict()
+
+    def level_for(self, scale: float) -> int:
+        """The smallest level that still has at least one pixel per screen pixel at scale."""
+        level = int(math.floor(math.log2(1 / scale))) if scale < 1 else 0
+        while len(self.levels) <= level and min(self.levels[-1].width(), self.levels[-1].height()) > TILE_SIZE // 2:
+            previous = self.levels[-1]
+            self.levels.append(previous.scaled(max(1, previous.width() // 2), max(1, previous.height() // 2),
+                                               Qt.AspectRatioMode.IgnoreAspectRatio,
+                                               Qt.TransformationMode.SmoothTransformation))
+        return min(level, len(self.levels) - 1)
+
+    def tile(self, level: int, column: int, row: int) -> QPixmap:
+        key = (level, column, row)
+        pixmap = self.tiles.get(key)
+        if pixmap is None:
+            image = self.levels[level]
+            x, y = column * TILE_SIZE, row * TILE_SIZE
+            pixmap = self.spare.pop(key, None)
+            if pixmap is None or pixmap.hasAlphaChannel() != image.hasAlphaChannel():
+                pixmap = QPixmap(min(TILE_SIZE, image.width() - x), min(TILE_SIZE, image.height() - y))
+                if image.hasAlphaChannel():
+                    pixmap.fill(Qt.GlobalColor.transparent)  # gives the pixmap an alpha channel
+            painter = QPainter(pixmap)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            painter.drawImage(0, 0, image, x, y, pixmap.width(), pixmap.height())
+            painter.end()
+            self.tiles[key] = pixmap
+            if len(self.tiles) > MAX_TILES:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(key)
+        return pixmap
+
+
+class TiledImageItem(QGraphicsItem):
+    """Scene item drawing a frame from MipmapTiles; one scene unit is one frame pixel."""
+
+    def __init__(self, image: QImage, spare: Optional[OrderedDict] = None):
+        super().__init__()
+        self.tiles = MipmapTiles(image, spare)
+        self.size = (image.width(), image.height())
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, *self.size)
+
+    def paint(self, painter: QPainter, option, widget=None):
+        scale = painter.worldTransform().m11()
+        level = self.tiles.level_for(scale)
+        step = TILE_SIZE << level  # frame pixels covered by one tile
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        for row in range(int(exposed.top()) // step, min(math.ceil(exposed.bottom() / step), math.ceil(self.size[1] / step))):
+            for column in range(int(exposed.left()) // step, min(math.ceil(exposed.right() / step), math.ceil(self.size[0] / step))):
+                pixmap = self.tiles.tile(level, column, row)
+                target = QRectF(column * step, row * step, pixmap.width() << level, pixmap.height() << level)
+                painter.drawPixmap(target.intersected(self.boundingRect()), pixmap,
+                                   QRectF(0, 0, pixmap.width(), pixmap.height()))
+
+
+class PreviewView(QGraphicsView):
+    """Zoomable, pannable preview of the rendered frame.
+
+    Fits the frame to the view until zoomed, and keeps fitting when the window
+    is resized. Zoom with Ctrl+wheel, Ctrl+plus / Ctrl+minus (Ctrl+0 fits
+    again) and pan by dragging, the wheel or the arrow keys. Pan and zoom only
+    repaint cached tiles; once the view has been zoomed past 100% and stays
+    still, detail_requested asks for the visible region of the frame (left,
+    top, right, bottom) at a higher factor, which set_detail lays on top.
+
+    Scene units are pixels of the frame (frame_size); a smaller draft of the
+    frame on screen is stretched over it until the full frame arrives.
+    """
+
+    detail_requested = Signal(object, int)  # region in frame pixels, factor
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setScene(QGraphicsScene(self))
+        self.setRenderHints(QPainter.RenderHint.SmoothPixmapTransform)
+        self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+        self.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorViewCenter)
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.SmartViewportUpdate)
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.image_item: Optional[TiledImageItem] = None
+        self.detail_item: Optional[QGraphicsPixmapItem] = None
+        self.text_item: Optional[QGraphicsSimpleTextItem] = None
+        self.detail_key = None  # (region, factor) of detail_item
+        self.frame_size = (0, 0)
+        self.fitting = True
+        self.detail_timer = QTimer(self, singleShot=True, interval=DETAIL_DELAY_MS, timeout=self._request_detail)
+        self.horizontalScrollBar().valueChanged.connect(self._view_changed)
+        self.verticalScrollBar().valueChanged.connect(self._view_changed)
+
+    def setText(self, text: str):
+        """Shows a placeholder instead of a frame, like QLabel.setText."""
+        self._clear()
+        self.text_item = self.scene().addSimpleText(text)
+        self.text_item.setBrush(self.palette().text())
+        self.setSceneRect(self.text_item.boundingRect())
+        self.resetTransform()
+        self.fitting = True
+
+    def setImage(self, image: QImage, draft: bool = False):
+        """Shows a new frame, keeping the current zoom and position unless the view is fitting.
+
+        A draft with the aspect ratio of the frame on screen is shown at that frame's size.
+        """
+        size = (image.width(), image.height())
+        frame_size = size
+        if draft and self.image_item is not None:
+            width, height = self.frame_size
+            # Both sides of a draft are rounded, so its ratio can be off by up to half a pixel each
+            if abs(size[0] * height - size[1] * width) <= (width + height) / 2:
+                frame_size = self.frame_size
+        size_changed = self.image_item is None or self.frame_size != frame_size
+        spare = self.image_item.tiles.tiles if self.image_item is not None and self.image_item.size == size else None
+        self._clear()
+        self.image_item = TiledImageItem(image, spare)
+        self.image_item.setScale(frame_size[0] / size[0])
+        self.frame_size = frame_size
+        self.scene().addItem(self.image_item)
+        self.setSceneRect(QRectF(0, 0, *frame_size))
+        if self.fitting or size_changed:
+            self.fit()
+        self._view_changed()
+
+    def _clear(self):
+        self.detail_timer.stop()
+        self.scene().clear()
+        self.image_item = self.detail_item = self.text_item = self.detail_key = None
+
+    def zoom(self) -> float:
+        return self.transform().m11()
+
+    def fit(self):
+        self.fitting = True
+        if self.image_item is not None:
+            self.fitInView(self.sceneRect(), Qt.AspectRatioMode.KeepAspectRatio)
+
+    def zoom_by(self, factor: float, under_mouse: bool = False):
+        if self.image_item is None:
+            return
+        fit_zoom = min(self.viewport().width() / self.frame_size[0], self.viewport().height() / self.frame_size[1])
+        factor = max(min(fit_zoom, 1.0) / 2, min(MAX_ZOOM, self.zoom() * factor)) / self.zoom()
+        self.fitting = False
+        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse if under_mouse
+                                     else QGraphicsView.ViewportAnchor.AnchorViewCenter)
+        self.scale(factor, factor)
+        self._view_changed()
+
+    def wheelEvent(self, event):
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            steps = event.angleDelta().y() / 120
+            self.zoom_by(ZOOM_STEP ** steps, under_mouse=True)
+            event.accept()
+        else:
+            super().wheelEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.ZoomIn) or event.key() == Qt.Key.Key_Plus:
+            self.zoom_by(ZOOM_STEP)
+        elif event.matches(QKeySequence.StandardKey.ZoomOut) or event.key() == Qt.Key.Key_Minus:
+            self.zoom_by(1 / ZOOM_STEP)
+        elif event.key() == Qt.Key.Key_0:
+            self.fit()
+            self._view_changed()
+        else:
+            super().keyPressEvent(event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.fitting:
+            self.fit()
+
+    def _view_changed(self, *args):
+        if self.image_item is not None:
+            self.detail_timer.start()
+
+    def visible_region(self) -> Tuple[int, int, int, int]:
+        """(left, top, right, bottom) of the frame in view, in frame pixels."""
+        visible = self.mapToScene(self.viewport().rect()).boundingRect().intersected(self.sceneRect())
+        return (max(0, math.floor(visible.left())), max(0, math.floor(visible.top())),
+                min(self.frame_size[0], math.ceil(visible.right())), min(self.frame_size[1], math.ceil(visible.bottom())))
+
+    def _request_detail(self):
+        if self.image_item is None or self.zoom() <= DETAIL_ZOOM:
+            return
+        region = self.visible_region()
+        if self.detail_key == (region, self._detail_factor()):
+            return
+        if region[2] > region[0] and region[3] > region[1]:
+            self.detail_requested.emit(region, self._detail_factor())
+
+    def _detail_factor(self) -> int:
+        return min(MAX_DETAIL_FACTOR, math.ceil(self.zoom()))
+
+    def set_detail(self, region: Tuple[int, int, int, int], factor: int, image: QImage):
+        """Lays a region rendered at factor times the frame's resolution over the frame."""
+        if self.image_item is None:
+            return
+        if self.detail_item is not None:
+            self.scene().removeItem(self.detail_item)
+        self.detail_item = self.scene().addPixmap(QPixmap.fromImage(image))
+        self.detail_item.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+        self.detail_item.setScale(1 / factor)
+        self.detail_item.setPos(region[0], region[1])
+        self.detail_key = (region, factor)
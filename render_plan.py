@@ -0,0 +1,139 @@
+from pathlib import Path
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+
+from PIL import ImageColor
+
+from backgrounds import BackgroundSpec, GENERATED_BACKGROUNDS
+from blocks import FIT_RULES, TextBlock
+from image_renderer import FONT_STYLES, TEXT_POSITIONS, TextStyle, text_style
+from text_effects import TextEffects
+from text_layout import load_font
+
+BACKGROUND_TYPES = ("existing", "transparent", "solid") + GENERATED_BACKGROUNDS
+
+
+class RenderPlan(NamedTuple):
+    """A template compiled for rendering: every create_image argument except the text.
+
+    Compiled and validated once per template (or set of GUI settings), so a
+    render only supplies text: fonts are resolved to files, colors parsed to
+    RGBA, the outline and shadow colors derived and text effects parsed in advance.
+    """
+    background_type: str
+    img_dims: Tuple[int, int]
+    bg_color: Tuple[int, int, int, int]
+    background_spec: Optional[BackgroundSpec]
+    font_family: str
+    font_style: str
+    font_path: str
+    text_color: TextStyle
+    fit_to_width: bool
+    text_position: str
+    font_size: int
+    enable_shadow: bool
+    blocks: Tuple[TextBlock, ...] = ()
+    text_effects: Optional[TextEffects] = None
+    dpi: Optional[int] = None
+    image_path: Optional[str] = None
+
+    def params(self, text: str, loaded_image=None) -> Dict[str, Any]:
+        """create_image keyword arguments for text."""
+        params = self._asdict()
+        del params["dpi"], params["image_path"]
+        params["text"] = text
+        params["loaded_image"] = loaded_image
+        return params
+
+
+def _color(value, what: str) -> Tuple[int, int, int, int]:
+    try:
+        return ImageColor.getcolor(value, "RGBA") if isinstance(value, str) else text_style(value).fill
+    except (ValueError, AttributeError, TypeError):
+        raise ValueError(f"Invalid {what}: {value!r}") from None
+
+
+def _check_choice(value, choices, what: str):
+    if value not in choices:
+        raise ValueError(f"Unknown {what} {value!r}; expected one of {', '.join(choices)}")
+
+
+def parse_text_effects(value, what: str = "text effects") -> Optional[TextEffects]:
+    """TextEffects from a template entry (or as given); raises ValueError, also for a missing texture file."""
+    if value is None:
+        return None
+    try:
+        effects = value if isinstance(value, TextEffects) else TextEffects.from_settings(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid {what}: {e}") from None
+    if effects.fill == "texture" and not Path(effects.texture_path).is_file():
+        raise ValueError(f"Texture not found in {what}: {effects.texture_path}")
+    return effects
+
+
+def _check_block(block: TextBlock):
+    if block.font_style is not None:
+        _check_choice(block.font_style, FONT_STYLES, f"font style in block {block.name!r}:")
+    if block.position is not None:
+        _check_choice(block.position, TEXT_POSITIONS, f"text position in block {block.name!r}:")
+    if block.fit is not None:
+        _check_choice(block.fit, FIT_RULES, f"fit rule in block {block.name!r}:")
+    if block.text_color is not None:
+        _color(block.text_color, f"text color in block {block.name!r}")
+    if block.font_size is not None and block.font_size <= 0:
+        raise ValueError(f"Font size must be positive in block {block.name!r}")
+    parse_text_effects(block.text_effects, f"text effects in block {block.name!r}")
+
+
+def compile_plan(renderer, params: Mapping[str, Any], dpi: Optional[int] = None, image_path: Optional[str] = None) -> RenderPlan:
+    """Validates create_image-style settings and resolves them into a RenderPlan; raises ValueError."""
+    background_type = params.get("background_type", "solid")
+    _check_choice(background_type, BACKGROUND_TYPES, "background type")
+    dims = params.get("img_dims")
+    if not (isinstance(dims, (list, tuple)) and len(dims) == 2 and all(int(side) > 0 for side in dims)):
+        raise ValueError(f"Image dimensions must be [width, height], got {dims!r}")
+    font_style = params.get("font_style") or "regular"
+    _check_choice(font_style, FONT_STYLES, "font style")
+    text_position = params.get("text_position") or "center"
+    _check_choice(text_position, TEXT_POSITIONS, "text position")
+    font_size = int(params.get("font_size", 120))
+    if font_size <= 0:
+        raise ValueError("Font size must be positive")
+    blocks = tuple(params.get("blocks") or ())
+    for block in blocks:
+        _check_block(block)
+
+    font_family = params.get("font_family") or "Amiri"
+    font_identifier = renderer.font_identifier(font_family, font_style)
+    if font_identifier is None:
+        raise ValueError(f"Font not found: {font_family}")
+    try:
+        # A name that resolves to a system font file is looked up once, here
+        font_path = load_font(font_identifier, font_size, renderer.layout_engine).path
+    except OSError:
+        font_path = font_identifier  # left to the renderer's fallback chain, as before
+    try:
+        text_color = text_style(params.get("text_color", "white"))
+    except (ValueError, AttributeError, TypeError):
+        raise ValueError(f"Invalid text color: {params.get('text_color')!r}") from None
+    background_spec = params.get("background_spec")
+    if background_spec is None and background_type in GENERATED_BACKGROUNDS:
+        background_spec = BackgroundSpec(background_type, (params.get("bg_color") or "black", "white"))
+
+    return RenderPlan(
+        background_type=background_type,
+        img_dims=(int(dims[0]), int(dims[1])),
+        bg_color=_color(params.get("bg_color", "black"), "background color"),
+        background_spec=background_spec,
+        font_family=font_family,
+        font_style=font_style,
+        font_path=font_path,
+        text_color=text_color,
+        fit_to_width=bool(params.get("fit_to_width", False)),
+        text_position=text_position,
+        font_size=font_size,
+        enable_shadow=bool(params.get("enable_shadow", False)),
+        blocks=blocks,
+        text_effects=parse_text_effects(params.get("text_effects")),
+        dpi=int(dpi) if dpi else None,
+        image_path=image_path or None
+    )
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, List, Mapping, NamedTuple, Optional, Tuple
+
+from PIL.ImageQt import ImageQt
+from PySide6.QtCore import QObject, Signal
+
+from frame_transport import CanvasPool
+from image_renderer import canvas_mode
+from tiled_render import render_region, scaled_params
+
+# Lower runs first: a save or copy overtakes every preview still waiting,
+# and a zoomed-in detail of the preview waits for the preview itself
+ACTION_PRIORITY = {"save": 0, "copy": 0, "draft": 1, "preview": 1, "detail": 2}
+
+# A preview is shown as a draft first while full previews take longer than this
+DRAFT_BUDGET_SECONDS = 0.1
+# Drafts are drawn at a fraction of the preview's size to fit the budget, but no smaller than this
+MIN_DRAFT_SCALE = 0.25
+
+# Enough for a save to start while a preview is still drawing
+RENDER_WORKERS = 2
+
+
+class RenderJob(NamedTuple):
+    """One render, captured on the GUI thread; workers read nothing else.
+
+    params are create_image keyword arguments built from a RenderPlan, so
+    every value is immutable or (like BackgroundImage) safe to share. A job
+    with a region renders only that box of the card (see render_region).
+    then is queued once this job is done: the full preview after its draft.
+    """
+    action: str
+    token: int
+    renderer: Any
+    params: Mapping[str, Any]
+    region: Optional[Tuple[int, int, int, int]] = None
+    then: Optional["RenderJob"] = None
+
+
+class RenderQueue(QObject):
+    """Renders jobs on a small pool of threads, by priority, and reports back through signals.
+
+    A new preview replaces previews and details that have not started yet, and
+    a preview or detail that finishes after a newer one was submitted is
+    dropped; saves and copies are never dropped. Results are delivered on the GUI thread, so workers
+    never touch a widget.
+
+    Previews are drawn into canvases from a CanvasPool and delivered with
+    the pool's QImage holding the same pixels; the receiver hands each one
+    back with release once it is no longer on screen.
+
+    While full previews take longer than DRAFT_BUDGET_SECONDS, a preview is
+    delivered twice: first as a "draft" (see create_image), drawn smaller so it
+    fits the budget, then as the "preview" with a larger token. The full render is only queued once the
+    draft is done, and is dropped like any preview when newer input arrives.
+    """
+
+    finished_image = Signal(object, object, str, int)  # image, QImage, action, token
+    failed = Signal(str, str)  # error, action
+
+    def __init__(self, workers: int = RENDER_WORKERS, parent=None, pooled: bool = True):
+        super().__init__(parent)
+        self.canvases = CanvasPool() if pooled else None
+        self._jobs: List[Tuple[int, int, RenderJob]] = []
+        self._tokens = itertools.count(1)
+        self._latest_preview = 0
+        self._latest_detail = 0
+        self.preview_seconds = 0.0  # duration of the last full preview
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, name=f"render-{index}", daemon=True)
+                         for index in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, action: str, renderer, params: Mapping[str, Any],
+               region: Optional[Tuple[int, int, int, int]] = None) -> int:
+        """Queues a render of a snapshot of params and returns its token (later jobs have larger tokens)."""
+        with self._condition:
+            token = next(self._tokens)
+            if action in ("preview", "detail"):
+                if action == "preview":
+                    self._latest_preview = token
+                self._latest_detail = token
+                superseded = ("draft", "preview", "detail") if action == "preview" else ("detail",)
+                self._jobs = [entry for entry in self._jobs if entry[2].action not in superseded]
+                heapq.heapify(self._jobs)
+            job = RenderJob(action, token, renderer, MappingProxyType(dict(params)), region)
+            if action == "preview" and self.preview_seconds > DRAFT_BUDGET_SECONDS:
+                # Drawing time follows the area, so each side shrinks by the square root of the overrun
+                scale = max(MIN_DRAFT_SCALE, math.sqrt(DRAFT_BUDGET_SECONDS / self.preview_seconds))
+                draft_token, token = token, next(self._tokens)
+                job = RenderJob("draft", draft_token, renderer, MappingProxyType(scaled_params(dict(params, draft=True), scale)),
+                                then=job._replace(token=token))
+            heapq.heappush(self._jobs, (ACTION_PRIORITY[job.action], job.token, job))
+            self._condition.notify()
+        return token
+
+    def _stale(self, job: RenderJob) -> bool:
+        if job.action == "detail":
+            return job.token < self._latest_detail
+        return job.action in ("draft", "preview") and job.token < self._latest_preview
+
+    def release(self, image):
+        """Returns a delivered preview's canvas to the pool; other images are ignored."""
+        if self.canvases is not None:
+            self.canvases.release(image)
+
+    def _canvas(self, job: RenderJob):
+        if job.action not in ("draft", "preview") or self.canvases is None:
+            return None
+        mode = canvas_mode(job.params["background_type"], job.params.get("loaded_image"))
+        return self.canvases.acquire(mode, job.params["img_dims"])
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._jobs and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                _, _, job = heapq.heappop(self._jobs)
+            if self._stale(job):
+                continue
+            self._run(job)
+            if job.then is not None:
+                with self._condition:
+                    if not self._stale(job.then) and not self._closed:
+                        heapq.heappush(self._jobs, (ACTION_PRIORITY[job.then.action], job.then.token, job.then))
+                        self._condition.notify()
+
+    def _run(self, job: RenderJob):
+        canvas = image = None
+        try:
+            started = time.perf_counter()
+            if job.region:
+                image = render_region(job.renderer, job.params, job.region)
+            else:
+                canvas = self._canvas(job)
+                image = job.renderer.create_image(canvas=canvas, **job.params)
+                if job.action == "preview":
+                    self.preview_seconds = time.perf_counter() - started
+            if image is not canvas:
+                self.release(canvas)
+            if self._stale(job):
+                self.release(image)
+                return
+            qimage = self.canvases.qimage(image) if canvas is not None else None
+            if qimage is None and image:
+                # Decoupled thread-safe deep copy using ImageQt
+                qimage = ImageQt(image).copy()
+        except Exception as e:
+            self.release(canvas)
+            self.failed.emit(str(e), job.action)
+            return
+        if self._stale(job):
+            self.release(image)
+        else:
+            self.finished_image.emit(image, qimage, job.action, job.token)
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stops the workers after the renders in progress; jobs still waiting are discarded."""
+        with self._condition:
+            self._closed = True
+            self._jobs.clear()
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
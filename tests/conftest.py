@@ -0,0 +1,58 @@
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _PayloadHandler(BaseHTTPRequestHandler):
+    """Serves server.payload with Range and If-Range support and records each request's headers.
+
+    server.drops lists byte offsets: each response that starts before the
+    first one stops there and closes the connection. With server.drop_every,
+    every response stops after that many bytes.
+    """
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        payload, start = server.payload, 0
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range") in (None, server.etag):
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(payload) - 1}/{len(payload)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(payload) - start))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+
+        end = len(payload)
+        if server.drops and start <= server.drops[0]:
+            end = server.drops.pop(0)
+        if server.drop_every:
+            end = min(end, start + server.drop_every)
+        for offset in range(start, end, 1 << 16):
+            self.wfile.write(payload[offset:min(offset + (1 << 16), end)])
+            time.sleep(server.delay)
+        if end < len(payload):
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def payload_server():
+    """A local stand-in for the release host; set .payload before requesting .url."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PayloadHandler)
+    server.payload, server.etag, server.requests = b"", '"release"', []
+    server.drops, server.drop_every, server.delay = [], 0, 0.0
+    server.url = f"http://127.0.0.1:{server.server_port}/release.zip"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
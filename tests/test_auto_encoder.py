@@ -0,0 +1,50 @@
+import io
+import math
+
+from PIL import Image, ImageDraw
+
+from auto_encoder import encode_auto, estimate_png_size, truecolor_png
+
+SIZE = (600, 400)
+
+
+def _card(mode="RGB"):
+    image = Image.new(mode, SIZE, "navy")
+    draw = ImageDraw.Draw(image)
+    for row in range(0, SIZE[1], 40):
+        draw.text((20, row), "Auto format " * 6, fill="white")
+    return image
+
+
+def _photo():
+    bands = (Image.radial_gradient("L"), Image.linear_gradient("L"), Image.effect_noise((256, 256), 16))
+    return Image.merge("RGB", [band.resize(SIZE) for band in bands])
+
+
+def test_flat_card_is_encoded_losslessly():
+    encoded = encode_auto(_card())
+    assert encoded.label in ("palette PNG", "lossless WebP") and encoded.psnr == math.inf
+    assert len(encoded.data) < encoded.baseline_size
+
+
+def test_photo_is_encoded_lossy_within_min_psnr():
+    encoded = encode_auto(_photo(), min_psnr=30.0)
+    assert encoded.label in ("JPEG", "WebP") and encoded.psnr >= 30.0
+    assert Image.open(io.BytesIO(encoded.data)).size == SIZE
+
+
+def test_falls_back_to_truecolor_png():
+    image = _photo()
+    encoded = encode_auto(image, min_psnr=200.0)
+    assert encoded.label == "PNG" and encoded.bytes_saved == 0
+    assert encoded.data == truecolor_png(image, None)
+
+
+def test_print_output_skips_webp():
+    assert encode_auto(_card("RGBA"), dpi=300).extension == ".png"
+
+
+def test_baseline_estimate_is_close():
+    for image in (_card(), _card("RGBA"), _photo()):
+        actual = len(truecolor_png(image, None))
+        assert abs(estimate_png_size(image, None) - actual) <= 0.15 * actual
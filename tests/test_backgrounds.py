@@ -0,0 +1,97 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from backgrounds import BACKGROUND_MEMORY_BUDGET, MAX_PRESET_SIZE, BackgroundImage
+from image_renderer import ImageRenderer, default_font_paths
+
+FONTS_DIR = str(Path(__file__).resolve().parent.parent / "fonts")
+PORTRAIT = (1080, 1920)
+CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+@pytest.fixture(scope="module")
+def large_photo(tmp_path_factory):
+    """A 50 megapixel JPEG, far larger than any preset needs."""
+    path = tmp_path_factory.mktemp("photos") / "large.jpg"
+    Image.radial_gradient("L").resize((8660, 5774)).convert("RGB").save(path, quality=90)
+    return str(path)
+
+
+def _status_bytes(key: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(key):
+                return int(line.split()[1]) * 1024
+    raise KeyError(key)
+
+
+def _preview_peak_growth(image_path: str):
+    """Loads the photo and renders previews over it; returns the working copy's
+    size and how far peak RSS rose above a warmed-up renderer."""
+    renderer = ImageRenderer(default_font_paths(FONTS_DIR))
+    # Previews are drawn into a long-lived canvas, as the render queue does with its canvas pool
+    canvas = Image.new("RGBA", PORTRAIT)
+
+    def render(text, background_type, image):
+        return renderer.create_image(text, background_type, PORTRAIT, "black", image, "Amiri", "regular",
+                                     "white", False, "center", for_preview=True, canvas=canvas)
+
+    # Warm up the same compositing path with a photo of the card's size, so only the large photo is measured
+    render("Warm up", "existing", Image.new("RGB", PORTRAIT, "gray"))
+    # Writing 5 resets the peak (VmHWM) to the current RSS
+    CLEAR_REFS.write_text("5")
+    baseline = _status_bytes("VmRSS:")
+    background = BackgroundImage.open(image_path)
+    for i in range(3):
+        render(f"Preview {i}", "existing", background)
+    return background.size, _status_bytes("VmHWM:") - baseline
+
+
+def test_working_copy_fits_budget(large_photo):
+    background = BackgroundImage.open(large_photo)
+    width, height = background.size
+    assert width * height * 4 <= BACKGROUND_MEMORY_BUDGET
+    assert background.original_size == (8660, 5774)
+    assert width >= MAX_PRESET_SIZE[0]
+
+
+@pytest.mark.skipif(not CLEAR_REFS.exists(), reason="peak RSS is reset through /proc (Linux only)")
+def test_preview_peak_rss_within_budget(large_photo):
+    # A fresh process, so the peak is not inflated by whatever ran before
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        (width, height), growth = pool.submit(_preview_peak_growth, large_photo).result()
+    assert width * height * 4 <= BACKGROUND_MEMORY_BUDGET
+    assert growth <= BACKGROUND_MEMORY_BUDGET, f"peak RSS grew by {growth / 2 ** 20:.1f} MB"
+
+
+@pytest.fixture(scope="module")
+def pyramid_tiff(tmp_path_factory):
+    """A TIFF whose full page is red, followed by blue and green reduced-resolution pages."""
+    path = tmp_path_factory.mktemp("photos") / "pyramid.tiff"
+    full = Image.new("RGB", (4000, 3000), "red")
+    overviews = [Image.new("RGB", (3000, 2250), "blue"), Image.new("RGB", (800, 600), "lime")]
+    full.save(path, save_all=True, append_images=overviews, tiffinfo={254: 1})
+    return str(path)
+
+
+def test_tiff_decodes_smallest_covering_page(pyramid_tiff):
+    background = BackgroundImage.open(pyramid_tiff)
+    assert background.original_size == (4000, 3000)
+    assert background.covers(MAX_PRESET_SIZE)
+    assert background.image.getpixel((0, 0))[:3] == (0, 0, 255)
+
+
+def test_tiff_draft_uses_reduced_page(pyramid_tiff):
+    draft = BackgroundImage.open_draft(pyramid_tiff)
+    assert draft.is_draft and draft.original_size == (4000, 3000)
+    assert draft.size == (800, 600)
+
+
+def test_draft_needs_reduced_decode(tmp_path):
+    path = tmp_path / "flat.png"
+    Image.new("RGB", (800, 600)).save(path)
+    assert BackgroundImage.open_draft(str(path)) is None
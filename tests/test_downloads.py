@@ -0,0 +1,80 @@
+import hashlib
+import os
+import time
+
+import pytest
+import requests
+
+import downloads
+from downloads import PROGRESS_RATE, DownloadCorrupted, ResumableDownload
+
+
+@pytest.fixture(autouse=True)
+def quick_retries(monkeypatch):
+    monkeypatch.setattr(downloads, "RETRY_DELAY", 0.01)
+
+
+def test_resumes_after_dropped_connection(payload_server, tmp_path):
+    payload_server.payload = os.urandom(4 * 1024 * 1024)
+    drop = len(payload_server.payload) * 6 // 10
+    payload_server.drops = [drop]
+    path = tmp_path / "release.zip"
+
+    download = ResumableDownload(payload_server.url, path, expected_sha256=hashlib.sha256(payload_server.payload).hexdigest())
+    assert download.run() == path
+
+    assert path.read_bytes() == payload_server.payload
+    assert not download.part_path.exists() and not download.meta_path.exists()
+    first, second = payload_server.requests
+    assert "Range" not in first
+    assert second["Range"] == f"bytes={drop}-"
+    assert second["If-Range"] == payload_server.etag
+    assert download.resumed_bytes == drop
+
+
+def test_progress_reports_are_throttled(payload_server, tmp_path):
+    payload_server.payload = os.urandom(8 * 1024 * 1024)
+    payload_server.drops = [len(payload_server.payload) // 2]
+    payload_server.delay = 0.002
+    reports, chunks = [], []
+
+    download = ResumableDownload(payload_server.url, tmp_path / "release.zip", on_progress=reports.append,
+                                 on_data=lambda offset, chunk: chunks.append(len(chunk)))
+    start = time.monotonic()
+    download.run()
+    elapsed = time.monotonic() - start
+
+    # At most PROGRESS_RATE a second, plus the first and last report of each attempt
+    assert len(reports) <= elapsed * PROGRESS_RATE + 2 * len(payload_server.requests)
+    assert sum(chunks) == len(payload_server.payload)
+    assert reports[-1].downloaded == reports[-1].total == len(payload_server.payload)
+
+
+def test_progress_resets_retry_count(payload_server, tmp_path):
+    # Every connection drops after 256 KB, far more often than the retry limit allows in a row
+    payload_server.payload = os.urandom(2 * 1024 * 1024)
+    payload_server.drop_every = 256 * 1024
+    path = tmp_path / "release.zip"
+
+    ResumableDownload(payload_server.url, path, retries=1).run()
+
+    assert path.read_bytes() == payload_server.payload
+    assert len(payload_server.requests) == 8
+
+
+def test_gives_up_without_progress(payload_server, tmp_path):
+    payload_server.payload = os.urandom(1024 * 1024)
+    payload_server.drops = [0, 0, 0]  # three responses in a row that send nothing
+
+    with pytest.raises(requests.RequestException):
+        ResumableDownload(payload_server.url, tmp_path / "release.zip", retries=2).run()
+    assert len(payload_server.requests) == 3
+
+
+def test_checksum_mismatch_discards_partial_file(payload_server, tmp_path):
+    payload_server.payload = os.urandom(256 * 1024)
+    download = ResumableDownload(payload_server.url, tmp_path / "release.zip", expected_sha256="0" * 64)
+
+    with pytest.raises(DownloadCorrupted):
+        download.run()
+    assert not download.part_path.exists() and not download.path.exists()
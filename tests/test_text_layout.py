@@ -0,0 +1,26 @@
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from image_renderer import default_font_paths
+from text_layout import AdvanceTable, font_tables, measure_form
+
+FONT = default_font_paths(str(Path(__file__).resolve().parent.parent / "fonts"))["regular"]
+TEXT = "هذا نص عربي للقياس، with some Latin words: AV Wa To 123 — and a missing glyph \U0001F600"
+
+
+def test_widths_match_textlength():
+    draw = ImageDraw.Draw(Image.new("RGB", (8, 8)))
+    strings = [measure_form(word, "basic") for word in TEXT.split()] + [measure_form(TEXT, "basic"), ""]
+    for size in (11, 24, 57, 300):
+        table = AdvanceTable(FONT, size)
+        expected = [draw.textlength(string, font=table.font) for string in strings]
+        np.testing.assert_array_equal(table.widths(strings), expected)
+
+
+def test_cmap_covers_presentation_forms():
+    tables = font_tables(FONT)
+    forms = np.frombuffer(measure_form(TEXT, "basic").encode("utf-32-le"), dtype=np.uint32)
+    arabic = forms[(forms >= 0xFE70) & (forms <= 0xFEFF)]
+    assert len(arabic) and tables.glyphs[arabic].all()
@@ -0,0 +1,102 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+import downloads
+import update_manager
+from update_package import apply_update
+
+OLD_MTIME = 1_500_000_000
+
+# name: (installed bytes or None, bytes in the release)
+RELEASE_FILES = {
+    "ImageType.exe": (b"old executable", b"new executable" * 1000),
+    "lib/renderer.py": (b"def render(text):\n    return text\n" * 500,) * 2,
+    "fonts/Amiri.ttf": (os.urandom(64 * 1024),) * 2,
+    "languages/ar.json": (b'{"hello": "old"}', b'{"hello": "new"}'),
+    "themes/dark.qss": (None, b"QWidget { color: white; }"),
+}
+
+
+@pytest.fixture(autouse=True)
+def quick_retries(monkeypatch):
+    monkeypatch.setattr(downloads, "RETRY_DELAY", 0.01)
+
+
+@pytest.fixture
+def installed(tmp_path):
+    install_dir = tmp_path / "install"
+    for name, (data, _) in RELEASE_FILES.items():
+        if data is not None:
+            path = install_dir / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            os.utime(path, (OLD_MTIME, OLD_MTIME))
+    return install_dir
+
+
+@pytest.fixture
+def release_zip():
+    """A release zipped as one ImageType/ folder, as published."""
+    package = io.BytesIO()
+    with zipfile.ZipFile(package, "w", zipfile.ZIP_DEFLATED) as release:
+        for name, (_, data) in RELEASE_FILES.items():
+            release.writestr(f"ImageType/{name}", data)
+    return package.getvalue()
+
+
+def _snapshot(install_dir):
+    return {path.relative_to(install_dir).as_posix(): (path.read_bytes(), path.stat().st_mtime_ns)
+            for path in install_dir.rglob("*") if path.is_file()}
+
+
+def _download(url, sha256, monkeypatch, tmp_path, install_dir):
+    """Runs the update Downloader in this thread; returns what it emitted."""
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir(exist_ok=True)
+    monkeypatch.setattr(update_manager.tempfile, "gettempdir", lambda: str(temp_dir))
+    monkeypatch.setattr(update_manager, "get_install_dir", lambda: install_dir)
+    emitted = {}
+    downloader = update_manager.Downloader(url, sha256)
+    downloader.staged.connect(lambda staged: emitted.setdefault("staged", staged))
+    downloader.finished.connect(lambda path: emitted.setdefault("finished", path))
+    downloader.error.connect(lambda error: emitted.setdefault("error", error))
+    downloader.run()
+    return emitted
+
+
+def test_digest_mismatch_leaves_install_untouched(payload_server, release_zip, installed, monkeypatch, tmp_path):
+    payload_server.payload = release_zip
+    before = _snapshot(installed)
+
+    emitted = _download(payload_server.url, "0" * 64, monkeypatch, tmp_path, installed)
+
+    assert "SHA-256" in emitted["error"]
+    assert "staged" not in emitted
+    assert _snapshot(installed) == before
+    assert not (tmp_path / "temp" / "release.zip").exists()
+
+
+def test_only_changed_files_are_replaced(payload_server, release_zip, installed, monkeypatch, tmp_path):
+    payload_server.payload = release_zip
+    # Drop the connection partway, so extraction also has to follow a resumed download
+    payload_server.drops = [len(release_zip) // 2]
+    before = _snapshot(installed)
+
+    emitted = _download(payload_server.url, hashlib.sha256(release_zip).hexdigest(), monkeypatch, tmp_path, installed)
+    staged = emitted["staged"]
+    assert sorted(staged.changed) == ["ImageType.exe", "languages/ar.json", "themes/dark.qss"]
+    assert staged.unchanged == 2
+
+    apply_update(staged, installed)
+
+    after = _snapshot(installed)
+    assert {name: data for name, (data, _) in after.items()} == {name: data for name, (_, data) in RELEASE_FILES.items()}
+    for name in ("lib/renderer.py", "fonts/Amiri.ttf"):
+        assert after[name][1] == before[name][1]
+    for name in staged.changed:
+        assert os.path.getmtime(installed / name) > OLD_MTIME
+    assert not staged.staging_dir.exists()
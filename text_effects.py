@@ -0,0 +1,307 @@
+import math
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFilter
+
+from backgrounds import BackgroundSpec, render_background
+from text_layout import LayoutCache
+
+FILL_KINDS = ("solid", "gradient", "texture")
+
+# The outline plain text has always been drawn with (stroke_width=2)
+DEFAULT_OUTLINE_WIDTH = 2
+# How far the drop shadow of enable_shadow falls, right and down
+SHADOW_OFFSET = 2
+# A glow is the blurred outline scaled by this, so it stays opaque close to the glyphs
+GLOW_GAIN = 2.0
+# A Gaussian blur is treated as reaching this many radii
+BLUR_REACH = 3
+DEFAULT_INNER_SHADOW_COLOR = (0, 0, 0, 160)
+
+
+class TextEffects(NamedTuple):
+    """Hashable description of how text is styled beyond its color; part of the effect cache key.
+
+    Sizes are in pixels of the card. Colors left as None follow the text
+    color: the outline takes the outline color text_style derives and a glow
+    the text color itself. The defaults draw text as it has always been drawn,
+    with a 2 px outline and a solid fill.
+    """
+    outline_width: int = DEFAULT_OUTLINE_WIDTH
+    outline_color: Optional[str] = None
+    glow_radius: int = 0
+    glow_color: Optional[str] = None
+    fill: str = "solid"
+    fill_colors: Tuple[str, ...] = ()
+    fill_angle: float = 90.0
+    texture_path: Optional[str] = None
+    inner_shadow: int = 0  # offset and blur radius of the shadow cast inside the glyphs
+    inner_shadow_color: Optional[str] = None
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> "TextEffects":
+        """Builds effects from a template "text_effects" entry; raises ValueError for a bad fill or size."""
+        if not isinstance(settings, dict):
+            raise ValueError(f"Text effects must be an object, got {settings!r}")
+        fill = settings.get("fill") or "solid"
+        if fill not in FILL_KINDS:
+            raise ValueError(f"Unknown text fill {fill!r}; expected one of {', '.join(FILL_KINDS)}")
+        fill_colors = tuple(settings.get("fill_colors") or ())
+        if fill == "gradient" and len(fill_colors) < 2:
+            raise ValueError("A gradient text fill needs at least two fill_colors")
+        if fill == "texture" and not settings.get("texture_path"):
+            raise ValueError("A texture text fill needs a texture_path")
+        effects = cls(int(settings.get("outline_width", DEFAULT_OUTLINE_WIDTH)), settings.get("outline_color"),
+                      int(settings.get("glow_radius", 0)), settings.get("glow_color"), fill, fill_colors,
+                      float(settings.get("fill_angle", 90.0)), settings.get("texture_path") or None,
+                      int(settings.get("inner_shadow", 0)), settings.get("inner_shadow_color"))
+        if min(effects.outline_width, effects.glow_radius, effects.inner_shadow) < 0:
+            raise ValueError("Text effect sizes must not be negative")
+        for color in (effects.outline_color, effects.glow_color, effects.inner_shadow_color, *fill_colors):
+            if color is not None:
+                _rgba(color)
+        return effects
+
+    def to_settings(self) -> Dict[str, Any]:
+        """Template entry for these effects; fields left at their defaults are left out."""
+        defaults = TextEffects()
+        settings = {key: value for key, value in self._asdict().items() if value != getattr(defaults, key)}
+        if "fill_colors" in settings:
+            settings["fill_colors"] = list(self.fill_colors)
+        return settings
+
+    @property
+    def plain(self) -> bool:
+        """Whether these effects draw text the way Pillow's outlined text does, without the effects stage."""
+        return (self.fill == "solid" and not self.glow_radius and not self.inner_shadow
+                and self.outline_width == DEFAULT_OUTLINE_WIDTH and self.outline_color is None)
+
+    def for_draft(self) -> Optional["TextEffects"]:
+        """The part of the effects a draft keeps: the fill, without outline, glow or inner shadow.
+
+        None when that is a solid fill, which a draft draws without the effects stage.
+        """
+        if self.fill == "solid":
+            return None
+        return TextEffects(0, fill=self.fill, fill_colors=self.fill_colors, fill_angle=self.fill_angle,
+                           texture_path=self.texture_path)
+
+    def scaled(self, factor: float) -> "TextEffects":
+        """The same effects for a card scaled by factor; sizes in use stay at least one pixel.
+
+        Plain effects are kept as they are, like the outline of plain text.
+        """
+        if factor == 1 or self.plain:
+            return self
+
+        def size(value: int) -> int:
+            return max(1, round(value * factor)) if value else 0
+        return self._replace(outline_width=size(self.outline_width), glow_radius=size(self.glow_radius),
+                             inner_shadow=size(self.inner_shadow))
+
+    def reach(self, shadow: bool = False) -> int:
+        """How far past the glyphs the effects can draw, in pixels."""
+        reach = self.outline_width + BLUR_REACH * self.glow_radius
+        if shadow:
+            reach = max(reach, SHADOW_OFFSET)
+        return reach + 1
+
+
+class EffectLayer(NamedTuple):
+    """Text drawn with its effects, cropped to what they cover; image is None when nothing was drawn."""
+    offset: Tuple[int, int]
+    image: Optional[Image.Image]
+
+
+class EffectCache(LayoutCache):
+    """LRU of effect layers keyed by the text operations that draw the mask and the effects applied to it.
+
+    The operations (text, font, position) determine the coverage mask, so a
+    card whose text did not move is composited from its cached layer without
+    drawing the mask or running the effects again.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        super().__init__(maxsize)
+
+
+@lru_cache(maxsize=256)
+def _rgba(color) -> Tuple[int, int, int, int]:
+    try:
+        rgba = ImageColor.getcolor(color, "RGBA") if isinstance(color, str) else tuple(color)
+    except (ValueError, AttributeError, TypeError):
+        raise ValueError(f"Invalid text effect color: {color!r}") from None
+    return rgba + (255,) * (4 - len(rgba))
+
+
+@lru_cache(maxsize=8)
+def load_texture(path: str) -> np.ndarray:
+    """RGB pixels of a fill texture, read once per path."""
+    with Image.open(path) as texture:
+        return np.asarray(texture.convert("RGB"))
+
+
+def op_key(op) -> tuple:
+    """What a recorded text operation contributes to the mask: text, font and position."""
+    font = op.options["font"]
+    return op.xy, op.text, font.path, font.size, font.layout_engine, op.options.get("anchor")
+
+
+def text_mask(ops: Sequence, padding: int) -> Tuple[Tuple[int, int], np.ndarray]:
+    """Coverage (0-255) of recorded text operations drawn without outline, and where it sits on the card.
+
+    The mask covers the ink and the anchor points plus padding on every
+    side, so glyphs land on the same pixels as when drawn on the card.
+    """
+    left = top = math.inf
+    right = bottom = -math.inf
+    for op in ops:
+        font = op.options["font"]
+        x0, y0, x1, y1 = font.getbbox(op.text, anchor=op.options.get("anchor") or "la")
+        x, y = op.xy
+        left, top = min(left, x + x0, x), min(top, y + y0, y)
+        right, bottom = max(right, x + x1), max(bottom, y + y1)
+    left, top = math.floor(left) - padding, math.floor(top) - padding
+    size = (math.ceil(right) + padding - left, math.ceil(bottom) + padding - top)
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    for op in ops:
+        options = dict(op.options, fill=255, stroke_width=0)
+        draw.text((op.xy[0] - left, op.xy[1] - top), op.text, **options)
+    return (left, top), np.asarray(mask)
+
+
+def _window_max(array: np.ndarray, width: int, axis: int) -> np.ndarray:
+    """Maximum of each run of width values along axis; the axis gets width - 1 shorter.
+
+    Runs double in length each pass, so a window costs log2(width) array maxima.
+    """
+    def cut(values, start, length):
+        return values[start:start + length] if axis == 0 else values[:, start:start + length]
+
+    span = 1
+    while span < width:
+        step = min(span, width - span)
+        length = array.shape[axis] - step
+        array = np.maximum(cut(array, 0, length), cut(array, step, length))
+        span += step
+    return array
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Grows coverage by a disk of radius, keeping antialiased edges (a grayscale dilation).
+
+    Each row of the disk is a horizontal window maximum, computed once per
+    width; the rows are then combined by shifting them vertically.
+    """
+    height, width = mask.shape
+    padded = np.pad(mask, radius)
+    rows = {}
+    result = None
+    for dy in range(-radius, radius + 1):
+        half = int(math.sqrt((radius + 0.5) ** 2 - dy * dy))
+        row = rows.get(half)
+        if row is None:
+            row = rows[half] = _window_max(padded[:, radius - half:padded.shape[1] - radius + half], 2 * half + 1, 1)
+        shifted = row[radius + dy:radius + dy + height]
+        result = shifted.copy() if result is None else np.maximum(result, shifted, out=result)
+    return result
+
+
+def _shift(values: np.ndarray, dx: int, dy: int, fill=0) -> np.ndarray:
+    """values moved right by dx and down by dy, filling the uncovered edge."""
+    shifted = np.full_like(values, fill)
+    height, width = values.shape
+    shifted[max(0, dy):height + min(0, dy), max(0, dx):width + min(0, dx)] = \
+        values[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    return shifted
+
+
+def _scaled(alpha: Image.Image, gain: float, limit: int = 255) -> Image.Image:
+    """alpha times gain, capped at limit, through a lookup table."""
+    if gain == 1 and limit == 255:
+        return alpha
+    return alpha.point([min(limit, round(value * gain)) for value in range(256)])
+
+
+def _fill_layer(effects: TextEffects, mask: np.ndarray, color) -> Image.Image:
+    """The text fill as an RGB image of the mask's size: the text color, a gradient or a texture."""
+    size = mask.shape[::-1]
+    ink = Image.fromarray(mask).getbbox()
+    if effects.fill == "solid" or ink is None:
+        return Image.new("RGB", size, color[:3])
+    x0, y0, x1, y1 = ink
+    if effects.fill == "gradient":
+        # Spread over the ink, so the first and last colors reach the edges of the text
+        spec = BackgroundSpec("linear_gradient", tuple(effects.fill_colors), angle=effects.fill_angle)
+        pattern = render_background(spec, (x1 - x0, y1 - y0))
+    else:
+        texture = load_texture(effects.texture_path)
+        repeats = (-(-(y1 - y0) // texture.shape[0]), -(-(x1 - x0) // texture.shape[1]), 1)
+        pattern = Image.fromarray(np.tile(texture, repeats)[:y1 - y0, :x1 - x0])
+    fill = Image.new("RGB", size)
+    fill.paste(pattern, (x0, y0))
+    return fill
+
+
+def render_effects(mask: np.ndarray, effects: TextEffects, style, shadow: bool = False) -> Image.Image:
+    """The text of a coverage mask with its effects, as an RGBA image of the mask's size.
+
+    style is the TextStyle of the text color. Each effect is an alpha mask
+    derived from the coverage in whole-array operations (dilation, shifts,
+    Gaussian blurs, lookup tables); the layers are then stacked bottom to
+    top with alpha_composite: glow, drop shadow, outline, fill, inner shadow.
+    """
+    coverage = Image.fromarray(mask)
+    outlined = Image.fromarray(dilate(mask, effects.outline_width)) if effects.outline_width else coverage
+    layers = []
+    if effects.glow_radius:
+        color = _rgba(effects.glow_color or style.fill)
+        glow = outlined.filter(ImageFilter.GaussianBlur(effects.glow_radius))
+        layers.append((color, _scaled(glow, GLOW_GAIN * color[3] / 255, color[3])))
+    if shadow:
+        offset = Image.fromarray(_shift(mask, SHADOW_OFFSET, SHADOW_OFFSET))
+        layers.append((style.shadow, _scaled(offset, style.shadow[3] / 255)))
+    if effects.outline_width:
+        color = _rgba(effects.outline_color or style.stroke)
+        layers.append((color, _scaled(outlined, color[3] / 255)))
+    layers.append((_fill_layer(effects, mask, style.fill), _scaled(coverage, style.fill[3] / 255)))
+    if effects.inner_shadow:
+        color = _rgba(effects.inner_shadow_color or DEFAULT_INNER_SHADOW_COLOR)
+        # Light blocked by the glyph edge up and left of each pixel, seen only inside the glyphs
+        outside = Image.fromarray(_shift(255 - mask, effects.inner_shadow, effects.inner_shadow, 255))
+        inner = ImageChops.multiply(outside.filter(ImageFilter.GaussianBlur(effects.inner_shadow)), coverage)
+        layers.append((color, _scaled(inner, color[3] / 255)))
+
+    result = None
+    for color, alpha in layers:
+        layer = color.convert("RGBA") if isinstance(color, Image.Image) else Image.new("RGBA", alpha.size, color[:3])
+        layer.putalpha(alpha)
+        result = layer if result is None else Image.alpha_composite(result, layer)
+    return result
+
+
+def effect_layer(ops: Sequence, effects: TextEffects, style, shadow: bool = False) -> EffectLayer:
+    """Draws recorded text operations with effects, cropped to the pixels they cover."""
+    if not ops:
+        return EffectLayer((0, 0), None)
+    offset, mask = text_mask(ops, effects.reach(shadow))
+    image = render_effects(mask, effects, style, shadow)
+    bbox = image.getbbox()
+    if bbox is None:
+        return EffectLayer(offset, None)
+    return EffectLayer((offset[0] + bbox[0], offset[1] + bbox[1]), image.crop(bbox))
+
+
+def composite_layer(image: Image.Image, layer: Image.Image, offset: Tuple[int, int]):
+    """Lays an RGBA layer over image at offset, which may be partly outside the image."""
+    left, top = offset
+    if left < 0 or top < 0:
+        layer = layer.crop((max(0, -left), max(0, -top), layer.size[0], layer.size[1]))
+        left, top = max(0, left), max(0, top)
+    if image.mode == "RGBA":
+        image.alpha_composite(layer, (left, top))
+    else:
+        image.paste(layer, (left, top), layer)
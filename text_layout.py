@@ -0,0 +1,469 @@
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import ImageFont, features
+import arabic_reshaper
+from bidi.algorithm import get_display
+
+# "raqm" shapes with HarfBuzz/FriBiDi inside Pillow; "basic" is Pillow's own
+# layout fed with text reshaped and reordered in Python.
+LAYOUT_ENGINES = ("auto", "raqm", "basic")
+
+
+@lru_cache(maxsize=None)
+def raqm_available() -> bool:
+    return bool(features.check_feature("raqm"))
+
+
+def resolve_layout_engine(engine: str = "auto") -> str:
+    """Picks the engine to use: RAQM when requested (or auto) and available, else basic."""
+    if engine in ("auto", "raqm") and raqm_available():
+        return "raqm"
+    return "basic"
+
+
+@lru_cache(maxsize=128)
+def load_font(font_identifier: str, size: int, engine: str = "basic") -> ImageFont.FreeTypeFont:
+    """Loads (and caches) a font for the given engine; fit solving reloads the same sizes often."""
+    layout = ImageFont.Layout.RAQM if engine == "raqm" else ImageFont.Layout.BASIC
+    return ImageFont.truetype(font_identifier, size, layout_engine=layout)
+
+
+def measure_form(text: str, engine: str) -> str:
+    """Text as it should be measured. Width does not depend on visual order,
+    so the basic engine only needs contextual reshaping, not bidi reordering."""
+    return text if engine == "raqm" else arabic_reshaper.reshape(text)
+
+
+def display_form(text: str, engine: str) -> str:
+    """Text as it should be handed to Pillow for drawing. RAQM takes logical text."""
+    return text if engine == "raqm" else get_display(arabic_reshaper.reshape(text))
+
+
+# Glyphs a font draws for characters it does not have (.notdef); a character
+# whose mask matches one of these is treated as missing. Masks are compared by
+# size and histogram, since digits like "0" can share the .notdef bounding box.
+NOTDEF_PROBES = ("\uFFFF", "\uFFFD", "\u0000")
+COVERAGE_PROBE_SIZE = 20
+
+
+class FontCoverage:
+    """Per-font record of which characters have a real glyph, filled lazily."""
+
+    def __init__(self, font_identifier: str):
+        self.font_identifier = font_identifier
+        self._covered: Dict[str, bool] = {}
+        try:
+            self._font = load_font(font_identifier, COVERAGE_PROBE_SIZE)
+            self._notdef = {self._signature(probe) for probe in NOTDEF_PROBES}
+        except Exception:
+            self._font = None
+
+    def _signature(self, char: str):
+        mask = self._font.getmask(char)
+        return mask.size, tuple(mask.histogram())
+
+    @property
+    def loaded(self) -> bool:
+        return self._font is not None
+
+    def covers(self, text: str) -> bool:
+        if self._font is None:
+            return False
+        for char in text:
+            covered = self._covered.get(char)
+            if covered is None:
+                signature = self._signature(char)
+                has_ink = any(signature[1][1:])  # some fonts draw .notdef as nothing at all
+                covered = self._covered[char] = has_ink and signature not in self._notdef
+            if not covered:
+                return False
+        return True
+
+
+@lru_cache(maxsize=64)
+def font_coverage(font_identifier: str) -> FontCoverage:
+    return FontCoverage(font_identifier)
+
+
+def _attaches_to_neighbour(char: str) -> bool:
+    # Spaces, controls and combining marks take the font of the run they sit in
+    return char.isspace() or unicodedata.category(char)[0] in "CMZ"
+
+
+class Run(NamedTuple):
+    text: str
+    font_identifier: str
+
+
+class FontChain:
+    """Ordered fonts tried for each character; a run is a stretch of text drawn with one font."""
+
+    def __init__(self, font_identifiers: Iterable[str], engine: str = "basic"):
+        # Keep the first occurrence of each loadable font, in order
+        identifiers = tuple(dict.fromkeys(f for f in font_identifiers if f))
+        self.font_identifiers = tuple(f for f in identifiers if font_coverage(f).loaded) or identifiers
+        self.engine = engine
+        self._fonts_for: Dict[str, str] = {}
+
+    def font_for(self, char: str) -> str:
+        """First font in the chain with a glyph for char (as the engine will draw it)."""
+        identifier = self._fonts_for.get(char)
+        if identifier is None:
+            # The basic engine draws presentation forms, so those must be covered too
+            form = measure_form(char, self.engine)
+            identifier = next((f for f in self.font_identifiers if font_coverage(f).covers(form)),
+                              self.font_identifiers[-1])
+            self._fonts_for[char] = identifier
+        return identifier
+
+    def runs(self, text: str) -> List[Run]:
+        runs: List[List[str]] = []
+        pending = ""
+        for char in text:
+            if _attaches_to_neighbour(char):
+                if runs:
+                    runs[-1][0] += char
+                else:
+                    pending += char
+                continue
+            identifier = self.font_for(char)
+            if runs and runs[-1][1] == identifier:
+                runs[-1][0] += char
+            else:
+                runs.append([pending + char, identifier])
+                pending = ""
+        if pending or not runs:
+            runs.append([pending, self.font_identifiers[0]])
+        return [Run(run_text, identifier) for run_text, identifier in runs]
+
+    def single_font(self, text: str) -> Optional[str]:
+        """The one font that covers all of text, or None if it needs several."""
+        identifiers = {run.font_identifier for run in self.runs(text)}
+        return identifiers.pop() if len(identifiers) == 1 else None
+
+
+def strong_direction(text: str) -> Optional[str]:
+    for char in text:
+        bidi_class = unicodedata.bidirectional(char)
+        if bidi_class == "L":
+            return "ltr"
+        if bidi_class in ("R", "AL"):
+            return "rtl"
+    return None
+
+
+def _split_edge_spaces(run: Run) -> List[Run]:
+    # Spaces at a run's edges sit between runs and follow the line direction, not the run's
+    core = run.text.strip()
+    if not core or core == run.text:
+        return [run]
+    start = run.text.index(core)
+    pieces = (run.text[:start], core, run.text[start + len(core):])
+    return [Run(piece, run.font_identifier) for piece in pieces if piece]
+
+
+def visual_runs(runs: List[Run]) -> List[Run]:
+    """Orders a line's runs left to right.
+
+    Reordering is done at run level: within a run, the engine (or bidi in
+    display_form) handles direction. Runs against the line's base direction
+    keep their relative order; the rest of the line is reversed for RTL.
+    """
+    base = strong_direction("".join(run.text for run in runs)) or "ltr"
+    pieces = [piece for run in runs for piece in _split_edge_spaces(run)]
+    strong = [strong_direction(piece.text) for piece in pieces]
+
+    # Neutral pieces between two runs of the same direction take that direction, otherwise the base
+    directions = []
+    for index, direction in enumerate(strong):
+        if direction is None:
+            before = next((d for d in reversed(strong[:index]) if d), base)
+            after = next((d for d in strong[index + 1:] if d), base)
+            direction = before if before == after else base
+        directions.append(direction)
+
+    groups: List[List[Run]] = []
+    for index, piece in enumerate(pieces):
+        if groups and directions[index] != base and directions[index - 1] != base:
+            groups[-1].append(piece)
+        else:
+            groups.append([piece])
+    if base == "rtl":
+        groups.reverse()
+    return [run for group in groups for run in group]
+
+
+def runs_length(runs: List[Run], size: int, engine: str) -> float:
+    return sum(load_font(run.font_identifier, size, engine).getlength(measure_form(run.text, engine)) for run in runs)
+
+
+# Scaled word widths read at this size estimate the widths at any other size
+REFERENCE_SIZE = 2048
+
+# Unicode cmap subtables in the order FreeType prefers them: full repertoire first, then the BMP
+UNICODE_CMAPS = ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0))
+
+
+class FontTables(NamedTuple):
+    # Glyph id of each code point below len(glyphs); None when the font has no readable Unicode cmap
+    glyphs: Optional[np.ndarray]
+    glyph_count: int
+    # Sorted (left << 16 | right) glyph pairs of the kern table, the only kerning the basic engine applies
+    kerned: np.ndarray
+
+
+NO_FONT_TABLES = FontTables(None, 0, np.zeros(0, dtype=np.int64))
+
+
+def _sfnt_tables(data: bytes, index: int) -> Dict[bytes, bytes]:
+    offset = struct.unpack_from(">I", data, 12 + 4 * index)[0] if data[:4] == b"ttcf" else 0
+    tables = {}
+    for entry in range(struct.unpack_from(">H", data, offset + 4)[0]):
+        tag, _, start, length = struct.unpack_from(">4sIII", data, offset + 12 + 16 * entry)
+        tables[tag] = data[start:start + length]
+    return tables
+
+
+def _cmap_format_4(cmap: bytes, offset: int) -> np.ndarray:
+    segments = struct.unpack_from(">H", cmap, offset + 6)[0] // 2
+    length = min(struct.unpack_from(">H", cmap, offset + 2)[0], len(cmap) - offset)
+    # endCode, a pad word, startCode, idDelta and idRangeOffset, then glyphIdArray
+    words = np.frombuffer(cmap, dtype=">u2", count=(length - 14) // 2, offset=offset + 14).astype(np.int64)
+    ends, starts = words[:segments], words[segments + 1:2 * segments + 1]
+    deltas, range_offsets = words[2 * segments + 1:3 * segments + 1], words[3 * segments + 1:4 * segments + 1]
+    glyphs = np.zeros(int(ends.max()) + 1 if segments else 0, dtype=np.int64)
+    for segment in np.flatnonzero(starts <= ends):
+        codes = np.arange(starts[segment], ends[segment] + 1)
+        if range_offsets[segment] == 0:
+            glyphs[codes] = (codes + deltas[segment]) & 0xFFFF
+            continue
+        # idRangeOffset counts bytes from its own entry into glyphIdArray
+        positions = 3 * segments + 1 + segment + range_offsets[segment] // 2 + codes - starts[segment]
+        ids = np.zeros(len(codes), dtype=np.int64)
+        valid = positions < len(words)
+        ids[valid] = words[positions[valid]]
+        glyphs[codes] = np.where(ids != 0, (ids + deltas[segment]) & 0xFFFF, 0)
+    return glyphs
+
+
+def _cmap_format_12(cmap: bytes, offset: int) -> np.ndarray:
+    count = struct.unpack_from(">I", cmap, offset + 12)[0]
+    groups = np.frombuffer(cmap, dtype=">u4", count=3 * count, offset=offset + 16).reshape(-1, 3).astype(np.int64)
+    groups = groups[(groups[:, 0] <= groups[:, 1]) & (groups[:, 1] <= 0x10FFFF)]
+    glyphs = np.zeros(int(groups[:, 1].max()) + 1 if len(groups) else 0, dtype=np.int64)
+    for start, end, first in groups.tolist():
+        glyphs[start:end + 1] = np.arange(first, first + end - start + 1)
+    return glyphs
+
+
+def _read_cmap(cmap: bytes) -> Optional[np.ndarray]:
+    subtables = {}
+    for entry in range(struct.unpack_from(">H", cmap, 2)[0]):
+        platform, encoding, offset = struct.unpack_from(">HHI", cmap, 4 + 8 * entry)
+        subtable_format = struct.unpack_from(">H", cmap, offset)[0]
+        if subtable_format in (4, 12):
+            subtables.setdefault((platform, encoding), (subtable_format, offset))
+    for key in UNICODE_CMAPS:
+        if key in subtables:
+            subtable_format, offset = subtables[key]
+            return (_cmap_format_4 if subtable_format == 4 else _cmap_format_12)(cmap, offset)
+    return None
+
+
+def _kerned_pairs(kern: bytes) -> np.ndarray:
+    pairs = []
+    if len(kern) >= 4 and struct.unpack_from(">H", kern)[0] == 0:
+        offset = 4
+        for _ in range(struct.unpack_from(">H", kern, 2)[0]):
+            _, length, coverage = struct.unpack_from(">HHH", kern, offset)
+            # FreeType applies horizontal format 0 subtables only
+            if coverage & ~8 == 1:
+                count = min(struct.unpack_from(">H", kern, offset + 6)[0], (len(kern) - offset - 14) // 6)
+                table = np.frombuffer(kern, dtype=">u2", count=3 * count, offset=offset + 14).reshape(-1, 3)
+                pairs.append(table[:, 0].astype(np.int64) << 16 | table[:, 1])
+            offset += length
+    return np.unique(np.concatenate(pairs)) if pairs else np.zeros(0, dtype=np.int64)
+
+
+@lru_cache(maxsize=64)
+def font_tables(path: str, index: int = 0) -> FontTables:
+    """The Unicode cmap and kerned pairs of a TrueType/OpenType font, read from the file once."""
+    try:
+        with open(path, "rb") as f:
+            tables = _sfnt_tables(f.read(), index)
+        glyph_count = struct.unpack_from(">H", tables[b"maxp"], 4)[0]
+        glyphs = _read_cmap(tables[b"cmap"])
+        kerned = _kerned_pairs(tables.get(b"kern", b""))
+    except (OSError, KeyError, ValueError, IndexError, struct.error):
+        glyphs = None
+    if glyphs is None:
+        # Without glyph ids the kern table cannot be matched to text; Pillow's other formats do not kern
+        return NO_FONT_TABLES
+    glyphs[glyphs >= glyph_count] = 0
+    return FontTables(glyphs.astype(np.uint16), glyph_count, kerned)
+
+
+class AdvanceTable:
+    """Hinted advances and pair kerning of one font at one size, for the basic layout engine.
+
+    Pillow's basic layout places each glyph at its advance plus the kerning
+    of the pair it ends, so the width of a string in measure form is a sum of
+    per-glyph and per-pair values: the same number textlength returns,
+    without laying the string out. Advances are a dense array over the
+    font's glyph ids, reached through its cmap, and kerning a sparse array
+    over the kern table's pairs; each entry is read from FreeType the first
+    time its glyph or pair occurs, and every sum is NumPy indexing.
+    """
+
+    def __init__(self, font_identifier: str, size: int):
+        self.size = size
+        self.font = load_font(font_identifier, size, "basic")
+        tables = font_tables(self.font.path, self.font.index) if isinstance(self.font.path, str) else NO_FONT_TABLES
+        self._glyphs = tables.glyphs
+        self._kerned = tables.kerned
+        # Fonts without a readable cmap have an entry per code point instead, grown as codes occur
+        self._advances = np.full(tables.glyph_count, np.nan)
+        self._kerning = np.full(len(self._kerned), np.nan)
+        self._lock = threading.Lock()
+
+    def widths(self, strings: Sequence[str]) -> np.ndarray:
+        """Width of each string, as textlength would measure it with this font."""
+        lengths = np.fromiter(map(len, strings), dtype=np.int64, count=len(strings))
+        codes = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        if self._glyphs is None:
+            ids = codes
+        else:
+            ids = np.zeros(len(codes), dtype=np.int64)
+            mapped = codes < len(self._glyphs)
+            ids[mapped] = self._glyphs[codes[mapped]]
+        glyphs = self._lookup("_advances", ids, codes, lambda code: self.font.getlength(chr(code)))
+
+        # Pairs inside a string that the kern table lists add their kerning to the first glyph
+        if len(self._kerned) and len(codes) > 1:
+            inside = np.ones(len(codes) - 1, dtype=bool)
+            inside[ends[(lengths > 0) & (ends < len(codes))] - 1] = False
+            firsts = np.flatnonzero(inside)
+            pairs = ids[firsts] << 16 | ids[firsts + 1]
+            slots = np.minimum(np.searchsorted(self._kerned, pairs), len(self._kerned) - 1)
+            kerned = self._kerned[slots] == pairs
+            if kerned.any():
+                firsts = firsts[kerned]
+                samples = codes[firsts] << 21 | codes[firsts + 1]
+                glyphs[firsts] += self._lookup("_kerning", slots[kerned], samples, self._pair_kerning)
+
+        total = np.concatenate(([0.0], np.cumsum(glyphs)))
+        return total[ends] - total[starts]
+
+    def _pair_kerning(self, pair: int) -> float:
+        first, second = chr(pair >> 21), chr(pair & 0x1FFFFF)
+        return self.font.getlength(first + second) - self.font.getlength(first) - self.font.getlength(second)
+
+    def _lookup(self, name: str, slots: np.ndarray, samples: np.ndarray, measure: Callable[[int], float]) -> np.ndarray:
+        """Entries at slots of the named array; an entry not read yet is measured on the sample it occurs with."""
+        values = getattr(self, name)
+        if len(slots) and slots.max() < len(values):
+            found = values[slots]
+            if not np.isnan(found).any():
+                return found
+        with self._lock:
+            values = getattr(self, name)
+            if len(slots) and slots.max() >= len(values):
+                values = np.concatenate((values, np.full(slots.max() + 1 - len(values), np.nan)))
+                setattr(self, name, values)
+            missing = np.isnan(values[slots])
+            new, first = np.unique(slots[missing], return_index=True)
+            values[new] = [measure(sample) for sample in samples[missing][first].tolist()]
+            return values[slots]
+
+
+@lru_cache(maxsize=64)
+def advance_table(font_identifier: str, size: int) -> AdvanceTable:
+    return AdvanceTable(font_identifier, size)
+
+
+def word_widths(table: AdvanceTable, words: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Widths of logical words and of the join (a space plus kerning) after each, in measure form."""
+    forms = [measure_form(word, "basic") for word in words]
+    lasts, firsts = [form[-1:] for form in forms[:-1]], [form[:1] for form in forms[1:]]
+    joins = [last + " " + first for last, first in zip(lasts, firsts)]
+    measured = table.widths(forms + joins + lasts + firsts)
+    count, join_count = len(forms), len(joins)
+    widths = measured[:count]
+    join_widths = measured[count:count + join_count] - measured[count + join_count:count + 2 * join_count] \
+        - measured[count + 2 * join_count:]
+    return widths, join_widths
+
+
+@lru_cache(maxsize=4096)
+def reference_widths(font_identifier: str, paragraph: str) -> Tuple[np.ndarray, np.ndarray]:
+    """word_widths of a paragraph at REFERENCE_SIZE; scaled by size / REFERENCE_SIZE they estimate any size."""
+    return word_widths(advance_table(font_identifier, REFERENCE_SIZE), paragraph.split())
+
+
+def greedy_lines(widths: np.ndarray, join_widths: np.ndarray, max_width: float) -> List[Tuple[int, int]]:
+    """(start, end) word ranges of a greedy wrap: each line takes words while it stays within max_width.
+
+    Line widths come from prefix sums, so each line is one binary search.
+    """
+    # ends[k]: width from the first word to the end of word k, including the joins before it
+    ends = np.cumsum(widths) + np.concatenate(([0.0], np.cumsum(join_widths)))
+    lines = []
+    start = 0
+    while start < len(widths):
+        offset = ends[start] - widths[start]
+        end = max(start + 1, int(np.searchsorted(ends, offset + max_width, side="right")))
+        lines.append((start, end))
+        start = end
+    return lines
+
+
+class ParagraphLayout(NamedTuple):
+    lines: Tuple[str, ...]
+    # Bottom of each line's bounding box, so block heights need no re-measuring
+    bottoms: Tuple[float, ...] = ()
+
+
+class LayoutCache:
+    """LRU of wrapped paragraphs keyed by (paragraph text, font, size, max width).
+
+    A paragraph is only laid out again when its key changes, i.e. when its text
+    was edited or the font or box changed; the rest of the text is served from
+    the cache. The fit solver probes the same sizes again on every keystroke,
+    so each probe re-wraps just the edited paragraph.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Any, ParagraphLayout]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build: Callable[[], ParagraphLayout]) -> ParagraphLayout:
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return layout
+        layout = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = layout
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return layout
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
@@ -0,0 +1,406 @@
+import math
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from blocks import resolve_blocks
+from backgrounds import BackgroundImage, BackgroundSpec, GENERATED_BACKGROUNDS, MAX_PRESET_SIZE, canvas_mode, decode_scaled, render_background
+from text_effects import composite_layer
+
+# Canvases above this many pixels are rendered in bands instead of as one image
+TILED_RENDER_PIXELS = 4 * MAX_PRESET_SIZE[0] * MAX_PRESET_SIZE[1]
+
+# Rows per band; taller bands rasterise a text line fewer times, shorter ones use less memory
+DEFAULT_BAND_HEIGHT = 512
+
+# Upper bound for the decoded background photo behind a tiled render (RGBA bytes)
+TILED_SOURCE_BUDGET = 128 * 1024 * 1024
+
+TILED_FORMATS = {".png": "PNG", ".tif": "TIFF", ".tiff": "TIFF"}
+
+DEFAULT_DPI = 72
+
+# In-flight bands are workers + 2, so the worker count also caps memory
+DEFAULT_TILED_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def needs_tiling(dims: Tuple[int, int]) -> bool:
+    return dims[0] * dims[1] > TILED_RENDER_PIXELS
+
+
+def preview_scale(dims: Tuple[int, int], limit: Tuple[int, int] = MAX_PRESET_SIZE) -> float:
+    """Factor that brings dims within the largest preset, for previewing print-size canvases."""
+    return min(1.0, limit[0] / dims[0], limit[1] / dims[1])
+
+
+def scaled_params(params: Dict[str, Any], scale: float) -> Dict[str, Any]:
+    """create_image params for the same card drawn scale times as large."""
+    params = dict(params)
+    params["img_dims"] = (max(1, round(params["img_dims"][0] * scale)), max(1, round(params["img_dims"][1] * scale)))
+    if params.get("font_size"):
+        params["font_size"] = max(1, round(params["font_size"] * scale))
+    params["blocks"] = tuple(block.scaled(scale) for block in params.get("blocks") or ())
+    if params.get("text_effects") is not None:
+        params["text_effects"] = params["text_effects"].scaled(scale)
+    return params
+
+
+class TextOp(NamedTuple):
+    """One recorded single-line draw.text call and the rows it touches."""
+    xy: Tuple[float, float]
+    text: str
+    options: Dict[str, Any]
+    top: float
+    bottom: float
+
+
+class LayerOp(NamedTuple):
+    """A recorded composite of an RGBA layer (text drawn with effects) and the rows it covers."""
+    offset: Tuple[int, int]
+    image: Image.Image
+    top: int
+    bottom: int
+
+
+class RecordingDraw:
+    """Stands in for ImageDraw while laying out a canvas too large to allocate.
+
+    Measurements are answered by a 1x1 canvas of the same mode; drawing calls
+    are recorded as single-line text operations (multiline blocks are split
+    the way ImageDraw.multiline_text splits them) to be replayed per band.
+    Layers of text with effects are recorded as they are composited.
+    """
+
+    def __init__(self, mode: str):
+        self._measure = ImageDraw.Draw(Image.new(mode, (1, 1)))
+        self.fontmode = self._measure.fontmode
+        self.ops: List[TextOp] = []
+
+    def textlength(self, *args, **kwargs):
+        return self._measure.textlength(*args, **kwargs)
+
+    def textbbox(self, *args, **kwargs):
+        return self._measure.textbbox(*args, **kwargs)
+
+    def multiline_textbbox(self, *args, **kwargs):
+        return self._measure.multiline_textbbox(*args, **kwargs)
+
+    def text(self, xy, text, fill=None, font=None, anchor=None, **kwargs):
+        if "\n" in text:
+            self.multiline_text(xy, text, fill, font, anchor, **kwargs)
+            return
+        stroke_width = kwargs.get("stroke_width", 0)
+        bbox = font.getbbox(text, self.fontmode, anchor=anchor or "la", stroke_width=stroke_width)
+        self.ops.append(TextOp(tuple(xy), text, dict(kwargs, fill=fill, font=font, anchor=anchor),
+                               xy[1] + bbox[1], xy[1] + bbox[3]))
+
+    def multiline_text(self, xy, text, fill=None, font=None, anchor=None, spacing=4, align="left", **kwargs):
+        anchor = anchor or "la"
+        stroke_width = kwargs.get("stroke_width", 0)
+        lines = text.split("\n")
+        line_spacing = font.getbbox("A", self.fontmode, stroke_width=stroke_width)[3] + stroke_width + spacing
+        widths = [font.getlength(line, self.fontmode) for line in lines]
+        max_width = max(widths)
+
+        top = xy[1]
+        if anchor[1] == "m":
+            top -= (len(lines) - 1) * line_spacing / 2.0
+        elif anchor[1] == "d":
+            top -= (len(lines) - 1) * line_spacing
+
+        for line, width in zip(lines, widths):
+            left = xy[0]
+            width_difference = max_width - width
+            if align == "center":
+                left += width_difference / 2.0
+            elif align == "right":
+                left += width_difference
+            if anchor[0] == "m":
+                left -= width_difference / 2.0
+            elif anchor[0] == "r":
+                left -= width_difference
+            self.text((left, top), line, fill, font, anchor, **kwargs)
+            top += line_spacing
+
+    def composite(self, layer: Image.Image, offset: Tuple[int, int]):
+        self.ops.append(LayerOp(tuple(offset), layer, offset[1], offset[1] + layer.size[1]))
+
+
+class BandSource:
+    """Produces the background for any band of a full-size canvas."""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.dims = tuple(params["img_dims"])
+        self.background_type = params["background_type"]
+        self.bg_color = params.get("bg_color")
+        self.mode = canvas_mode(self.background_type, params.get("loaded_image"))
+        self.spec = None
+        self.source = None
+
+        if self.background_type in GENERATED_BACKGROUNDS:
+            self.spec = params.get("background_spec") or BackgroundSpec(self.background_type, (self.bg_color, "white"))
+        elif self.background_type == "existing":
+            loaded_image = params.get("loaded_image")
+            if isinstance(loaded_image, BackgroundImage):
+                if loaded_image.covers(self.dims) or loaded_image.is_draft:
+                    self.source = loaded_image.image
+                else:
+                    # Enough resolution for the print size, within a fixed budget
+                    self.source, _ = decode_scaled(loaded_image.path, self.dims, TILED_SOURCE_BUDGET)
+            else:
+                self.source = loaded_image
+
+    def band(self, top: int, rows: int) -> Image.Image:
+        width, height = self.dims
+        if self.spec is not None:
+            return render_background(self.spec, self.dims, top, rows)
+        if self.source is not None:
+            # Resample just the strip of the photo behind this band
+            y_scale = self.source.size[1] / height
+            box = (0, top * y_scale, self.source.size[0], (top + rows) * y_scale)
+            return self.source.resize((width, rows), Image.Resampling.LANCZOS, box=box).convert("RGBA")
+        if self.background_type == "solid":
+            return Image.new("RGB", (width, rows), color=self.bg_color)
+        if self.mode == "RGB":
+            # An existing background without a photo yet, gray as in the preview
+            return Image.new("RGB", (width, rows), color="gray")
+        return Image.new("RGBA", (width, rows), (255, 255, 255, 0))
+
+
+def render_band(source: BandSource, ops: List[TextOp], top: int, rows: int) -> Image.Image:
+    ops = [op for op in ops if op.bottom >= top and op.top <= top + rows]
+    # ImageDraw splits coordinates into int() and a fractional start offset, which
+    # rounds differently once y goes negative. Starting the canvas at or above every
+    # anchor keeps glyph positions identical to a full-canvas render; this extends
+    # the band by at most one line height.
+    render_top = top
+    anchors_above = [op.xy[1] for op in ops if isinstance(op, TextOp) and op.xy[1] < top]
+    if anchors_above:
+        render_top = min(top, max(0, math.floor(min(anchors_above))))
+
+    band = source.band(render_top, rows + top - render_top)
+    draw = ImageDraw.Draw(band)
+    for op in ops:
+        if isinstance(op, LayerOp):
+            composite_layer(band, op.image, (op.offset[0], op.offset[1] - render_top))
+        else:
+            draw.text((op.xy[0], op.xy[1] - render_top), op.text, **op.options)
+    if render_top != top:
+        band = band.crop((0, top - render_top, band.size[0], top - render_top + rows))
+    return band
+
+
+def band_edges(height: int, band_height: int, ops: List[TextOp]) -> List[int]:
+    """Band boundaries no more than band_height apart, moved into the gaps between
+    text lines where possible so each line is rasterised in a single band."""
+    spans = sorted((math.floor(op.top), math.ceil(op.bottom)) for op in ops)
+    edges = [0]
+    while edges[-1] + band_height < height:
+        cut = edges[-1] + band_height
+        for top, bottom in spans:
+            if top < cut < bottom and top > edges[-1] + band_height // 2:
+                cut = top
+        edges.append(cut)
+    edges.append(height)
+    return edges
+
+
+class PngBandWriter:
+    """Writes a PNG whose IDAT stream is built from independently deflated bands.
+
+    Each band is deflated on its own (raw deflate, ended with a sync flush), so
+    bands can be compressed in parallel and concatenated into one zlib stream;
+    only the Adler-32 checksum is computed sequentially.
+    """
+
+    def __init__(self, fp, size: Tuple[int, int], mode: str, dpi: Optional[int] = None):
+        self.fp = fp
+        self.channels = len(mode)
+        self.adler = 1
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        color_type = 6 if mode == "RGBA" else 2
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, color_type, 0, 0, 0))
+        if dpi:
+            pixels_per_metre = round(dpi / 0.0254)
+            self._chunk(b"pHYs", struct.pack(">IIB", pixels_per_metre, pixels_per_metre, 1))
+        self._chunk(b"IDAT", b"\x78\x9c")  # zlib header for the concatenated stream
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.fp.write(struct.pack(">I", len(data)) + kind + data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    @staticmethod
+    def encode(band: Image.Image, level: int = 6) -> Tuple[bytes, bytes]:
+        """Filters (Sub) and deflates one band. Returns (raw scanlines, deflated bytes)."""
+        pixels = np.asarray(band)
+        rows = pixels.reshape(band.size[1], -1)
+        channels = pixels.shape[2]
+        scanlines = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        scanlines[:, 0] = 1  # Sub filter: row-local, so bands stay independent
+        scanlines[:, 1:channels + 1] = rows[:, :channels]
+        np.subtract(rows[:, channels:], rows[:, :-channels], out=scanlines[:, channels + 1:])
+        raw = scanlines.tobytes()
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        return raw, compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def write(self, encoded: Tuple[bytes, bytes]):
+        raw, deflated = encoded
+        self.adler = zlib.adler32(raw, self.adler)
+        self._chunk(b"IDAT", deflated)
+
+    def close(self):
+        # Empty final deflate block, then the checksum of all scanlines
+        self._chunk(b"IDAT", b"\x03\x00" + struct.pack(">I", self.adler))
+        self._chunk(b"IEND", b"")
+
+
+class TiffBandWriter:
+    """Writes a baseline TIFF with one deflate-compressed strip per band.
+
+    Strips are written as they arrive and the directory goes at the end, so
+    memory does not depend on image height. Classic TIFF: files must stay under 4 GB.
+    """
+
+    def __init__(self, fp, size: Tuple[int, int], mode: str, dpi: Optional[int] = None, rows_per_strip: int = DEFAULT_BAND_HEIGHT):
+        self.fp = fp
+        self.size = size
+        self.mode = mode
+        self.dpi = dpi or DEFAULT_DPI
+        self.rows_per_strip = rows_per_strip
+        self.strips: List[Tuple[int, int]] = []
+        fp.write(b"II*\x00\x00\x00\x00\x00")  # directory offset patched in close()
+
+    @staticmethod
+    def encode(band: Image.Image, level: int = 6) -> bytes:
+        return zlib.compress(band.tobytes(), level)
+
+    def write(self, encoded: bytes):
+        self.strips.append((self.fp.tell(), len(encoded)))
+        self.fp.write(encoded)
+
+    def close(self):
+        samples = len(self.mode)
+        offsets = [offset for offset, _ in self.strips]
+        counts = [count for _, count in self.strips]
+        # (tag, type, values); types: 3 SHORT, 4 LONG, 5 RATIONAL
+        entries = [
+            (256, 4, [self.size[0]]),
+            (257, 4, [self.size[1]]),
+            (258, 3, [8] * samples),
+            (259, 3, [8]),  # Adobe deflate
+            (262, 3, [2]),  # RGB
+            (273, 4, offsets),
+            (277, 3, [samples]),
+            (278, 4, [self.rows_per_strip]),
+            (279, 4, counts),
+            (282, 5, [(self.dpi, 1)]),
+            (283, 5, [(self.dpi, 1)]),
+            (284, 3, [1]),
+            (296, 3, [2]),  # inches
+        ]
+        if samples == 4:
+            entries.append((338, 3, [2]))  # unassociated alpha
+
+        if self.fp.tell() % 2:
+            self.fp.write(b"\x00")
+        directory = self.fp.tell()
+        extra = directory + 2 + 12 * len(entries) + 4
+        entry_bytes, extra_bytes = b"", b""
+        for tag, kind, values in entries:
+            if kind == 5:
+                data = b"".join(struct.pack("<II", *value) for value in values)
+            else:
+                data = struct.pack("<%d%s" % (len(values), "H" if kind == 3 else "I"), *values)
+            if len(data) <= 4:
+                field = data.ljust(4, b"\x00")
+            else:
+                field = struct.pack("<I", extra + len(extra_bytes))
+                extra_bytes += data
+            entry_bytes += struct.pack("<HHI", tag, kind, len(values)) + field
+        self.fp.write(struct.pack("<H", len(entries)) + entry_bytes + b"\x00\x00\x00\x00" + extra_bytes)
+        self.fp.seek(4)
+        self.fp.write(struct.pack("<I", directory))
+
+
+def layout_tiled(renderer, params: Dict[str, Any]) -> List[TextOp]:
+    """Lays out the text once at full scale and returns the draw operations."""
+    draw = RecordingDraw(canvas_mode(params["background_type"], params.get("loaded_image")))
+    if params.get("blocks"):
+        for block in resolve_blocks(params["blocks"], params):
+            renderer.draw_block(draw, block, tuple(params["img_dims"]))
+    elif params.get("text"):
+        renderer.draw_text(draw, tuple(params["img_dims"]), params["text"], params["font_family"], params["font_style"],
+                           params["text_color"], params["fit_to_width"], params["text_position"],
+                           params.get("font_size", 120), params.get("enable_shadow", False), params.get("font_path"),
+                           text_effects=params.get("text_effects"))
+    return draw.ops
+
+
+def render_region(renderer, params: Dict[str, Any], box: Tuple[int, int, int, int]) -> Image.Image:
+    """Renders only box (left, top, right, bottom) of the card, pixel for pixel as the full canvas would be.
+
+    The preview uses this to show a zoomed-in region at a higher resolution
+    without drawing the rest of the enlarged card.
+    """
+    left, top, right, bottom = box
+    band = render_band(BandSource(params), layout_tiled(renderer, params), top, bottom - top)
+    return band.crop((left, 0, right, bottom - top))
+
+
+def render_tiled(renderer, params: Dict[str, Any], path: str, dpi: Optional[int] = None,
+                 band_height: int = DEFAULT_BAND_HEIGHT, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Renders a card of any size to a PNG or TIFF file band by band.
+
+    Text is laid out once for the whole canvas; bands are then rasterised and
+    compressed in a thread pool and written in order. At most a few bands are
+    held at a time, so peak memory depends on the width, not the height.
+    """
+    start = time.perf_counter()
+    image_format = TILED_FORMATS.get(Path(path).suffix.lower(), "PNG")
+    width, height = params["img_dims"]
+    source = BandSource(params)
+    ops = layout_tiled(renderer, params)
+
+    workers = workers or DEFAULT_TILED_WORKERS
+    max_in_flight = workers + 2
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as fp, ThreadPoolExecutor(max_workers=workers) as pool:
+        if image_format == "TIFF":
+            writer = TiffBandWriter(fp, (width, height), source.mode, dpi, band_height)
+        else:
+            writer = PngBandWriter(fp, (width, height), source.mode, dpi)
+
+        if image_format == "TIFF":
+            # Strips must all have the same height
+            edges = list(range(0, height, band_height)) + [height]
+        else:
+            edges = band_edges(height, band_height, ops)
+
+        def band_job(top: int, bottom: int):
+            return writer.encode(render_band(source, ops, top, bottom - top))
+
+        in_flight = deque()
+        for top, bottom in zip(edges, edges[1:]):
+            if len(in_flight) >= max_in_flight:
+                writer.write(in_flight.popleft().result())
+            in_flight.append(pool.submit(band_job, top, bottom))
+        while in_flight:
+            writer.write(in_flight.popleft().result())
+        writer.close()
+    os.replace(tmp_path, path)
+
+    return {
+        "path": path,
+        "format": image_format,
+        "bands": len(edges) - 1,
+        "bytes": os.path.getsize(path),
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    }
@@ -1,7 +1,8 @@
 import sys
 import json
-import requests
+import time
 import tempfile
+import threading
 import subprocess
 from pathlib import Path
 from typing import Callable, Optional
@@ -12,7 +13,19 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QThread, Signal, QObject, QCoreApplication
 
+# requests (and downloads, which uses it) are imported on the checker and downloader
+# threads, so loading the HTTP stack never delays startup
+
 GITHUB_VERSION_URL = "https://raw.githubusercontent.com/ahmedthebest31/ImageType/main/version.json"
+# Silent checks at launch go to the network at most this often; config key "update_check_interval_hours"
+UPDATE_CHECK_INTERVAL_HOURS = 24
+# A release zip is extracted here while it downloads, keeping only the files that changed
+STAGING_DIR_NAME = "ImageType-update"
+
+def get_install_dir() -> Path:
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    return Path(__file__).resolve().parent
 
 def compare_versions(v1: str, v2: str) -> int:
     p1 = [int(x) for x in v1.split('.')]
@@ -23,21 +36,37 @@ def compare_versions(v1: str, v2: str) -> int:
     if p1 < p2: return -1
     return 0
 
-class VersionChecker(QThread):
+class VersionChecker(QObject):
+    """Fetches version.json on a daemon thread, revalidating the cached copy instead of downloading it again.
+
+    cache is the "update_check" entry of config.json: the last version.json,
+    its ETag and Last-Modified, and when it was fetched. A silent check within
+    min_interval of the last one answers from the cache without any request.
+    The refreshed entry is emitted through checked for the GUI thread to save.
+    A daemon thread (rather than a QThread) lets the app close mid-request.
+    """
     update_available = Signal(dict)
     no_update = Signal()
     error = Signal(str)
+    checked = Signal(dict)  # the new cache entry
+    finished = Signal()
 
-    def __init__(self, current_version: str, parent=None):
+    def __init__(self, current_version: str, cache: Optional[dict] = None, min_interval: float = 0, parent=None):
         super().__init__(parent)
         self.current_version = current_version
+        self.cache = dict(cache or {})
+        self.min_interval = min_interval
+
+    def start(self):
+        threading.Thread(target=self.run, name="version-check", daemon=True).start()
 
     def run(self):
+        import requests
+
         try:
-            response = requests.get(GITHUB_VERSION_URL, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            
+            data = self.cache.get("data")
+            if not (data and time.time() - self.cache.get("checked_at", 0) < self.min_interval):
+                data = self.fetch()
             latest_version = data.get("version")
             if latest_version and compare_versions(latest_version, self.current_version) > 0:
                 self.update_available.emit(data)
@@ -45,41 +74,72 @@ class VersionChecker(QThread):
                 self.no_update.emit()
         except requests.exceptions.RequestException as e:
             self.error.emit(str(e))
-        except (json.JSONDecodeError, KeyError) as e:
+        except (json.JSONDecodeError, KeyError, AttributeError) as e:
             self.error.emit(f"Data error: {str(e)}")
+        finally:
+            self.finished.emit()
+
+    def fetch(self) -> dict:
+        import requests
+
+        headers = {}
+        if self.cache.get("data"):
+            if self.cache.get("etag"):
+                headers["If-None-Match"] = self.cache["etag"]
+            if self.cache.get("last_modified"):
+                headers["If-Modified-Since"] = self.cache["last_modified"]
+        response = requests.get(GITHUB_VERSION_URL, timeout=5, headers=headers)
+        if response.status_code == 304:
+            data = self.cache["data"]
+        else:
+            response.raise_for_status()
+            data = response.json()
+            self.cache.update(data=data, etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+        self.cache["checked_at"] = time.time()
+        self.checked.emit(dict(self.cache))
+        return data
 
 class Downloader(QThread):
-    progress = Signal(int)
-    finished = Signal(str)
+    progress = Signal(object)  # DownloadProgress, a few times per second at most
+    finished = Signal(str)  # an installer, ready to run
+    staged = Signal(object)  # StagedUpdate of a release zip, extracted while downloading
     error = Signal(str)
 
-    def __init__(self, url: str, parent=None):
+    def __init__(self, url: str, sha256: Optional[str] = None, parent=None):
         super().__init__(parent)
         self.url = url
+        self.sha256 = sha256
 
     def run(self):
+        from downloads import DownloadCancelled, ResumableDownload
+        from update_package import PackageExtractor
+
+        extractor = None
         try:
             temp_dir = Path(tempfile.gettempdir())
             filename = self.url.split('/')[-1] or "update.exe"
             save_path = temp_dir / filename
 
-            response = requests.get(self.url, stream=True, timeout=10)
-            response.raise_for_status()
-            total_size = int(response.headers.get('content-length', 0))
-            
-            downloaded = 0
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            percent = int((downloaded / total_size) * 100)
-                            self.progress.emit(percent)
-
-            self.finished.emit(str(save_path))
+            # Keeps a .part file next to save_path, so a retry or a later launch resumes it;
+            # the SHA-256 published in version.json is checked as the bytes arrive
+            download = ResumableDownload(self.url, save_path, on_progress=self.progress.emit,
+                                         should_stop=self.isInterruptionRequested, expected_sha256=self.sha256)
+            if filename.lower().endswith(".zip"):
+                extractor = PackageExtractor(download.part_path, temp_dir / STAGING_DIR_NAME, get_install_dir())
+                download.on_data, download.on_complete = extractor.feed, extractor.finish
+                extractor.start()
+            path = download.run()
+            if extractor:
+                self.staged.emit(extractor.result)
+            else:
+                self.finished.emit(str(path))
+        except DownloadCancelled:
+            pass
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            if extractor:
+                extractor.cancel()
 
 class UpdateDialog(QDialog):
     def __init__(self, new_version: str, whats_new: str, tr: Callable, parent=None):
@@ -169,13 +229,22 @@ class UpdateManager(QObject):
             self.progress_dialog.setModal(True)
             self.progress_dialog.show()
 
-        self.checker_thread = VersionChecker(self.current_version, self)
+        config = self.load_config()
+        # A check from the Help menu always asks the server (cheaply, if nothing changed)
+        min_interval = config.get("update_check_interval_hours", UPDATE_CHECK_INTERVAL_HOURS) * 3600 if silent else 0
+        self.checker_thread = VersionChecker(self.current_version, config.get("update_check"), min_interval, self)
+        self.checker_thread.checked.connect(self._save_check)
         self.checker_thread.update_available.connect(self._on_update_available)
         self.checker_thread.no_update.connect(self._on_no_update)
         self.checker_thread.error.connect(self._on_error)
         self.checker_thread.finished.connect(self._cleanup_checker)
         self.checker_thread.start()
 
+    def _save_check(self, cache: dict):
+        config = self.load_config()
+        config["update_check"] = cache
+        self.save_config(config)
+
     def _cleanup_checker(self):
         if self.progress_dialog:
             self.progress_dialog.close()
@@ -201,7 +270,7 @@ class UpdateManager(QObject):
         dialog = UpdateDialog(new_version, whats_new, self.tr, self.parent_widget)
         if dialog.exec() == QDialog.DialogCode.Accepted:
             if dialog.action == "update":
-                self._start_download(data.get("direct_download_url"))
+                self._start_download(data.get("direct_download_url"), data.get("sha256"))
         else:
             if dialog.action == "skip":
                 config["skipped_version"] = new_version
@@ -215,7 +284,7 @@ class UpdateManager(QObject):
         if not self.silent:
             QMessageBox.critical(self.parent_widget, self.tr("dialog_title_error"), self.tr("msg_network_error", error_msg))
 
-    def _start_download(self, url: str):
+    def _start_download(self, url: str, sha256: Optional[str] = None):
         if not url:
             QMessageBox.critical(self.parent_widget, self.tr("dialog_title_error"), "Download URL is empty.")
             return
@@ -226,15 +295,23 @@ class UpdateManager(QObject):
         self.progress_dialog.setAutoClose(True)
         self.progress_dialog.setAutoReset(True)
         
-        self.downloader_thread = Downloader(url, self)
-        self.progress_dialog.canceled.connect(self.downloader_thread.terminate)
+        self.downloader_thread = Downloader(url, sha256, self)
+        self.progress_dialog.canceled.connect(self.downloader_thread.requestInterruption)
         
-        self.downloader_thread.progress.connect(self.progress_dialog.setValue)
+        self.downloader_thread.progress.connect(self._on_download_progress)
         self.downloader_thread.finished.connect(self._on_download_finished)
+        self.downloader_thread.staged.connect(self._on_update_staged)
         self.downloader_thread.error.connect(self._on_download_error)
         self.downloader_thread.start()
         self.progress_dialog.show()
 
+    def _on_download_progress(self, progress):
+        from downloads import format_progress
+
+        if self.progress_dialog:
+            self.progress_dialog.setValue(progress.percent)
+            self.progress_dialog.setLabelText(f"Downloading update...\n{format_progress(progress)}")
+
     def _on_download_finished(self, file_path: str):
         if self.progress_dialog:
             self.progress_dialog.close()
@@ -245,6 +322,27 @@ class UpdateManager(QObject):
         except Exception as e:
             QMessageBox.critical(self.parent_widget, self.tr("dialog_title_error"), f"Failed to launch installer:\n{e}")
 
+    def _on_update_staged(self, staged):
+        from update_package import apply_update
+
+        if self.progress_dialog:
+            self.progress_dialog.close()
+
+        if not getattr(sys, 'frozen', False):
+            # A source checkout is never overwritten by a release build
+            QMessageBox.information(self.parent_widget, self.tr("dialog_title_update_available"),
+                                    f"Update extracted to:\n{staged.staging_dir}\n\n{len(staged.changed)} files changed.")
+            return
+        try:
+            apply_update(staged, get_install_dir())
+        except OSError as e:
+            QMessageBox.critical(self.parent_widget, self.tr("dialog_title_error"), f"Failed to install the update:\n{e}")
+            return
+        QMessageBox.information(self.parent_widget, self.tr("dialog_title_update_available"),
+                                "The update was installed. ImageType will now restart.")
+        subprocess.Popen([sys.executable])
+        QCoreApplication.quit()
+
     def _on_download_error(self, error_msg: str):
         if self.progress_dialog:
             self.progress_dialog.close()
@@ -256,4 +354,4 @@ class UpdateManager(QObject):
             QMessageBox.StandardButton.Retry | QMessageBox.StandardButton.Cancel
         )
         if reply == QMessageBox.StandardButton.Retry:
-            self._start_download(self.downloader_thread.url)
+            self._start_download(self.downloader_thread.url, self.downloader_thread.sha256)
@@ -0,0 +1,357 @@
+import hashlib
+import os
+import queue
+import shutil
+import struct
+import threading
+import zipfile
+import zlib
+from collections import deque
+from pathlib import Path, PurePosixPath
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+LOCAL_HEADER = b"PK\x03\x04"
+CENTRAL_HEADER = b"PK\x01\x02"
+END_OF_CENTRAL_DIRECTORY = b"PK\x05\x06"
+DATA_DESCRIPTOR = b"PK\x07\x08"
+LOCAL_HEADER_FORMAT = struct.Struct("<HHHHHIIIHH")
+ZIP64_EXTRA = 0x0001
+STORED, DEFLATED = 0, 8
+
+READ_SIZE = 1024 * 1024
+# Downloaded chunks waiting to be extracted; the download waits when extraction falls this far behind
+QUEUE_CHUNKS = 16
+
+
+class PackageError(Exception):
+    """The update package is damaged or tries to write outside the install directory."""
+
+
+class _Unsupported(Exception):
+    """A zip feature streaming cannot handle; the package is extracted with zipfile once downloaded."""
+
+
+class _Restart(Exception):
+    """The download started over from the first byte."""
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class StagedUpdate(NamedTuple):
+    """Files of an update package that differ from the installed ones, extracted under staging_dir."""
+    staging_dir: Path
+    changed: List[str]
+    unchanged: int
+
+
+class _ChunkStream:
+    """The bytes of a download as they arrive, readable like a file by the extraction thread.
+
+    Chunks come from ResumableDownload.on_data. Bytes written by an earlier
+    run (a resumed .part file) never pass through on_data, so they are read
+    back from the part file when the first new chunk shows where they end.
+    """
+
+    def __init__(self, part_path: Path):
+        self.part_path = part_path
+        self.chunks = queue.Queue(QUEUE_CHUNKS)
+        # In stream order: received chunks (memoryview) and (start, end) ranges to read from the part file
+        self.segments = deque()
+        self.received = 0
+        self.ended = False
+
+    def put(self, offset: int, chunk: Optional[bytes], reader: threading.Thread):
+        """Queues a chunk at offset; chunk None marks the end at offset, and a negative offset cancels.
+
+        Gives up without blocking once reader has stopped.
+        """
+        while reader.is_alive():
+            try:
+                self.chunks.put((offset, chunk), timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def _next(self):
+        offset, chunk = self.chunks.get()
+        if offset < 0:
+            raise _Cancelled()
+        if offset < self.received:
+            # Only a download that started over sends an offset already seen
+            self.segments.clear()
+            self.segments.append(memoryview(chunk))
+            self.received = len(chunk)
+            raise _Restart()
+        if offset > self.received:
+            self.segments.append((self.received, offset))
+            self.received = offset
+        if chunk is None:
+            self.ended = True
+        else:
+            self.segments.append(memoryview(chunk))
+            self.received += len(chunk)
+
+    def read(self, size: int) -> bytes:
+        """Up to size bytes; fewer only at the end of the download."""
+        data = bytearray()
+        while len(data) < size:
+            if not self.segments:
+                if self.ended:
+                    break
+                self._next()
+                continue
+            wanted = size - len(data)
+            segment = self.segments[0]
+            if isinstance(segment, tuple):
+                start, end = segment
+                with open(self.part_path, "rb") as part:
+                    part.seek(start)
+                    block = part.read(min(wanted, end - start))
+                if not block:
+                    raise PackageError("The partial download is shorter than expected")
+                data += block
+                segment = (start + len(block), end) if start + len(block) < end else None
+            else:
+                data += segment[:wanted]
+                segment = segment[wanted:] if len(segment) > wanted else None
+            if segment is None:
+                self.segments.popleft()
+            else:
+                self.segments[0] = segment
+        return bytes(data)
+
+    def exact(self, size: int) -> bytes:
+        data = self.read(size)
+        if len(data) < size:
+            raise PackageError("The update package is truncated")
+        return data
+
+    def unread(self, data: bytes):
+        if data:
+            self.segments.appendleft(memoryview(data))
+
+    def drain(self):
+        """Consumes the rest of the download (the central directory, or everything before a fallback)."""
+        while not self.ended:
+            try:
+                self._next()
+            except _Restart:
+                pass
+            self.segments.clear()
+
+
+def _safe_name(name: str) -> Optional[PurePosixPath]:
+    """Relative path of a zip entry, or None for a directory; raises PackageError for paths leaving the target."""
+    path = PurePosixPath(name.replace("\\", "/"))
+    if path.is_absolute() or ".." in path.parts or (path.parts and ":" in path.parts[0]):
+        raise PackageError(f"Unsafe path in update package: {name}")
+    return None if name.endswith(("/", "\\")) or not path.parts else path
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PackageExtractor:
+    """Extracts a zip update package on a background thread while it downloads.
+
+    Pass feed and finish as ResumableDownload's on_data and on_complete.
+    Entries are read from their local headers as the bytes arrive, hashed as
+    they are written to staging_dir, and dropped from staging again when the
+    installed copy in install_dir has the same SHA-256, so only changed files
+    are left to replace. When the package is one folder (the first entry is
+    in a folder install_dir does not have), that folder is stripped from the
+    names. Packages streaming cannot follow
+    (encrypted, other compression methods, stored entries of unknown size)
+    are extracted with zipfile once the download is complete.
+    """
+
+    def __init__(self, part_path, staging_dir, install_dir):
+        self.part_path = Path(part_path)
+        self.staging_dir = Path(staging_dir)
+        self.install_dir = Path(install_dir)
+        self.stream = _ChunkStream(self.part_path)
+        self.thread = threading.Thread(target=self._run, name="update-extract", daemon=True)
+        self.result: Optional[StagedUpdate] = None
+        self.error: Optional[BaseException] = None
+
+    def start(self):
+        self.thread.start()
+
+    def feed(self, offset: int, chunk: bytes):
+        """Queues a downloaded chunk; raises the extraction error, if any, to stop the download early."""
+        self.stream.put(offset, chunk, self.thread)
+        if self.error:
+            raise self.error
+
+    def finish(self, size: int) -> StagedUpdate:
+        """Waits until every entry is staged; raises the extraction error, if any."""
+        self.stream.put(size, None, self.thread)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.result
+
+    def cancel(self):
+        if self.thread.is_alive():
+            self.stream.put(-1, None, self.thread)
+            self.thread.join()
+
+    def _run(self):
+        while True:
+            self._reset_staging()
+            try:
+                self.result = self._extract_stream()
+                return
+            except _Restart:
+                continue
+            except _Unsupported:
+                break
+            except _Cancelled:
+                return
+            except Exception as e:
+                self.error = e
+                return
+        try:
+            self.stream.drain()
+            self._reset_staging()
+            self.result = self._extract_zipfile()
+        except _Cancelled:
+            pass
+        except Exception as e:
+            self.error = e
+
+    def _reset_staging(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        self.staging_dir.mkdir(parents=True)
+        self.prefix = None
+        self.changed: List[str] = []
+        self.unchanged = 0
+
+    def _stage(self, name: str, pieces: Iterable[bytes]) -> int:
+        """Writes an entry to staging, keeping it only if it differs from the installed file; returns its CRC-32."""
+        path = _safe_name(name)
+        if self.prefix is None:
+            # Decided by the first entry: a release zipped as one folder, which the install directory has no copy of
+            top = name.replace("\\", "/").strip("/").split("/")[0]
+            inside_folder = path is None or len(path.parts) > 1
+            self.prefix = top if inside_folder and not (self.install_dir / top).is_dir() else ""
+        if path is None:
+            for _ in pieces:
+                pass
+            return 0
+        if self.prefix and path.parts[0] == self.prefix:
+            path = PurePosixPath(*path.parts[1:])
+        target = self.staging_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        digest, crc, size = hashlib.sha256(), 0, 0
+        with open(target, "wb") as out:
+            for piece in pieces:
+                out.write(piece)
+                digest.update(piece)
+                crc = zlib.crc32(piece, crc)
+                size += len(piece)
+        installed = self.install_dir / path
+        if installed.is_file() and installed.stat().st_size == size and file_sha256(installed) == digest.hexdigest():
+            target.unlink()
+            self.unchanged += 1
+        else:
+            self.changed.append(path.as_posix())
+        return crc
+
+    def _extract_stream(self) -> StagedUpdate:
+        stream = self.stream
+        while True:
+            signature = stream.exact(4)
+            if signature in (CENTRAL_HEADER, END_OF_CENTRAL_DIRECTORY):
+                break
+            if signature != LOCAL_HEADER:
+                raise PackageError("The update package is not a zip file")
+            (_, flags, method, _, _, crc, compressed, size,
+             name_length, extra_length) = LOCAL_HEADER_FORMAT.unpack(stream.exact(LOCAL_HEADER_FORMAT.size))
+            raw_name = stream.exact(name_length)
+            name = raw_name.decode("utf-8" if flags & 0x800 else "cp437")
+            extra = stream.exact(extra_length)
+            zip64 = False
+            while len(extra) >= 4:
+                tag, length = struct.unpack_from("<HH", extra)
+                if tag == ZIP64_EXTRA:
+                    zip64 = True
+                    values = iter(struct.unpack_from(f"<{length // 8}Q", extra, 4))
+                    size = next(values) if size == 0xFFFFFFFF else size
+                    compressed = next(values) if compressed == 0xFFFFFFFF else compressed
+                extra = extra[4 + length:]
+            has_descriptor = bool(flags & 0x08)
+            if flags & 0x01 or method not in (STORED, DEFLATED) or (has_descriptor and method == STORED):
+                raise _Unsupported()
+
+            actual_crc = self._stage(name, self._entry_data(method, None if has_descriptor else compressed))
+            if has_descriptor:
+                descriptor = stream.exact(4)
+                if descriptor == DATA_DESCRIPTOR:
+                    descriptor = stream.exact(4)
+                crc = struct.unpack("<I", descriptor)[0]
+                stream.exact(16 if zip64 else 8)  # sizes
+            if actual_crc != crc:
+                raise PackageError(f"{name} is damaged in the update package (CRC mismatch)")
+        stream.drain()
+        return StagedUpdate(self.staging_dir, self.changed, self.unchanged)
+
+    def _entry_data(self, method: int, compressed: Optional[int]) -> Iterator[bytes]:
+        """Uncompressed pieces of the entry at the stream position; compressed None means 'until the deflate stream ends'."""
+        stream = self.stream
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == DEFLATED else None
+        remaining = compressed
+        while remaining is None or remaining > 0:
+            piece = stream.read(READ_SIZE if remaining is None else min(READ_SIZE, remaining))
+            if not piece:
+                raise PackageError("The update package is truncated")
+            if remaining is not None:
+                remaining -= len(piece)
+            if decompressor is None:
+                yield piece
+                continue
+            while piece and not decompressor.eof:
+                # Bounded, so a highly compressed entry never inflates a whole piece at once
+                yield decompressor.decompress(piece, READ_SIZE)
+                piece = decompressor.unconsumed_tail
+            if decompressor.eof:
+                stream.unread(decompressor.unused_data)
+                if remaining:
+                    raise PackageError("The update package has data after the end of an entry")
+                return
+        if decompressor is not None:
+            yield decompressor.flush()
+
+    def _extract_zipfile(self) -> StagedUpdate:
+        with zipfile.ZipFile(self.part_path) as package:
+            for info in package.infolist():
+                with package.open(info) as entry:
+                    self._stage(info.filename, iter(lambda: entry.read(READ_SIZE), b""))
+        return StagedUpdate(self.staging_dir, self.changed, self.unchanged)
+
+
+def apply_update(staged: StagedUpdate, install_dir):
+    """Moves the staged files over the installed ones and removes the staging directory.
+
+    A file that is in use (the running executable on Windows) cannot be
+    replaced but can be renamed, so it is moved aside as name.old first.
+    """
+    install_dir = Path(install_dir)
+    for name in staged.changed:
+        source, target = staged.staging_dir / name, install_dir / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, target)
+        except PermissionError:
+            old = target.with_name(target.name + ".old")
+            old.unlink(missing_ok=True)
+            os.replace(target, old)
+            os.replace(source, target)
+    shutil.rmtree(staged.staging_dir, ignore_errors=True)